@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Author, Book, Borrowing, Reservation, BookScore
+from django.db.models import Q
+from .models import Author, Book, BookNeighbour, Borrowing, LeaderboardEntry, Reservation, BookScore
+from .search import get_search_backend
 
 class AuthorAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'biography', 'nationality', 'date_of_birth')
@@ -8,6 +10,13 @@ class BookAdmin(admin.ModelAdmin):
     list_display = ('id', 'title', 'description', 'author', 'isbn', 'category', 'publication_date', 'average_score')
     search_fields = ('title', 'author__name', 'isbn', 'category')
 
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index instead of LIKE scans; ISBNs match exactly
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        matches = get_search_backend().filter(queryset, search_term)
+        return queryset.filter(Q(pk__in=matches.values('pk')) | Q(isbn=search_term.strip())), False
+
   
     def average_score(self, obj):
         return obj.average_score()
@@ -18,6 +27,8 @@ class BookAdmin(admin.ModelAdmin):
 class BorrowingAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'book', 'borrow_date', 'due_date', 'return_date')
     list_filter = ('user', 'book')
+    # Loans are opened and closed through the API, which keeps LoanCounter in step
+    readonly_fields = ('user', 'book', 'borrow_date', 'return_date')
 
     
     def has_add_permission(self, request):
@@ -27,7 +38,7 @@ class BorrowingAdmin(admin.ModelAdmin):
         return False
 
 class ReservationAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'book', 'reserved_date')
+    list_display = ('id', 'user', 'book', 'position', 'reserved_date', 'ready_date')
     list_filter = ('user', 'book')
 
    
@@ -37,9 +48,21 @@ class ReservationAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         return False
 
+class BookNeighbourAdmin(admin.ModelAdmin):
+    list_display = ('id', 'book', 'rank', 'neighbour', 'shared_readers', 'score')
+    list_select_related = ('book', 'neighbour')
+    raw_id_fields = ('book', 'neighbour')
+
+class LeaderboardEntryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'board', 'category', 'rank', 'book', 'value')
+    list_filter = ('board',)
+    list_select_related = ('book',)
+
 
 admin.site.register(Author, AuthorAdmin)
 admin.site.register(Book, BookAdmin)
 admin.site.register(Borrowing, BorrowingAdmin)
 admin.site.register(Reservation, ReservationAdmin)
+admin.site.register(BookNeighbour, BookNeighbourAdmin)
+admin.site.register(LeaderboardEntry, LeaderboardEntryAdmin)
 
@@ -0,0 +1,110 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import make_password
+from django.http import Http404
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.response import Response
+from .routers import replica_alias
+from .views import (
+    BookListView, BookRetrieveUpdateDestroyView, BorrowedBooksListView, ReservedBooksListView,
+    UserRegistrationView,
+)
+
+
+class AsyncAPIViewMixin:
+    """
+    Serve a DRF view under ASGI through async a<method>() handlers. The view's
+    own authentication, permissions, throttles, filters, pagination,
+    serializers, caching and error responses apply; only the queries move to
+    Django's async ORM. Replica failures are not retried on these routes.
+    """
+
+    @classmethod
+    def as_async_view(cls):
+        async def view(request, *args, **kwargs):
+            self = cls()
+            self.setup(request, *args, **kwargs)
+            return await self.adispatch(request, *args, **kwargs)
+        view.view_class = cls
+        return csrf_exempt(view)
+
+    async def adispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        token = replica_alias.set(None)
+        try:
+            try:
+                # Authenticating may look the user up, so it runs where the ORM does
+                await sync_to_async(self.initial)(request, *args, **kwargs)
+                handler = getattr(self, f'a{request.method.lower()}', None)
+                if handler is None:
+                    self.http_method_not_allowed(request, *args, **kwargs)
+                response = await handler(request, *args, **kwargs)
+            except Exception as exc:
+                response = self.handle_exception(exc)
+            self.response = self.finalize_response(request, response, *args, **kwargs)
+            return self.response
+        finally:
+            replica_alias.reset(token)
+
+
+# The two mixins below come after the sync view in the bases, so the caching
+# and ETag mixins' aget() wrap them the way their get() wraps list() and retrieve().
+
+class AsyncListMixin:
+    async def aget(self, request, *args, **kwargs):
+        # Filters and ordering only build the query; the page is fetched asynchronously
+        queryset = self.filter_queryset(self.get_queryset())
+        page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class AsyncRetrieveMixin:
+    async def aget(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        instance = await queryset.filter(**{self.lookup_field: lookup}).afirst()
+        if instance is None:
+            raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+        self.check_object_permissions(request, instance)
+        return Response(self.get_serializer(instance).data)
+
+
+class AsyncBookListView(AsyncAPIViewMixin, BookListView, AsyncListMixin):
+    pass
+
+
+class AsyncBookDetailView(AsyncAPIViewMixin, BookRetrieveUpdateDestroyView, AsyncRetrieveMixin):
+    pass
+
+
+class AsyncBorrowedBooksListView(AsyncAPIViewMixin, BorrowedBooksListView, AsyncListMixin):
+    pass
+
+
+class AsyncReservedBooksListView(AsyncAPIViewMixin, ReservedBooksListView, AsyncListMixin):
+    pass
+
+
+class AsyncUserRegistrationView(AsyncAPIViewMixin, UserRegistrationView):
+    async def apost(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        # The username uniqueness check queries the user table
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        # Hashing is CPU-bound; a pool thread keeps the ORM thread free for other requests
+        password_hash = await sync_to_async(make_password, thread_sensitive=False)(
+            serializer.validated_data['password']
+        )
+        user = await sync_to_async(serializer.save)(password_hash=password_hash)
+        # Issuing the refresh token records it in the outstanding token table
+        return await sync_to_async(self.created)(user)
+
+
+book_list = AsyncBookListView.as_async_view()
+book_detail = AsyncBookDetailView.as_async_view()
+borrowed_books_list = AsyncBorrowedBooksListView.as_async_view()
+reserved_books_list = AsyncReservedBooksListView.as_async_view()
+user_registration = AsyncUserRegistrationView.as_async_view()
@@ -0,0 +1,145 @@
+import hashlib
+import math
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+# What authorization needs; the password hash and personal details stay out of the cache
+CACHED_USER_FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser')
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that keeps the resolved user's CACHED_USER_FIELDS in the
+    cache for AUTH_USER_CACHE_TIMEOUT seconds. Entries are dropped whenever the
+    user is saved or deleted, so deactivation and password changes apply
+    immediately. Cached users are rebuilt with the other fields deferred: they
+    load on first access, and save() only writes the fields that were loaded.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+
+        key = user_cache_key(user_id)
+        fields = cache.get(key)
+        if fields is None:
+            # Raises for missing or inactive users, which are never cached
+            user = super().get_user(validated_token)
+            cache.set(key, {name: getattr(user, name) for name in CACHED_USER_FIELDS},
+                      settings.AUTH_USER_CACHE_TIMEOUT)
+            return user
+        names = [f.attname for f in self.user_model._meta.concrete_fields if f.attname in fields]
+        return self.user_model.from_db('default', names, [fields[name] for name in names])
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, value):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self.positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(value))
+
+
+class TokenBlacklistIndex:
+    """
+    Membership test for blacklisted refresh tokens that avoids a DB query on
+    almost every refresh:
+
+    * tokens blacklisted while the process runs are kept in the shared cache
+      until they expire, so every worker sees them;
+    * tokens blacklisted earlier are loaded once into a Bloom filter, and only
+      a filter hit (real or false positive) falls through to the database;
+    * every JWT_BLACKLIST_SYNC_INTERVAL seconds the filter picks up the rows
+      added since, by primary key, so a token whose cache entry was evicted
+      or flushed is still rejected once the next sync has run.
+
+    It relies on the cache being shared between workers (REDIS_CACHE_URL), which
+    is why JWT_BLACKLIST_PREFILTER defaults to off with the local-memory cache.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.last_id = 0
+        self.synced = 0.0
+
+    def cache_key(self, jti):
+        return f'jwt:blacklist:{jti}'
+
+    def load(self):
+        with self.lock:
+            if self.bloom is None:
+                self.bloom = BloomFilter(settings.JWT_BLACKLIST_BLOOM_CAPACITY)
+                self.last_id = 0
+                self.sync(BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now()))
+            elif time.monotonic() - self.synced >= settings.JWT_BLACKLIST_SYNC_INTERVAL:
+                self.sync(BlacklistedToken.objects.filter(id__gt=self.last_id))
+        return self.bloom
+
+    def sync(self, rows):
+        for row_id, jti in rows.values_list('id', 'token__jti').order_by('id').iterator():
+            self.bloom.add(jti)
+            self.last_id = row_id
+        self.synced = time.monotonic()
+
+    def reset(self):
+        with self.lock:
+            self.bloom = None
+
+    def add(self, jti, expires_at):
+        timeout = int(expires_at.timestamp() - time.time()) + 1
+        if timeout > 0:
+            cache.set(self.cache_key(jti), True, timeout)
+        if self.bloom is not None:
+            with self.lock:
+                self.bloom.add(jti)
+
+    def is_blacklisted(self, jti):
+        if cache.get(self.cache_key(jti)):
+            return True
+        if jti not in self.load():
+            return False
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+blacklist_index = TokenBlacklistIndex()
+
+
+class PrefilteredRefreshToken(RefreshToken):
+    def check_blacklist(self):
+        if not settings.JWT_BLACKLIST_PREFILTER:
+            return super().check_blacklist()
+        if blacklist_index.is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+
+class PrefilteredTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = PrefilteredRefreshToken
@@ -0,0 +1,318 @@
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connections, transaction
+from django.test import Client, RequestFactory
+from django.urls import resolve
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from .datagen import WORDS, SyntheticDataGenerator, isbn13
+from .metrics import registry
+from .models import Author, Book, Borrowing, LoanCounter, Reservation
+from .leaderboards import build_leaderboards
+from .profiling import RequestProfile
+from .recommendations import refresh_neighbours
+from .similarity import build_index
+
+BENCH_PASSWORD = 'bench-password'
+SEARCH_TERMS = WORDS[:5]
+
+
+def percentile(ordered, q):
+    # Nearest-rank percentile of an already sorted list
+    if not ordered:
+        return None
+    return ordered[max(0, min(len(ordered) - 1, round(q / 100 * len(ordered)) - 1))]
+
+
+def summarize(latencies, elapsed):
+    ordered = sorted(latencies)
+    return {
+        'requests': len(ordered),
+        'throughput_rps': round(len(ordered) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(statistics.median(ordered) * 1000, 2) if ordered else None,
+        'p95_ms': round(percentile(ordered, 95) * 1000, 2) if ordered else None,
+        'p99_ms': round(percentile(ordered, 99) * 1000, 2) if ordered else None,
+    }
+
+
+def seed_dataset(books=2000, users=50, loans_per_user=20, seed=0):
+    """
+    Generate a skewed synthetic dataset. Users are named bench-user-N (N=0 is
+    the heaviest borrower) and share BENCH_PASSWORD; bench-admin is a superuser.
+    """
+    generator = SyntheticDataGenerator(
+        seed=seed, authors=max(1, books // 10), books=books, users=users, loans=users * loans_per_user,
+        active_loans=users, reservations=users // 2, scores=users * loans_per_user,
+        username_prefix='bench-user-', password=BENCH_PASSWORD,
+    )
+    with transaction.atomic():
+        generator.generate()
+        User.objects.create_superuser('bench-admin', password=BENCH_PASSWORD)
+    refresh_neighbours(full=True)
+    build_leaderboards()
+    build_index()
+
+
+class BenchContext:
+    """Hands out fresh users, free books and tokens to the scenarios."""
+
+    def __init__(self):
+        self.sequence = 0
+        self.password = make_password(BENCH_PASSWORD)
+        self.profile_id = None
+
+    def unique(self, prefix):
+        self.sequence += 1
+        return f'{prefix}-{time.time_ns()}-{self.sequence}'
+
+    def bearer(self, user):
+        return f'Bearer {AccessToken.for_user(user)}'
+
+    def admin(self):
+        return User.objects.get(username='bench-admin')
+
+    def users(self, count):
+        return list(User.objects.filter(username__startswith='bench-user-').order_by('id')[:count])
+
+    def fresh_users(self, count):
+        # Borrowing scenarios need users with free loan slots
+        prefix = self.unique('bench-client')
+        User.objects.bulk_create([User(username=f'{prefix}-{i}', password=self.password) for i in range(count)])
+        return list(User.objects.filter(username__startswith=f'{prefix}-').order_by('id'))
+
+    def profile(self):
+        # One stored profile for the profile read scenarios
+        if self.profile_id is None:
+            profile = RequestProfile(RequestFactory().get('/api/books/'))
+            profile.start()
+            list(Book.objects.order_by('id')[:20])
+            profile.stop()
+            self.profile_id = profile.save('book-list', 200)
+        return self.profile_id
+
+    def free_books(self, count):
+        active = Borrowing.objects.filter(return_date__isnull=True).values('book_id')
+        return list(
+            Book.objects.exclude(id__in=active).exclude(id__in=Reservation.objects.values('book_id'))
+            .order_by('id').values_list('id', flat=True)[:count]
+        )
+
+    def open_loans(self, users, per_user):
+        book_ids = self.free_books(len(users) * per_user)
+        loans = Borrowing.objects.bulk_create(
+            [Borrowing(user=users[i // per_user], book_id=book_id) for i, book_id in enumerate(book_ids)]
+        )
+        counts = {}
+        for loan in loans:
+            counts[loan.user_id] = counts.get(loan.user_id, 0) + 1
+        LoanCounter.objects.bulk_create([LoanCounter(user_id=u, active_loans=n) for u, n in counts.items()])
+        return loans
+
+
+# Each scenario returns the requests to time as (method, path, json body, authorization)
+
+def reads(path_for, admin=False):
+    def prepare(ctx, count):
+        user = ctx.admin() if admin else ctx.users(1)[0]
+        token = ctx.bearer(user)
+        return [('GET', path_for(ctx, i), None, token) for i in range(count)]
+    return prepare
+
+
+def token_obtain(ctx, count):
+    usernames = [user.username for user in ctx.users(count)]
+    return [('POST', '/api/token/', {'username': usernames[i % len(usernames)], 'password': BENCH_PASSWORD}, None)
+            for i in range(count)]
+
+
+def token_refresh(ctx, count):
+    # Refresh tokens are rotated and blacklisted, so each request gets its own
+    users = ctx.users(count)
+    return [('POST', '/api/token/refresh/', {'refresh': str(RefreshToken.for_user(users[i % len(users)]))}, None)
+            for i in range(count)]
+
+
+def register(path):
+    def prepare(ctx, count):
+        prefix = ctx.unique('bench-register')
+        return [('POST', path, {'username': f'{prefix}-{i}', 'password': BENCH_PASSWORD,
+                                'email': f'{prefix}-{i}@example.com'}, None) for i in range(count)]
+    return prepare
+
+
+def book_create(ctx, count):
+    token = ctx.bearer(ctx.admin())
+    author_id = Author.objects.values_list('id', flat=True).first()
+    return [('POST', '/api/books/create/', {
+        'title': f'New book {i}', 'description': 'Created by the benchmark', 'author': author_id,
+        'isbn': isbn13(10 ** 8 + i),
+        'category': 'New', 'publication_date': '2024-01-01',
+    }, token) for i in range(count)]
+
+
+def book_score(ctx, count):
+    users = ctx.fresh_users(count)
+    book_ids = list(Book.objects.order_by('-id').values_list('id', flat=True)[:count])
+    return [('POST', '/api/books/score/', {'book': book_id, 'score': 4}, ctx.bearer(user))
+            for user, book_id in zip(users, book_ids)]
+
+
+def borrow(ctx, count):
+    users = ctx.fresh_users(count)
+    return [('POST', '/api/borrow/', {'book': book_id}, ctx.bearer(user))
+            for user, book_id in zip(users, ctx.free_books(count))]
+
+
+def bulk_borrow(ctx, count):
+    users = ctx.fresh_users(count)
+    book_ids = ctx.free_books(count * 5)
+    return [('POST', '/api/borrow/bulk/', {'books': book_ids[i * 5:i * 5 + 5]}, ctx.bearer(user))
+            for i, user in enumerate(users) if book_ids[i * 5:i * 5 + 5]]
+
+
+def return_book(ctx, count):
+    users = ctx.fresh_users(count)
+    tokens = {user.id: ctx.bearer(user) for user in users}
+    return [('DELETE', f'/api/return/{loan.id}/', None, tokens[loan.user_id]) for loan in ctx.open_loans(users, 1)]
+
+
+def bulk_return(ctx, count):
+    users = ctx.fresh_users(count)
+    loans = {}
+    for loan in ctx.open_loans(users, 5):
+        loans.setdefault(loan.user_id, []).append(loan.id)
+    return [('POST', '/api/return/bulk/', {'borrowings': loans[user.id]}, ctx.bearer(user))
+            for user in users if user.id in loans]
+
+
+def reserve(ctx, count):
+    users = ctx.fresh_users(count)
+    return [('POST', '/api/reserve/', {'book': book_id}, ctx.bearer(user))
+            for user, book_id in zip(users, ctx.free_books(count))]
+
+
+def profiling_token(ctx, count):
+    token = ctx.bearer(ctx.admin())
+    return [('POST', '/api/profiles/token/', None, token) for _ in range(count)]
+
+
+def first_id(model):
+    return model.objects.order_by('id').values_list('id', flat=True).first()
+
+
+SCENARIOS = {
+    'token-obtain': token_obtain,
+    'token-refresh': token_refresh,
+    'register': register('/api/register/'),
+    'async-register': register('/api/async/register/'),
+    'author-list': reads(lambda ctx, i: '/api/authors/', admin=True),
+    'author-detail': reads(lambda ctx, i: f'/api/authors/{first_id(Author)}/', admin=True),
+    'book-list': reads(lambda ctx, i: '/api/books/'),
+    'book-search': reads(lambda ctx, i: f'/api/books/search/?q={SEARCH_TERMS[i % len(SEARCH_TERMS)]}'),
+    'book-facets': reads(lambda ctx, i: '/api/books/facets/'),
+    'book-detail': reads(lambda ctx, i: f'/api/books/{first_id(Book)}/', admin=True),
+    'also-borrowed': reads(lambda ctx, i: f'/api/books/{first_id(Book)}/also-borrowed/'),
+    'similar': reads(lambda ctx, i: f'/api/books/{first_id(Book)}/similar/'),
+    'recommendations': reads(lambda ctx, i: '/api/recommendations/'),
+    'leaderboard': reads(lambda ctx, i: '/api/leaderboards/top-rated/'),
+    'book-create': book_create,
+    'book-score': book_score,
+    'borrow': borrow,
+    'bulk-borrow': bulk_borrow,
+    'return': return_book,
+    'bulk-return': bulk_return,
+    'reserve': reserve,
+    'borrowed-books': reads(lambda ctx, i: '/api/borrowed-books/'),
+    'reserved-books': reads(lambda ctx, i: '/api/reserved-books/'),
+    'borrowing-export': reads(lambda ctx, i: f'/api/borrowings/export/?from={date.today()}', admin=True),
+    'profiling-token': profiling_token,
+    'profile-list': reads(lambda ctx, i: '/api/profiles/', admin=True),
+    'profile-detail': reads(lambda ctx, i: f'/api/profiles/{ctx.profile()}/', admin=True),
+    'profile-download': reads(lambda ctx, i: f'/api/profiles/{ctx.profile()}/collapsed/', admin=True),
+    'metrics': reads(lambda ctx, i: '/metrics', admin=True),
+    'async-book-list': reads(lambda ctx, i: '/api/async/books/'),
+    'async-book-detail': reads(lambda ctx, i: f'/api/async/books/{first_id(Book)}/', admin=True),
+    'async-borrowed-books': reads(lambda ctx, i: '/api/async/borrowed-books/'),
+    'async-reserved-books': reads(lambda ctx, i: '/api/async/reserved-books/'),
+}
+
+
+class InProcessRunner:
+    """Sends requests through the Django test client, one client per thread."""
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def send(self, method, path, data, authorization):
+        if not hasattr(self.local, 'client'):
+            # Server errors are counted, not raised
+            self.local.client = Client(raise_request_exception=False)
+        headers = {'Authorization': authorization} if authorization else {}
+        response = self.local.client.generic(
+            method, path, json.dumps(data) if data is not None else '',
+            content_type='application/json', headers=headers,
+        )
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response.status_code
+
+
+class HTTPRunner:
+    """Sends requests to a running server."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def send(self, method, path, data, authorization):
+        request = urllib.request.Request(
+            self.base_url + path, method=method,
+            data=json.dumps(data).encode() if data is not None else None,
+            headers={'Content-Type': 'application/json', **({'Authorization': authorization} if authorization else {})},
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as exc:
+            return exc.code
+
+
+def run_scenario(runner, requests, concurrency, in_process=True):
+    """Time `requests` split across `concurrency` threads; returns the summary."""
+    if not requests:
+        return summarize([], 0)
+    route = resolve(requests[0][1].split('?')[0])
+    registry.reset()
+    latencies, errors = [], []
+
+    def worker(chunk):
+        try:
+            for method, path, data, authorization in chunk:
+                started = time.perf_counter()
+                status = runner.send(method, path, data, authorization)
+                latencies.append(time.perf_counter() - started)
+                if status >= 400:
+                    errors.append(status)
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, [requests[i::concurrency] for i in range(concurrency)]))
+    result = summarize(latencies, time.perf_counter() - started)
+
+    result['method'] = requests[0][0]
+    result['errors'] = len(errors)
+    result['queries_per_request'] = None
+    if in_process:
+        stats = registry.snapshot().get((route.view_name, requests[0][0]))
+        if stats and stats['count']:
+            result['queries_per_request'] = round(stats['query_sum'] / stats['count'], 2)
+    return result
@@ -0,0 +1,137 @@
+import hashlib
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+from .routers import pin_to_primary
+
+
+def version_key(namespace):
+    return f'version:{namespace}'
+
+
+def version_store():
+    # Versions must agree across workers, or one worker keeps serving what
+    # another has invalidated; responses stay in the per-process default cache.
+    return caches[settings.SHARED_CACHE]
+
+
+def get_version(namespace):
+    store = version_store()
+    key = version_key(namespace)
+    version = store.get(key)
+    if version is None:
+        # Seed from the clock so a flushed cache never hands out an old version
+        store.add(key, time.time_ns() // 1000, timeout=None)
+        version = store.get(key)
+    return version
+
+
+def bump_version(namespace):
+    store = version_store()
+    key = version_key(namespace)
+    pin_to_primary(namespace)
+    # The file store has no atomic incr; racing bumps may agree on one value,
+    # which is still newer than anything cached before either of them.
+    store.set(key, max(time.time_ns() // 1000, (store.get(key) or 0) + 1), timeout=None)
+
+
+def user_namespace(namespace, user_id):
+    # Versions that only move for one user's own data
+    return f'{namespace}:user:{user_id}'
+
+
+def bump_version_on_commit(namespace):
+    # Readers racing the transaction may cache pre-commit data under the old
+    # version, so the bump has to happen after the commit becomes visible.
+    transaction.on_commit(lambda: bump_version(namespace))
+
+
+def request_digest(request, *extra):
+    params = sorted((key, value) for key, values in request.query_params.lists() for value in values)
+    return hashlib.md5(f'{request.get_host()}{request.path}?{params}{extra}'.encode()).hexdigest()
+
+
+class VersionedCacheMixin:
+    """
+    Serve GET responses from the cache. Keys embed the current version of each
+    namespace in `cache_namespaces`, so a bump makes every older entry
+    unreachable. The versions live in SHARED_CACHE, so a bump made by any
+    worker is seen by all of them, even though each caches responses locally.
+    """
+    cache_namespaces = ('catalog',)
+
+    def get_cache_namespaces(self):
+        return self.cache_namespaces
+
+    def get_cache_key(self, request):
+        versions = '.'.join(str(get_version(namespace)) for namespace in self.get_cache_namespaces())
+        return f'response:{type(self).__name__}:{versions}:{request_digest(request)}'
+
+    def get(self, request, *args, **kwargs):
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.CATALOG_CACHE_TIMEOUT)
+        return response
+
+    async def aget(self, request, *args, **kwargs):
+        # get() for the async routes (books.async_views)
+        key = await sync_to_async(self.get_cache_key)(request)
+        data = await cache.aget(key)
+        if data is not None:
+            return Response(data)
+        response = await super().aget(request, *args, **kwargs)
+        if response.status_code == 200:
+            await cache.aset(key, response.data, settings.CATALOG_CACHE_TIMEOUT)
+        return response
+
+
+class ConditionalGetMixin:
+    """
+    Strong ETags on GET, built from the version counters of the view's
+    namespaces instead of a hash of the body. A request whose If-None-Match
+    still matches gets a 304 before anything is queried or serialized. The
+    counters are read from SHARED_CACHE, so every worker hands out and
+    accepts the same tags, and a write through any of them retires them.
+    """
+
+    def get_cache_namespaces(self):
+        return self.cache_namespaces
+
+    def get_etag(self, request):
+        versions = '.'.join(str(get_version(namespace)) for namespace in self.get_cache_namespaces())
+        # The same URL renders differently per user and per negotiated format
+        return f'"{request_digest(request, versions, request.user.pk, request.accepted_media_type)}"'
+
+    def not_modified(self, request, etag):
+        # If-None-Match uses the weak comparison, so W/ tags added by proxies still match
+        return etag in {tag.removeprefix('W/') for tag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))}
+
+    def get(self, request, *args, **kwargs):
+        # Read before the body is built: a write landing in between leaves the
+        # response tagged with the older version, which only costs a refetch.
+        etag = self.get_etag(request)
+        if self.not_modified(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+        return response
+
+    async def aget(self, request, *args, **kwargs):
+        # get() for the async routes (books.async_views)
+        etag = await sync_to_async(self.get_etag)(request)
+        if self.not_modified(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        response = await super().aget(request, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+        return response
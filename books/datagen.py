@@ -0,0 +1,304 @@
+import random
+from bisect import bisect
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection
+from django.db.models import Max
+from .models import Author, Book, BookScore, Borrowing, LoanCounter, Reservation, MAX_ACTIVE_LOANS
+from .utils import batched
+
+WORDS = [
+    'history', 'garden', 'river', 'night', 'winter', 'silent', 'empire', 'ocean', 'shadow', 'light',
+    'stone', 'iron', 'golden', 'forest', 'city', 'journey', 'secret', 'house', 'war', 'summer',
+    'island', 'mountain', 'letters', 'dream', 'fire', 'glass', 'north', 'storm', 'memory', 'song',
+]
+CATEGORIES = [
+    'Fiction', 'Mystery', 'Science Fiction', 'Fantasy', 'Biography', 'History', 'Romance', 'Poetry',
+    'Science', 'Philosophy', 'Travel', 'Children', 'Horror', 'Thriller', 'Art', 'Cooking',
+]
+NATIONALITIES = ['American', 'British', 'French', 'German', 'Nigerian', 'Japanese', 'Brazilian', 'Indian']
+LOAN_DAYS = 14
+DAY = 86400
+EPOCH = date(1970, 1, 1)
+
+
+def zipf_cum_weights(n, exponent):
+    # Cumulative weights of a Zipf distribution over ranks 1..n; rank 1 is the most popular
+    return np.cumsum(1 / np.arange(1, n + 1) ** exponent)
+
+
+def datetime_texts(seconds):
+    # The text the ORM stores for naive UTC datetimes, from an array of epoch seconds
+    return [text.replace('T', ' ') for text in np.datetime_as_string(seconds.astype('datetime64[s]')).tolist()]
+
+
+def date_texts(seconds):
+    return np.datetime_as_string((seconds // DAY).astype('datetime64[D]')).tolist()
+
+
+def isbn13(n):
+    # Valid ISBN-13 from a running number
+    body = f'978{n % 10 ** 9:09d}'
+    check = -sum(int(c) * (3 if i % 2 else 1) for i, c in enumerate(body)) % 10
+    return f'{body}{check}'
+
+
+def insert_rows(model, fields, rows, batch_size=None):
+    """
+    executemany() straight into the model's table; returns the number of rows.
+    The rows go in one call unless batch_size splits them.
+    """
+    columns = ', '.join(connection.ops.quote_name(model._meta.get_field(name).column) for name in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    sql = f'INSERT INTO {connection.ops.quote_name(model._meta.db_table)} ({columns}) VALUES ({placeholders})'
+    count = 0
+    with connection.cursor() as cursor:
+        for batch in batched(rows, batch_size) if batch_size else [list(rows)]:
+            cursor.executemany(sql, batch)
+            count += len(batch)
+    return count
+
+
+class SyntheticDataGenerator:
+    """
+    Seeded generator for catalog and circulation data. The same seed and
+    as_of date always produce the same rows.
+
+    Popularity is Zipf-distributed: low-numbered books are borrowed and rated
+    far more often (book_skew), and low-numbered users borrow far more
+    (user_skew). A share of the active loans is overdue, with an exponential
+    tail of overdue days. Rows get explicit ids after the current maximum, so
+    the generator can be run repeatedly against the same database.
+
+    Invariants kept: one score per (user, book), at most MAX_ACTIVE_LOANS
+    active loans per user (with matching LoanCounter rows), at most one active
+    loan per book, and waitlists only on loaned books, without the borrower
+    and with one reservation per reader.
+    """
+
+    def __init__(self, seed=0, authors=1000, books=10000, users=5000, loans=100000, active_loans=5000,
+                 reservations=1000, scores=50000, book_skew=1.1, user_skew=1.0, overdue_rate=0.1,
+                 overdue_mean_days=10, history_days=730, username_prefix=None, password='password',
+                 as_of=None, batch_size=None):
+        self.rng = random.Random(seed)
+        # The bulk tables (scores, loan history) are drawn as arrays
+        self.np_rng = np.random.default_rng(seed)
+        self.counts = {
+            'authors': max(1, authors), 'books': max(1, books), 'users': max(1, users),
+            'loans': loans, 'active_loans': active_loans, 'reservations': reservations, 'scores': scores,
+        }
+        self.book_weights = zipf_cum_weights(self.counts['books'], book_skew)
+        self.user_weights = zipf_cum_weights(self.counts['users'], user_skew)
+        self.author_weights = zipf_cum_weights(self.counts['authors'], book_skew)
+        self.overdue_rate = overdue_rate
+        self.overdue_mean_days = overdue_mean_days
+        self.history_days = history_days
+        self.username_prefix = username_prefix or f'gen{seed}-'
+        self.password = password
+        self.as_of = as_of or date.today()
+        # Timestamps are whole UTC seconds since the epoch; "now" is noon on as_of
+        self.now = (self.as_of - EPOCH).days * DAY + DAY // 2
+        self.day_cache = {}
+        self.clock = None
+        self.batch_size = batch_size
+
+    def pick(self, cum_weights, k):
+        # k zero-based ranks drawn from the cumulative weights
+        total = cum_weights[-1]
+        rand = self.rng.random
+        return [bisect(cum_weights, rand() * total) for _ in range(k)]
+
+    def draw(self, cum_weights, k):
+        # pick() for large k, as an array
+        return np.searchsorted(cum_weights, self.np_rng.random(k) * cum_weights[-1], side='right')
+
+    def day(self, ts):
+        # Few distinct days, so their text is cached
+        days = ts // DAY
+        text = self.day_cache.get(days)
+        if text is None:
+            text = self.day_cache[days] = (EPOCH + timedelta(days=days)).isoformat()
+        return text
+
+    def stamp(self, ts):
+        # The text the ORM stores for a naive UTC datetime; formatting is the
+        # hot loop, so hours and minutes:seconds are rendered once up front
+        if self.clock is None:
+            self.clock = ([f'{h:02d}:' for h in range(24)], [f'{s // 60:02d}:{s % 60:02d}' for s in range(3600)])
+        hours, ticks = self.clock
+        seconds = ts % DAY
+        return f'{self.day(ts)} {hours[seconds // 3600]}{ticks[seconds % 3600]}'
+
+    def next_ids(self, model, count):
+        start = (model.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+        return list(range(start, start + count))
+
+    def generate(self):
+        """Insert everything; call inside transaction.atomic(). Returns rows written per table."""
+        rng = self.rng
+        # PBKDF2 releases the GIL, so the shared hash is computed while the catalog is written
+        hashing = ThreadPoolExecutor(max_workers=1)
+        password = hashing.submit(make_password, self.password)
+        hashing.shutdown(wait=False)
+        author_ids = self.next_ids(Author, self.counts['authors'])
+        book_ids = self.next_ids(Book, self.counts['books'])
+        user_ids = self.next_ids(User, self.counts['users'])
+        written = {}
+
+        written['authors'] = insert_rows(Author, ['id', 'name', 'biography', 'nationality', 'date_of_birth'], [
+            (author_id, f'Author {author_id}', '', rng.choice(NATIONALITIES),
+             (date(1920, 1, 1) + timedelta(days=rng.randrange(30000))).isoformat())
+            for author_id in author_ids
+        ], self.batch_size)
+
+        # Scores come first so the books can be written with their rating aggregates
+        score_users, score_books, score_values = self.scores(len(book_ids))
+        score_sum = np.bincount(score_books, weights=score_values, minlength=len(book_ids)).astype(int).tolist()
+        score_count = np.bincount(score_books, minlength=len(book_ids)).tolist()
+
+        author_ranks = self.draw(self.author_weights, len(book_ids)).tolist()
+        written['books'] = insert_rows(Book, [
+            'id', 'title', 'description', 'author', 'isbn', 'category', 'publication_date', 'score_sum',
+            'score_count',
+        ], [
+            (book_id, f'{rng.choice(WORDS).title()} {rng.choice(WORDS)} {book_id}',
+             ' '.join(rng.choices(WORDS, k=12)), author_ids[author_ranks[i]], isbn13(book_id),
+             CATEGORIES[min(int(rng.expovariate(0.3)), len(CATEGORIES) - 1)],
+             (date(1950, 1, 1) + timedelta(days=rng.randrange(27000))).isoformat(), score_sum[i], score_count[i])
+            for i, book_id in enumerate(book_ids)
+        ], self.batch_size)
+
+        password = password.result()
+        joined_span = (self.history_days + 365) * DAY
+        written['users'] = insert_rows(User, [
+            'id', 'password', 'is_superuser', 'username', 'first_name', 'last_name', 'email', 'is_staff',
+            'is_active', 'date_joined',
+        ], [
+            (user_id, password, False, f'{self.username_prefix}{i}', '', '',
+             f'{self.username_prefix}{i}@example.com', False, True,
+             self.stamp(self.now - int(rng.random() * joined_span)))
+            for i, user_id in enumerate(user_ids)
+        ], self.batch_size)
+
+        written['scores'] = insert_rows(BookScore, ['user', 'book', 'score'], list(zip(
+            np.asarray(user_ids)[score_users].tolist(), np.asarray(book_ids)[score_books].tolist(),
+            score_values.tolist(),
+        )), self.batch_size)
+
+        written['loans'] = insert_rows(
+            Borrowing, ['user', 'book', 'borrow_date', 'due_date', 'return_date'],
+            self.history(user_ids, book_ids), self.batch_size,
+        )
+
+        active = self.active_loans(len(user_ids), len(book_ids))
+        written['active_loans'] = insert_rows(
+            Borrowing, ['user', 'book', 'borrow_date', 'due_date', 'return_date'],
+            [(user_ids[user], book_ids[book], self.stamp(borrowed), self.day(borrowed + LOAN_DAYS * DAY), None)
+             for user, book, borrowed in active],
+            self.batch_size,
+        )
+        per_user = {}
+        for user, _, _ in active:
+            per_user[user] = per_user.get(user, 0) + 1
+        insert_rows(LoanCounter, ['user', 'active_loans'],
+                    [(user_ids[user], count) for user, count in sorted(per_user.items())], self.batch_size)
+
+        written['reservations'] = insert_rows(Reservation, ['user', 'book', 'position', 'reserved_date'], [
+            (user_ids[user], book_ids[book], position, self.day(reserved))
+            for user, book, position, reserved in self.reservations(active, len(user_ids))
+        ], self.batch_size)
+
+        # Backends with sequences (PostgreSQL) must continue after the explicit ids
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Author, Book, User]):
+                cursor.execute(sql)
+        return written
+
+    def scores(self, book_count):
+        # Distinct (user, book) pairs as arrays of ranks plus the score; duplicate draws are dropped
+        target = min(self.counts['scores'], self.counts['users'] * book_count)
+        users = books = np.empty(0, dtype=np.int64)
+        attempts = 0
+        while len(users) < target and attempts < target * 4:
+            batch = target - len(users)
+            attempts += batch
+            users = np.concatenate([users, self.draw(self.user_weights, batch)])
+            books = np.concatenate([books, self.draw(self.book_weights, batch)])
+            # Keep the first draw of each pair, in draw order
+            first = np.sort(np.unique(users * book_count + books, return_index=True)[1])
+            users, books = users[first], books[first]
+        # Popular books rate a little higher
+        scores = np.clip(np.rint(self.np_rng.normal(4 - books / book_count, 1)), 1, 5).astype(np.int64)
+        return users, books, scores
+
+    def history(self, user_ids, book_ids):
+        # Returned loans, all due before today; about 15% came back late
+        count = self.counts['loans']
+        users = np.asarray(user_ids)[self.draw(self.user_weights, count)]
+        books = np.asarray(book_ids)[self.draw(self.book_weights, count)]
+        latest = self.now - (LOAN_DAYS + 30) * DAY
+        borrowed = latest - (self.np_rng.random(count) * self.history_days * DAY).astype(np.int64)
+        late = self.np_rng.random(count)
+        kept = np.where(
+            late < 0.85,
+            DAY + (late / 0.85 * (LOAN_DAYS - 1) * DAY).astype(np.int64),
+            LOAN_DAYS * DAY + (self.np_rng.exponential(5, count) * DAY).astype(np.int64),
+        )
+        return list(zip(users.tolist(), books.tolist(), datetime_texts(borrowed),
+                        date_texts(borrowed + LOAN_DAYS * DAY), datetime_texts(borrowed + kept)))
+
+    def active_loans(self, user_count, book_count):
+        # Skewed draws first; once the popular books are out, fall back to uniform ones
+        target = min(self.counts['active_loans'], book_count, user_count * MAX_ACTIVE_LOANS)
+        rand = self.rng.random
+        loaned_books = set()
+        per_user = [0] * user_count
+        rows = []
+        attempts = 0
+        while len(rows) < target and attempts < target * 20:
+            attempts += 1
+            book = self.pick(self.book_weights, 1)[0]
+            if book in loaned_books:
+                book = int(rand() * book_count)
+            user = self.pick(self.user_weights, 1)[0]
+            if per_user[user] >= MAX_ACTIVE_LOANS:
+                user = int(rand() * user_count)
+            if book in loaned_books or per_user[user] >= MAX_ACTIVE_LOANS:
+                continue
+            loaned_books.add(book)
+            per_user[user] += 1
+            if rand() < self.overdue_rate:
+                days_back = LOAN_DAYS + 1 + self.rng.expovariate(1 / self.overdue_mean_days)
+            else:
+                days_back = rand() * LOAN_DAYS
+            rows.append((user, book, self.now - int(days_back * DAY)))
+        return rows
+
+    def reservations(self, active, user_count):
+        # Waitlists form on books that are out; popular books get the long queues
+        if user_count < 2 or not active:
+            return []
+        loaned = sorted(active, key=lambda row: row[1])
+        weights = zipf_cum_weights(len(loaned), 1.0)
+        queues = {}
+        attempts = 0
+        total = 0
+        while total < self.counts['reservations'] and attempts < self.counts['reservations'] * 4:
+            attempts += 1
+            borrower, book, borrowed = loaned[self.pick(weights, 1)[0]]
+            reader = self.pick(self.user_weights, 1)[0]
+            queue = queues.setdefault(book, {})
+            if reader == borrower or reader in queue:
+                continue
+            queue[reader] = max(borrowed, self.now - int(self.rng.random() * LOAN_DAYS * DAY))
+            total += 1
+        rows = []
+        for book, queue in sorted(queues.items()):
+            # Positions follow reservation time
+            for position, (reader, reserved) in enumerate(sorted(queue.items(), key=lambda item: item[1]), 1):
+                rows.append((reader, book, position, reserved))
+        return rows
@@ -0,0 +1,63 @@
+import csv
+import json
+from datetime import datetime, time, timedelta
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from .models import Borrowing
+
+BORROWING_EXPORT_FIELDS = ['id', 'username', 'book_title', 'borrow_date', 'due_date', 'return_date']
+
+
+def borrowing_rows(start=None, end=None, chunk_size=2000):
+    """
+    Yield borrowing tuples in id order, with the username and book title joined
+    in the same query and fetched from the cursor `chunk_size` rows at a time.
+    `start` and `end` are inclusive dates on the borrow date.
+    """
+    queryset = Borrowing.objects.order_by('id')
+    if start:
+        queryset = queryset.filter(borrow_date__gte=timezone.make_aware(datetime.combine(start, time.min)))
+    if end:
+        queryset = queryset.filter(borrow_date__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)))
+    return queryset.values_list(
+        'id', 'user__username', 'book__title', 'borrow_date', 'due_date', 'return_date'
+    ).iterator(chunk_size=chunk_size)
+
+
+class Echo:
+    # csv.writer target that hands back each formatted line instead of storing it
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(BORROWING_EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(BORROWING_EXPORT_FIELDS, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def buffered(lines, size=64 * 1024):
+    # Group lines into larger chunks so the response isn't written row by row
+    buffer = []
+    length = 0
+    for line in lines:
+        buffer.append(line)
+        length += len(line)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+EXPORT_FORMATS = {
+    'csv': (csv_lines, 'text/csv'),
+    'ndjson': (ndjson_lines, 'application/x-ndjson'),
+}
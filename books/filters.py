@@ -0,0 +1,103 @@
+from collections import Counter
+from datetime import date
+from django.conf import settings
+from django.db.models import Count, Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+from .models import Author, Book
+
+# Query parameter -> (lookup, value type). Repeating a parameter matches any of its values.
+FILTERS = {
+    'category': ('category__in', str),
+    'author': ('author_id__in', int),
+    'nationality': ('author__nationality__in', str),
+}
+
+
+def year_param(params, name):
+    value = params.get(name, '')
+    if not value:
+        return None
+    try:
+        year = int(value)
+    except ValueError:
+        raise ValidationError({name: 'A valid year is required.'})
+    if not 1 <= year <= 9999:
+        raise ValidationError({name: 'A valid year is required.'})
+    return year
+
+
+def catalog_filters(params):
+    """The catalog filters in `params` as Q objects, keyed by facet name."""
+    filters = {}
+    for name, (lookup, convert) in FILTERS.items():
+        values = [value for value in params.getlist(name) if value != '']
+        if not values:
+            continue
+        try:
+            filters[name] = Q(**{lookup: [convert(value) for value in values]})
+        except ValueError:
+            raise ValidationError({name: 'A valid integer is required.'})
+
+    # Year bounds become a date range, so the publication_date index applies
+    year_from, year_to = year_param(params, 'year_from'), year_param(params, 'year_to')
+    if year_from is not None or year_to is not None:
+        years = Q()
+        if year_from is not None:
+            years &= Q(publication_date__gte=date(year_from, 1, 1))
+        if year_to is not None:
+            years &= Q(publication_date__lte=date(year_to, 12, 31))
+        filters['year'] = years
+    return filters
+
+
+def apply_filters(queryset, filters, skip=None):
+    for name, condition in filters.items():
+        if name != skip:
+            queryset = queryset.filter(condition)
+    return queryset
+
+
+class CatalogFilterBackend(BaseFilterBackend):
+    """?category=, ?author=, ?nationality=, ?year_from= and ?year_to= on book lists."""
+
+    def filter_queryset(self, request, queryset, view):
+        return apply_filters(queryset, catalog_filters(request.query_params))
+
+
+# Facet -> grouped column
+FACETS = {
+    'category': 'category',
+    'author': 'author_id',
+    'nationality': 'author__nationality',
+    'year': 'publication_date',
+}
+
+
+def facet_counts(filters):
+    """
+    Book counts per value of every facet, one GROUP BY query each. A facet is
+    counted under all filters but its own, so clients can offer the other
+    values of a facet that is already selected.
+    """
+    limit = settings.CATALOG_FACET_LIMIT
+    facets = {}
+    for name, column in FACETS.items():
+        rows = apply_filters(Book.objects.all(), filters, skip=name).order_by().values_list(column).annotate(
+            count=Count('id')
+        )
+        if name == 'year':
+            # Grouping by the indexed date and folding in Python avoids a per-row
+            # year extraction, which SQLite runs as a Python function
+            years = Counter()
+            for published, count in rows:
+                years[published.year] += count
+            top = sorted(years.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        else:
+            top = rows.order_by('-count', column)[:limit]
+        facets[name] = [{'value': value, 'count': count} for value, count in top]
+
+    names = Author.objects.in_bulk([facet['value'] for facet in facets['author']])
+    for facet in facets['author']:
+        facet['label'] = names[facet['value']].name if facet['value'] in names else None
+    return facets
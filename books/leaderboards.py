@@ -0,0 +1,61 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Sum, Value, Window
+from django.db.models.functions import Cast, RowNumber
+from django.utils import timezone
+from .cache import bump_version_on_commit
+from .models import Book, LeaderboardEntry
+
+
+def top_rated():
+    """
+    Books by Bayesian average: every book starts with LEADERBOARD_RATING_PRIOR
+    ratings at the catalog-wide mean, so a single 5 does not beat many 4.5s.
+    """
+    totals = Book.objects.aggregate(score_sum=Sum('score_sum'), score_count=Sum('score_count'))
+    mean = totals['score_sum'] / totals['score_count'] if totals['score_count'] else 0
+    prior = settings.LEADERBOARD_RATING_PRIOR
+    return Book.objects.filter(score_count__gt=0).annotate(
+        value=(Value(float(prior * mean)) + Cast('score_sum', FloatField())) / (Value(float(prior)) + F('score_count'))
+    )
+
+
+def borrowed_in_last(days):
+    def board():
+        since = timezone.now() - timedelta(days=days)
+        # Filtering before annotating counts only the window, read off borrowing_date_idx
+        return Book.objects.filter(borrowing__borrow_date__gte=since).annotate(value=Count('borrowing'))
+    return board
+
+
+BOARDS = {
+    'top-rated': top_rated,
+    'borrowed-7d': borrowed_in_last(7),
+    'borrowed-30d': borrowed_in_last(30),
+}
+
+
+def ranked_entries(board, books):
+    size = settings.LEADERBOARD_SIZE
+    # Overall board: the best `size` books
+    for rank, (book_id, value) in enumerate(books.order_by('-value', 'id').values_list('id', 'value')[:size], 1):
+        yield LeaderboardEntry(board=board, category='', rank=rank, book_id=book_id, value=value)
+    # Category boards: numbered per category in the database, cut at `size`.
+    # The empty category is the overall board, so uncategorised books only rank there.
+    ranked = books.exclude(category='').annotate(position=Window(
+        RowNumber(), partition_by=F('category'), order_by=[F('value').desc(), F('id').asc()],
+    )).filter(position__lte=size).values_list('category', 'position', 'id', 'value')
+    for category, position, book_id, value in ranked:
+        yield LeaderboardEntry(board=board, category=category, rank=position, book_id=book_id, value=value)
+
+
+def build_leaderboards():
+    """Recompute every board into LeaderboardEntry; returns the rows per board."""
+    counts = {}
+    with transaction.atomic():
+        LeaderboardEntry.objects.all().delete()
+        for board, books in BOARDS.items():
+            counts[board] = len(LeaderboardEntry.objects.bulk_create(ranked_entries(board, books()), batch_size=1000))
+        bump_version_on_commit('leaderboards')
+    return counts
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework_simplejwt.tokens import RefreshToken
+from books.benchmark import summarize
+
+# (sync endpoint, async equivalent)
+ENDPOINT_PAIRS = [
+    ('/api/borrowed-books/', '/api/async/borrowed-books/'),
+    ('/api/reserved-books/', '/api/async/reserved-books/'),
+    ('/api/books/', '/api/async/books/'),
+]
+
+
+def add_query_latency(seconds):
+    # Emulates a network database: every query on every thread sleeps first
+    def slow_execute(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def install(sender=None, connection=None, **kwargs):
+        if slow_execute not in connection.execute_wrappers:
+            connection.execute_wrappers.append(slow_execute)
+
+    connection_created.connect(install, weak=False)
+    for connection in connections.all(initialized_only=True):
+        install(connection=connection)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare a sync worker (sync endpoints, one request at a time) with one ASGI process "
+        "serving the async endpoints concurrently, using the in-process test clients. "
+        "Reports both sides as measured; Django runs async ORM queries on one thread per "
+        "process, so the async side is not expected to win on query-bound endpoints."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help="User whose JWT is used for the requests.")
+        parser.add_argument('--requests', type=int, default=200, help="Requests per endpoint and mode.")
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--query-latency-ms', type=float, default=0.0,
+                            help="Artificial delay added to every SQL query.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']!r} does not exist.")
+        headers = {'Authorization': f'Bearer {RefreshToken.for_user(user).access_token}'}
+        if options['query_latency_ms']:
+            add_query_latency(options['query_latency_ms'] / 1000)
+
+        try:
+            # The test clients send Host: testserver
+            setup_test_environment()
+            installed = True
+        except RuntimeError:
+            # Already running under the test runner
+            installed = False
+        try:
+            report = {'async_to_sync_throughput': {}}
+            for sync_path, async_path in ENDPOINT_PAIRS:
+                report[sync_path] = self.run_sync(sync_path, headers, options['requests'])
+                report[async_path] = asyncio.run(
+                    self.run_async(async_path, headers, options['requests'], options['concurrency'])
+                )
+                report['async_to_sync_throughput'][async_path] = round(
+                    report[async_path]['throughput_rps'] / report[sync_path]['throughput_rps'], 2
+                )
+        finally:
+            if installed:
+                teardown_test_environment()
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def run_sync(self, path, headers, total):
+        client = Client()
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(total):
+            request_started = time.perf_counter()
+            response = client.get(path, headers=headers)
+            latencies.append(time.perf_counter() - request_started)
+            if response.status_code != 200:
+                raise CommandError(f"GET {path} returned {response.status_code}")
+        return summarize(latencies, time.perf_counter() - started)
+
+    async def run_async(self, path, headers, total, concurrency):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def one_request():
+            async with semaphore:
+                request_started = time.perf_counter()
+                response = await client.get(path, headers=headers)
+                latencies.append(time.perf_counter() - request_started)
+                if response.status_code != 200:
+                    raise CommandError(f"GET {path} returned {response.status_code}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one_request() for _ in range(total)))
+        return summarize(latencies, time.perf_counter() - started)
@@ -0,0 +1,108 @@
+import json
+import logging
+import os
+import subprocess
+import tempfile
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from books.benchmark import SCENARIOS, BenchContext, HTTPRunner, InProcessRunner, run_scenario, seed_dataset
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic dataset and benchmark every API route, reporting latency percentiles, "
+        "throughput and queries per request as JSON. By default everything runs in-process "
+        "against a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help="Seed of the generated dataset.")
+        parser.add_argument('--books', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--loans-per-user', type=int, default=20, help="Returned loans in each user's history.")
+        parser.add_argument('--requests', type=int, default=50, help="Requests per route.")
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--routes', help="Comma-separated subset of: " + ', '.join(SCENARIOS))
+        parser.add_argument('--server', help="Base URL of a running server (e.g. http://127.0.0.1:8000). "
+                                             "It must use this project's database and SECRET_KEY.")
+        parser.add_argument('--reuse-db', action='store_true',
+                            help="Seed and benchmark the configured database instead of a test database. "
+                                 "Implied by --server.")
+        parser.add_argument('--no-seed', action='store_true', help="Use bench data seeded by an earlier run.")
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        routes = options['routes'].split(',') if options['routes'] else list(SCENARIOS)
+        unknown = set(routes) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown routes: {', '.join(sorted(unknown))}")
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError("--requests and --concurrency must be positive.")
+
+        reuse_db = options['reuse_db'] or bool(options['server'])
+        old_name = None
+        try:
+            setup_test_environment()
+            installed = True
+        except RuntimeError:
+            # Already running under the test runner
+            installed = False
+        # Expected 4xx/5xx responses are counted in the report rather than logged
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            if not reuse_db:
+                # A file database, so the worker threads can share it
+                if connection.vendor == 'sqlite':
+                    connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+                old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            report = self.run(routes, options)
+        finally:
+            request_logger.setLevel(level)
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+            if installed:
+                teardown_test_environment()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def run(self, routes, options):
+        if not options['no_seed']:
+            seed_dataset(options['books'], options['users'], options['loans_per_user'], options['seed'])
+        runner = HTTPRunner(options['server']) if options['server'] else InProcessRunner()
+        ctx = BenchContext()
+
+        results = {}
+        for name in routes:
+            requests = SCENARIOS[name](ctx, options['requests'])
+            results[name] = run_scenario(runner, requests, options['concurrency'], in_process=not options['server'])
+            self.stderr.write(f"{name}: {results[name]['p50_ms']} ms p50, {results[name]['errors']} errors")
+        return {
+            'commit': current_commit(),
+            'started': timezone.now().isoformat(),
+            'target': options['server'] or 'in-process',
+            'database': {'vendor': connection.vendor, 'sqlite_profile': settings.SQLITE_PROFILE or 'default'},
+            'dataset': {key: options[key] for key in ('seed', 'books', 'users', 'loans_per_user')},
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'routes': results,
+        }
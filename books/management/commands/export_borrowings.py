@@ -0,0 +1,31 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from books.exports import EXPORT_FORMATS, borrowing_rows, buffered
+
+
+class Command(BaseCommand):
+    help = "Stream the borrowing history as CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--from', dest='start', type=date.fromisoformat, help="First borrow date (YYYY-MM-DD).")
+        parser.add_argument('--to', dest='end', type=date.fromisoformat, help="Last borrow date (YYYY-MM-DD).")
+        parser.add_argument('--output', help="File to write to; defaults to stdout.")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        write_lines, _ = EXPORT_FORMATS[options['format']]
+        rows = borrowing_rows(options['start'], options['end'], chunk_size=options['chunk_size'])
+        if options['output']:
+            handle = open(options['output'], 'w', newline='', encoding='utf-8')
+        else:
+            handle = self.stdout
+        try:
+            for chunk in buffered(write_lines(rows)):
+                if handle is self.stdout:
+                    handle.write(chunk, ending='')
+                else:
+                    handle.write(chunk)
+        finally:
+            if handle is not self.stdout:
+                handle.close()
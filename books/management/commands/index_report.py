@@ -0,0 +1,72 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from books.models import Book, Borrowing, Reservation
+
+# Indexes backing the circulation hot paths; dropped temporarily for the "before" run
+HOT_PATH_INDEXES = [
+    'borrowing_active_user_idx',
+    'borrowing_due_active_idx',
+    'unique_active_borrowing_per_book',
+    'book_isbn_idx',
+]
+
+
+def hot_path_queries(sample):
+    today = timezone.now().date()
+    return [
+        ('active loans by user', lambda: Borrowing.objects.filter(
+            user_id=sample.user_id, return_date__isnull=True)),
+        ('active loan by book', lambda: Borrowing.objects.filter(
+            book_id=sample.book_id, return_date__isnull=True)),
+        ('next in line', lambda: Reservation.objects.filter(book_id=sample.book_id).order_by('position')[:1]),
+        ('due today', lambda: Borrowing.objects.filter(
+            due_date=today, return_date__isnull=True).values_list('id')),
+        ('isbn lookup', lambda: Book.objects.filter(isbn=sample.book.isbn)),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Show query plans and latency of the circulation hot-path queries with and without their indexes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help="Executions per query when timing.")
+
+    def measure(self, queries, repeat):
+        results = {}
+        for name, build in queries:
+            queryset = build()
+            plan = queryset.explain()
+            started = time.perf_counter()
+            for _ in range(repeat):
+                list(build()[:100])
+            results[name] = (plan, (time.perf_counter() - started) * 1000 / repeat)
+        return results
+
+    def handle(self, *args, **options):
+        sample = Borrowing.objects.select_related('book').order_by('-id').first()
+        if sample is None:
+            raise CommandError("No borrowings found; seed some data first.")
+        queries = hot_path_queries(sample)
+        after = self.measure(queries, options['repeat'])
+
+        before = None
+        if connection.vendor == 'sqlite':
+            # SQLite DDL is transactional: drop the indexes, measure, roll back
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    for index in HOT_PATH_INDEXES:
+                        cursor.execute(f'DROP INDEX IF EXISTS "{index}"')
+                before = self.measure(queries, options['repeat'])
+                transaction.set_rollback(True)
+
+        self.stdout.write(f"Borrowings: {Borrowing.objects.count():,}")
+        for name, _ in queries:
+            plan, elapsed = after[name]
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            if before:
+                self.stdout.write(f"  without indexes: {before[name][1]:.3f} ms")
+                self.stdout.write(f"    {before[name][0]}")
+            self.stdout.write(f"  with indexes:    {elapsed:.3f} ms")
+            self.stdout.write(f"    {plan}")
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from books.models import Borrowing, LoanCounter, MAX_ACTIVE_LOANS
+
+
+class Command(BaseCommand):
+    help = "Rebuild or verify each user's LoanCounter from their open loans."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help="Only report users whose stored counter differs from their open loans.",
+        )
+
+    def stale_counters(self):
+        # user id -> (stored, actual); counters are capped at the limit
+        active = dict(
+            Borrowing.objects.filter(return_date__isnull=True)
+            .order_by().values('user').annotate(count=Count('id')).values_list('user', 'count')
+        )
+        stored = dict(LoanCounter.objects.values_list('user_id', 'active_loans'))
+        stale = {}
+        for user_id in active.keys() | stored.keys():
+            actual = min(active.get(user_id, 0), MAX_ACTIVE_LOANS)
+            if stored.get(user_id, 0) != actual:
+                stale[user_id] = (stored.get(user_id), actual)
+        return stale
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            stale = self.stale_counters()
+            for user_id, (stored, actual) in sorted(stale.items()):
+                self.stdout.write(f"User {user_id}: stored {stored}, actual {actual}")
+            if stale:
+                raise CommandError(f"{len(stale)} user(s) have stale loan counters.")
+            self.stdout.write(self.style.SUCCESS("All loan counters are consistent."))
+            return
+
+        with transaction.atomic():
+            stale = self.stale_counters()
+            LoanCounter.objects.bulk_create(
+                [LoanCounter(user_id=user_id, active_loans=actual) for user_id, (_, actual) in stale.items()],
+                update_conflicts=True, unique_fields=['user'], update_fields=['active_loans'], batch_size=1000,
+            )
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt loan counters for {len(stale)} user(s)."))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+from books.models import Book, score_aggregate_subqueries
+
+
+class Command(BaseCommand):
+    help = "Rebuild or verify the denormalized rating sum/count stored on each book."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help="Only report books whose stored aggregates are out of date.",
+        )
+
+    def handle(self, *args, **options):
+        aggregates = score_aggregate_subqueries()
+        stale = (
+            Book.objects.annotate(actual_sum=aggregates['score_sum'], actual_count=aggregates['score_count'])
+            .exclude(score_sum=F('actual_sum'), score_count=F('actual_count'))
+            .values_list('id', 'score_sum', 'score_count', 'actual_sum', 'actual_count')
+        )
+
+        if options['verify']:
+            mismatches = 0
+            for book_id, score_sum, score_count, actual_sum, actual_count in stale.iterator():
+                mismatches += 1
+                self.stdout.write(
+                    f"Book {book_id}: stored {score_sum}/{score_count}, actual {actual_sum}/{actual_count}"
+                )
+            if mismatches:
+                raise CommandError(f"{mismatches} book(s) have stale rating aggregates.")
+            self.stdout.write(self.style.SUCCESS("All rating aggregates are consistent."))
+            return
+
+        updated = Book.objects.rebuild_score_aggregates()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating aggregates for {updated} book(s)."))
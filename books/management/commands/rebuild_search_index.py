@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+from books.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Recreate the catalog full-text search index from the book and author tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help="Database holding the index.")
+
+    def handle(self, *args, **options):
+        backend = get_search_backend(options['database'])
+        backend.install()
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt search index using {type(backend).__name__}."))
@@ -0,0 +1,212 @@
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import caches
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+_current_request = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Per-request accumulator for DB and serializer time."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+
+@contextmanager
+def track_request():
+    metrics = RequestMetrics()
+    token = _current_request.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current_request.reset(token)
+
+
+@contextmanager
+def timed_serialization():
+    # Only the outermost serializer is timed so nested serializers aren't counted twice
+    metrics = _current_request.get()
+    if metrics is None:
+        yield
+        return
+    metrics.serializer_depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serializer_depth -= 1
+        if metrics.serializer_depth == 0:
+            metrics.serializer_time += time.perf_counter() - started
+
+
+def empty_route_stats():
+    return {
+        'count': 0,
+        'latency_buckets': [0] * len(LATENCY_BUCKETS),
+        'latency_sum': 0.0,
+        'query_buckets': [0] * len(QUERY_BUCKETS),
+        'query_sum': 0,
+        'db_time_sum': 0.0,
+        'serializer_time_sum': 0.0,
+    }
+
+
+class MetricsRegistry:
+    """
+    In-process aggregation keyed by (route, method). Each worker periodically
+    copies its snapshot into a slot in SHARED_CACHE; the /metrics endpoint
+    merges every live slot, so all gunicorn workers are reported together.
+    Without Redis the slots are files, which covers the workers of one host.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.slot = None
+        self.last_flush = 0.0
+        self.routes = {}
+
+    def reset(self):
+        with self.lock:
+            self.routes = {}
+            self.slot = None
+            self.last_flush = 0.0
+
+    def record(self, route, method, latency, request_metrics):
+        with self.lock:
+            stats = self.routes.get((route, method))
+            if stats is None:
+                stats = self.routes[(route, method)] = empty_route_stats()
+            stats['count'] += 1
+            stats['latency_sum'] += latency
+            index = bisect_left(LATENCY_BUCKETS, latency)
+            if index < len(LATENCY_BUCKETS):
+                stats['latency_buckets'][index] += 1
+            stats['query_sum'] += request_metrics.queries
+            index = bisect_left(QUERY_BUCKETS, request_metrics.queries)
+            if index < len(QUERY_BUCKETS):
+                stats['query_buckets'][index] += 1
+            stats['db_time_sum'] += request_metrics.db_time
+            stats['serializer_time_sum'] += request_metrics.serializer_time
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                key: {name: list(value) if isinstance(value, list) else value for name, value in stats.items()}
+                for key, stats in self.routes.items()
+            }
+
+    def store(self):
+        return caches[settings.SHARED_CACHE]
+
+    def slot_key(self, slot):
+        return f'metrics:slot:{slot}'
+
+    def claim_slot(self, timeout):
+        store = self.store()
+        if self.slot is not None and store.get(self.slot_key(self.slot)) == self.worker_id:
+            return self.slot
+        # add() is atomic on Redis. On the file store two workers can race for
+        # a slot; whichever finds its id overwritten on its next flush claims
+        # another, so one of them is missing from /metrics for an interval.
+        for slot in range(settings.METRICS_MAX_WORKERS):
+            if store.add(self.slot_key(slot), self.worker_id, timeout) or \
+                    store.get(self.slot_key(slot)) == self.worker_id:
+                self.slot = slot
+                return slot
+        return None
+
+    def flush(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_flush < settings.METRICS_FLUSH_INTERVAL:
+            return
+        self.last_flush = now
+        timeout = settings.METRICS_FLUSH_INTERVAL * 4
+        slot = self.claim_slot(timeout)
+        if slot is None:
+            return
+        self.store().set_many({
+            self.slot_key(slot): self.worker_id,
+            f'{self.slot_key(slot)}:data': self.snapshot(),
+        }, timeout)
+
+    def collect(self):
+        self.flush(force=True)
+        keys = [f'{self.slot_key(slot)}:data' for slot in range(settings.METRICS_MAX_WORKERS)]
+        merged = {}
+        for snapshot in self.store().get_many(keys).values():
+            for key, stats in snapshot.items():
+                total = merged.setdefault(key, empty_route_stats())
+                for name, value in stats.items():
+                    if isinstance(value, list):
+                        total[name] = [a + b for a, b in zip(total[name], value)]
+                    else:
+                        total[name] += value
+        return merged
+
+
+registry = MetricsRegistry()
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_histogram(lines, name, labels, buckets, counts, total, count):
+    cumulative = 0
+    for bound, bucket_count in zip(buckets, counts):
+        cumulative += bucket_count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+    lines.append(f'{name}_sum{{{labels}}} {total}')
+    lines.append(f'{name}_count{{{labels}}} {count}')
+
+
+def render_prometheus(stats):
+    """Render merged route stats in the Prometheus text exposition format."""
+    rows = sorted(stats.items())
+    lines = [
+        '# HELP library_http_request_duration_seconds Request latency by route.',
+        '# TYPE library_http_request_duration_seconds histogram',
+    ]
+    for (route, method), route_stats in rows:
+        labels = f'route="{escape_label(route)}",method="{escape_label(method)}"'
+        render_histogram(lines, 'library_http_request_duration_seconds', labels, LATENCY_BUCKETS,
+                         route_stats['latency_buckets'], route_stats['latency_sum'], route_stats['count'])
+    lines += [
+        '# HELP library_db_queries_per_request Database queries executed per request.',
+        '# TYPE library_db_queries_per_request histogram',
+    ]
+    for (route, method), route_stats in rows:
+        labels = f'route="{escape_label(route)}",method="{escape_label(method)}"'
+        render_histogram(lines, 'library_db_queries_per_request', labels, QUERY_BUCKETS,
+                         route_stats['query_buckets'], route_stats['query_sum'], route_stats['count'])
+    for metric, key, help_text in (
+        ('library_db_query_seconds_total', 'db_time_sum', 'Time spent executing database queries.'),
+        ('library_serializer_seconds_total', 'serializer_time_sum', 'Time spent in DRF serializers.'),
+    ):
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+        for (route, method), route_stats in rows:
+            labels = f'route="{escape_label(route)}",method="{escape_label(method)}"'
+            lines.append(f'{metric}{{{labels}}} {route_stats[key]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,155 @@
+import time
+from contextlib import ExitStack
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from .metrics import registry, track_request
+from .profiling import RequestProfile, should_profile
+from .routers import pin_to_primary, user_pin
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+def install_query_tracking(tracker):
+    # Database connections are per thread, so this must run on the thread
+    # that will execute the request's queries.
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(tracker.execute_wrapper))
+    return stack
+
+
+class RequestMetricsMiddleware:
+    """Record latency, query count, DB time and serializer time per URL name."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with track_request() as request_metrics, install_query_tracking(request_metrics):
+            response = self.get_response(request)
+        registry.record(route_name(request), request.method, time.perf_counter() - started, request_metrics)
+        registry.flush()
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with track_request() as request_metrics:
+            # Async ORM calls run on the request's thread-sensitive executor thread
+            stack = await sync_to_async(install_query_tracking)(request_metrics)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        registry.record(route_name(request), request.method, time.perf_counter() - started, request_metrics)
+        await sync_to_async(registry.flush)()
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Profile sampled requests (PROFILING_SAMPLE_RATE) and requests carrying a
+    valid admin-signed PROFILING_HEADER. Everything else costs one header
+    lookup and, with a non-zero rate, one random() call.
+
+    Under ASGI only the event loop thread is profiled; queries run by async
+    views are still logged. Only one request per process is profiled at a
+    time: requests arriving meanwhile are served without a profile, and under
+    ASGI unprofiled requests interleaving on the event loop still show up in
+    the profile's stats.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not should_profile(request):
+            return self.get_response(request)
+        profile = RequestProfile(request)
+        if not profile.start():
+            return self.get_response(request)
+        try:
+            with install_query_tracking(profile):
+                response = self.get_response(request)
+        finally:
+            profile.stop()
+        response['X-Profile-Id'] = profile.save(route_name(request), response.status_code)
+        return response
+
+    async def __acall__(self, request):
+        if settings.PROFILING_HEADER in request.META:
+            # Checking the token queries the user table
+            profiled = await sync_to_async(should_profile)(request)
+        else:
+            profiled = should_profile(request)
+        if not profiled:
+            return await self.get_response(request)
+        profile = RequestProfile(request)
+        if not profile.start():
+            return await self.get_response(request)
+        try:
+            stack = await sync_to_async(install_query_tracking)(profile)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        finally:
+            profile.stop()
+        response['X-Profile-Id'] = await sync_to_async(profile.save)(route_name(request), response.status_code)
+        return response
+
+
+def pin_writer(request, response):
+    # DRF copies the token-authenticated user onto the Django request
+    user = getattr(request, 'user', None)
+    if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400 and user is not None \
+            and user.is_authenticated:
+        pin_to_primary(user_pin(user.pk))
+
+
+class ReplicaPinMiddleware:
+    """
+    After a successful write request (borrow, return, score, ...), keep the
+    user's reads on the primary for REPLICA_PIN_SECONDS so they see their own
+    writes even when the replicas lag. Does nothing without replicas.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if settings.REPLICA_DATABASES:
+            pin_writer(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if settings.REPLICA_DATABASES:
+            # The session user is resolved lazily with a query
+            await sync_to_async(pin_writer)(request, response)
+        return response
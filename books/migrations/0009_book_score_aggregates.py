@@ -0,0 +1,36 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:17
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_score_aggregates(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    BookScore = apps.get_model('books', 'BookScore')
+    scores = BookScore.objects.filter(book=OuterRef('pk')).order_by().values('book')
+    Book.objects.update(
+        score_sum=Coalesce(Subquery(scores.annotate(total=Sum('score')).values('total')), 0),
+        score_count=Coalesce(Subquery(scores.annotate(count=Count('id')).values('count')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0008_bookscore'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='score_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='score_sum',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_score_aggregates, migrations.RunPython.noop),
+    ]
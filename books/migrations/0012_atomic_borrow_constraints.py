@@ -0,0 +1,69 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils import timezone
+
+# books.models.MAX_ACTIVE_LOANS when this migration was written
+MAX_ACTIVE_LOANS = 5
+
+
+def close_duplicate_loans(apps, schema_editor):
+    # Racing borrows could put one book on several active loans. The earliest
+    # loan is kept and the others are closed, so the unique index can be built.
+    Borrowing = apps.get_model('books', 'Borrowing')
+    duplicated = (
+        Borrowing.objects.filter(return_date__isnull=True)
+        .order_by().values('book').annotate(count=Count('id')).filter(count__gt=1).values_list('book', flat=True)
+    )
+    for book_id in list(duplicated):
+        active = Borrowing.objects.filter(book_id=book_id, return_date__isnull=True).order_by('id')
+        Borrowing.objects.filter(pk__in=list(active.values_list('pk', flat=True)[1:])).update(
+            return_date=timezone.now()
+        )
+
+
+def backfill_loan_counters(apps, schema_editor):
+    Borrowing = apps.get_model('books', 'Borrowing')
+    LoanCounter = apps.get_model('books', 'LoanCounter')
+    active = (
+        Borrowing.objects.filter(return_date__isnull=True)
+        .order_by().values('user').annotate(count=Count('id')).values_list('user', 'count')
+    )
+    # Users already over the limit keep their loans; their counter starts at
+    # the limit, which the check constraint allows, and blocks further borrows
+    LoanCounter.objects.bulk_create(
+        [LoanCounter(user_id=user_id, active_loans=min(count, MAX_ACTIVE_LOANS)) for user_id, count in active.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('books', '0011_book_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='loan_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('active_loans', models.PositiveSmallIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(close_duplicate_loans, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='borrowing',
+            constraint=models.UniqueConstraint(condition=models.Q(('return_date__isnull', True)), fields=('book',), name='unique_active_borrowing_per_book'),
+        ),
+        migrations.AddConstraint(
+            model_name='loancounter',
+            constraint=models.CheckConstraint(condition=models.Q(('active_loans__lte', 5)), name='active_loans_within_limit'),
+        ),
+        migrations.RunPython(backfill_loan_counters, migrations.RunPython.noop),
+    ]
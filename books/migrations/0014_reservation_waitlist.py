@@ -0,0 +1,62 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:54
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def number_existing_reservations(apps, schema_editor):
+    # Existing reservations join the queue in the order they were made; heads
+    # of books that are on the shelf are ready straight away.
+    Borrowing = apps.get_model('books', 'Borrowing')
+    Reservation = apps.get_model('books', 'Reservation')
+    on_loan = set(Borrowing.objects.filter(return_date__isnull=True).values_list('book_id', flat=True))
+    now = timezone.now()
+    positions = {}
+    reservations = list(Reservation.objects.order_by('book_id', 'reserved_date', 'id'))
+    for reservation in reservations:
+        positions[reservation.book_id] = positions.get(reservation.book_id, 0) + 1
+        reservation.position = positions[reservation.book_id]
+        if reservation.position == 1 and reservation.book_id not in on_loan:
+            reservation.ready_date = now
+    Reservation.objects.bulk_update(reservations, ['position', 'ready_date'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0013_circulation_hot_path_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservation',
+            name='position',
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='ready_date',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(number_existing_reservations, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='reservation',
+            name='position',
+            field=models.PositiveIntegerField(),
+        ),
+        # Superseded by the (book, user) unique constraint
+        migrations.RemoveIndex(
+            model_name='reservation',
+            name='reservation_book_user_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='reservation',
+            constraint=models.UniqueConstraint(fields=('book', 'position'), name='reservation_queue_position'),
+        ),
+        migrations.AddConstraint(
+            model_name='reservation',
+            constraint=models.UniqueConstraint(fields=('book', 'user'), name='unique_reservation_per_user'),
+        ),
+    ]
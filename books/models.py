@@ -1,36 +1,92 @@
 from django.db import models
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Sum, When
+from django.db.models.functions import Cast, Coalesce, Greatest, NullIf
 from django.contrib.auth.models import User
 from datetime import timedelta
 from django.utils import timezone
 from datetime import datetime
 
+# Maximum number of books a user may have borrowed and not yet returned
+MAX_ACTIVE_LOANS = 5
+
 def default_due_date():
     return timezone.now() + timedelta(days=14)
 
+
+def score_aggregate_subqueries():
+    # Correlated subqueries computing the real rating sum/count of a book
+    scores = BookScore.objects.filter(book=OuterRef('pk')).order_by().values('book')
+    return {
+        'score_sum': Coalesce(Subquery(scores.annotate(total=Sum('score')).values('total')), 0),
+        'score_count': Coalesce(Subquery(scores.annotate(count=Count('id')).values('count')), 0),
+    }
+
+class AuthorQuerySet(models.QuerySet):
+    def with_stats(self):
+        # One correlated subquery per figure, so the joins can't multiply each other's rows
+        books = Book.objects.filter(author=OuterRef('pk')).order_by().values('author')
+        active = Borrowing.objects.filter(book__author=OuterRef('pk'), return_date__isnull=True).order_by()
+        ratings = books.annotate(total=Sum('score_sum'), count=Sum('score_count')).values(
+            mean=Cast('total', models.FloatField()) / NullIf('count', 0)
+        )
+        return self.annotate(
+            book_count=Coalesce(Subquery(books.annotate(count=Count('id')).values('count')), 0),
+            active_loan_count=Coalesce(
+                Subquery(active.values('book__author').annotate(count=Count('id')).values('count')), 0
+            ),
+            mean_rating=Subquery(ratings),
+        )
+
+
 class Author(models.Model):
     name = models.CharField(max_length=100)
     biography = models.TextField()
     nationality = models.CharField(max_length=100)
     date_of_birth = models.DateField()
 
+    objects = AuthorQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Nationality filter and facet of the catalog
+            models.Index(fields=['nationality'], name='author_nationality_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+class BookQuerySet(models.QuerySet):
+    def rebuild_score_aggregates(self):
+        return self.update(**score_aggregate_subqueries())
+
+
 class Book(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
     author = models.ForeignKey(Author, on_delete=models.CASCADE, related_name='books')
     isbn = models.CharField(max_length=13)
     category = models.CharField(max_length=100)
-    publication_date = models.DateField()
+    publication_date = models.DateField(db_index=True)
+    # Denormalized rating aggregates, maintained by the BookScore signals
+    score_sum = models.BigIntegerField(default=0, editable=False)
+    score_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = BookQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['isbn'], name='book_isbn_idx'),
+            # Category filter and facets: covering scans for the year and author groupings
+            models.Index(fields=['category', 'publication_date'], name='book_category_date_idx'),
+            models.Index(fields=['category', 'author'], name='book_category_author_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
     def average_score(self):
-        scores = self.scores.all()
-        if scores.exists():
-            return sum([score.score for score in scores]) / scores.count()
+        if self.score_count:
+            return self.score_sum / self.score_count
         return 0
 
 class BookScore(models.Model):
@@ -48,6 +104,24 @@ class Borrowing(models.Model):
     due_date = models.DateField(default=default_due_date)
     return_date = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of a user's borrowing history
+            models.Index(fields=['user', 'borrow_date'], name='borrowing_user_date_idx'),
+            # Recent-borrowing windows of the leaderboards
+            models.Index(fields=['borrow_date'], name='borrowing_date_idx'),
+            # Partial indexes only cover open loans, which stay small as history grows
+            models.Index(fields=['user'], condition=Q(return_date__isnull=True), name='borrowing_active_user_idx'),
+            models.Index(fields=['due_date'], condition=Q(return_date__isnull=True), name='borrowing_due_active_idx'),
+        ]
+        constraints = [
+            # A book can only be out on one loan at a time; also serves the
+            # "active loan for this book" lookup
+            models.UniqueConstraint(
+                fields=['book'], condition=Q(return_date__isnull=True), name='unique_active_borrowing_per_book'
+            ),
+        ]
+
     def is_overdue(self):
         today = timezone.now().date()
         if self.return_date is None:
@@ -58,10 +132,124 @@ class Borrowing(models.Model):
         return f"{self.user.username} borrowed {self.book.title}"
 
 
+class LoanCounter(models.Model):
+    # Number of active loans per user. Taking a slot is a single conditional
+    # UPDATE, so concurrent borrows can never push a user over the limit.
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='loan_counter')
+    active_loans = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(condition=Q(active_loans__lte=MAX_ACTIVE_LOANS), name='active_loans_within_limit'),
+        ]
+
+    @classmethod
+    def acquire(cls, user, count=1):
+        def take():
+            return cls.objects.filter(user=user, active_loans__lte=MAX_ACTIVE_LOANS - count).update(
+                active_loans=F('active_loans') + count
+            )
+
+        if take():
+            return True
+        # First loan for this user: create the counter row and try again
+        _, created = cls.objects.get_or_create(user=user)
+        return bool(created and take())
+
+    @classmethod
+    def release(cls, user, count=1):
+        cls.objects.filter(user=user, active_loans__gte=count).update(active_loans=F('active_loans') - count)
+
+    @classmethod
+    def release_many(cls, counts):
+        # counts maps user id -> returned loans; one UPDATE for all users
+        if not counts:
+            return
+        cls.objects.filter(user__in=counts).update(active_loans=Case(
+            *[When(user=user_id, then=Greatest(F('active_loans') - count, 0)) for user_id, count in counts.items()],
+            default=F('active_loans'),
+            output_field=models.PositiveSmallIntegerField(),
+        ))
+
+    def __str__(self):
+        return f"{self.user.username} has {self.active_loans} active loans"
+
+
+class ReservationQuerySet(models.QuerySet):
+    def heads(self, book_ids):
+        # The next-in-line reservation of each book, found on the (book, position) index
+        first = Reservation.objects.filter(book=OuterRef('book')).order_by('position').values('position')[:1]
+        return self.filter(book__in=book_ids, position=Subquery(first))
+
+    def hand_off(self, book_ids, ready_date):
+        """Mark the head of each book's queue as ready to collect; one UPDATE."""
+        return self.heads(book_ids).filter(ready_date__isnull=True).update(ready_date=ready_date)
+
+    def with_queue_position(self):
+        # 1 + the reservations queued ahead on the same book
+        ahead = (
+            Reservation.objects.filter(book=OuterRef('book'), position__lt=OuterRef('position'))
+            .order_by().values('book').annotate(count=Count('id')).values('count')
+        )
+        return self.annotate(queue_position=Coalesce(Subquery(ahead), 0) + 1)
+
+
 class Reservation(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     book = models.ForeignKey(Book, on_delete=models.CASCADE)
     reserved_date = models.DateField(auto_now_add=True)
+    # Ticket number in the book's FIFO waitlist; the lowest one is next in line
+    position = models.PositiveIntegerField()
+    # Set when the book is free and held for this reader
+    ready_date = models.DateTimeField(null=True, blank=True)
+
+    objects = ReservationQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # Also the index behind "next in line" and queue position lookups
+            models.UniqueConstraint(fields=['book', 'position'], name='reservation_queue_position'),
+            models.UniqueConstraint(fields=['book', 'user'], name='unique_reservation_per_user'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} reserved {self.book.title}"
+
+
+class BookNeighbour(models.Model):
+    # Precomputed "readers who borrowed this also borrowed" list of a book,
+    # maintained by books.tasks.refresh_book_neighbours
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='neighbours')
+    neighbour = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='neighbour_of')
+    rank = models.PositiveSmallIntegerField()
+    shared_readers = models.PositiveIntegerField()
+    # Cosine similarity of the two books' reader sets
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            # Also the index that serves a book's list in rank order
+            models.UniqueConstraint(fields=['book', 'rank'], name='book_neighbour_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.neighbour.title} is #{self.rank} for {self.book.title}"
+
+
+class LeaderboardEntry(models.Model):
+    # One ranked row of a precomputed leaderboard, rebuilt by
+    # books.tasks.rebuild_leaderboards. An empty category is the overall board.
+    board = models.CharField(max_length=20)
+    category = models.CharField(max_length=100, blank=True)
+    rank = models.PositiveIntegerField()
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    value = models.FloatField()
+
+    class Meta:
+        constraints = [
+            # Pages are rank ranges on this index
+            models.UniqueConstraint(fields=['board', 'category', 'rank'], name='leaderboard_rank'),
+        ]
+
+    def __str__(self):
+        return f"#{self.rank} on {self.board} {self.category}".rstrip()
@@ -0,0 +1,118 @@
+import json
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    # Opaque-cursor keyset pagination: every page is a range scan on an indexed
+    # column, so page N costs the same as page 1.
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'PAGINATION_MAX_PAGE_SIZE', 200)
+
+    def get_ordering(self, request, queryset, view):
+        # The id tiebreak makes every position unique, so rows sharing a date
+        # are never paged by offset (which skips or repeats rows as data changes)
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering[-1].lstrip('-') in ('id', 'pk'):
+            return ordering
+        return (*ordering, '-id' if ordering[0].startswith('-') else 'id')
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            name = order.lstrip('-')
+            values.append(str(instance[name] if isinstance(instance, dict) else getattr(instance, name)))
+        return json.dumps(values)
+
+    def after_position(self, position, reverse):
+        """Rows strictly past `position` in the (possibly reversed) ordering."""
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        condition = None
+        # Built from the last field backwards: (a > x) | (a = x & ((b > y) | ...))
+        for order, value in reversed(list(zip(self.ordering, values))):
+            name = order.lstrip('-')
+            lookup = 'lt' if order.startswith('-') != reverse else 'gt'
+            past = Q(**{f'{name}__{lookup}': value})
+            condition = past if condition is None else past | (Q(**{name: value}) & condition)
+        first = self.ordering[0]
+        # The inclusive bound on the leading column keeps the query a range scan
+        bound = 'lte' if first.startswith('-') != reverse else 'gte'
+        return Q(**{f"{first.lstrip('-')}__{bound}": values[0]}) & condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.paginate_rows(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset for async views, fetching the page with the async ORM."""
+        queryset = self.page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.paginate_rows([row async for row in queryset])
+
+    def page_queryset(self, queryset, request, view=None):
+        """The rows of the requested page plus one, or None without a page size."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        self.offset, self.reverse, self.current_position = self.cursor or (0, False, None)
+
+        if self.reverse:
+            queryset = queryset.order_by(*[o[1:] if o.startswith('-') else f'-{o}' for o in self.ordering])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if self.current_position is not None:
+            queryset = queryset.filter(self.after_position(self.current_position, self.reverse))
+        # One extra row tells whether another page follows
+        return queryset[self.offset:self.offset + self.page_size + 1]
+
+    def paginate_rows(self, results):
+        self.page = results[:self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+
+        current_position = self.current_position
+        if self.reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None or self.offset > 0
+            self.has_previous = following_position is not None
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None or self.offset > 0
+            self.next_position = following_position
+            self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+
+class BorrowingPagination(KeysetPagination):
+    ordering = '-borrow_date'
+
+
+class ReservationPagination(KeysetPagination):
+    ordering = '-id'
+
+
+class LeaderboardPagination(KeysetPagination):
+    ordering = 'rank'
@@ -0,0 +1,173 @@
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import caches
+from django.utils import timezone
+
+SIGNING_SALT = 'books.profiling'
+INDEX_KEY = 'profiling:index'
+
+# One profile at a time per process. From Python 3.12 cProfile hooks are
+# process-wide and a second enable() raises ValueError; before that, requests
+# sharing the event loop thread would land in each other's stats.
+active_profile = threading.Lock()
+
+
+def profile_store():
+    return caches[settings.PROFILING_CACHE]
+
+
+def profile_key(profile_id):
+    return f'profiling:{profile_id}'
+
+
+def make_profiling_token(user):
+    return signing.TimestampSigner(salt=SIGNING_SALT).sign(str(user.pk))
+
+
+def valid_profiling_token(token):
+    try:
+        user_id = signing.TimestampSigner(salt=SIGNING_SALT).unsign(
+            token, max_age=settings.PROFILING_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return False
+    # Tokens stop working as soon as the admin is demoted or deactivated
+    return User.objects.filter(pk=user_id, is_staff=True, is_active=True).exists()
+
+
+class StackSampler:
+    """
+    Samples the stack of one thread at a fixed interval and counts identical
+    stacks, giving the "collapsed" format flame graph tools read.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{getattr(code, "co_qualname", code.co_name)}')
+                frame = frame.f_back
+            if stack:
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.counts.most_common())
+
+
+class RequestProfile:
+    """cProfile, stack sampler and query log for one request."""
+
+    def __init__(self, request):
+        self.request = request
+        self.profiler = cProfile.Profile()
+        self.sampler = StackSampler(threading.get_ident(), settings.PROFILING_SAMPLER_INTERVAL)
+        self.queries = []
+        self.started = None
+        self.wall_started = None
+        self.duration = None
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if len(self.queries) < settings.PROFILING_MAX_QUERIES:
+                self.queries.append({
+                    'sql': sql, 'many': many, 'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+                })
+
+    def start(self):
+        """Start profiling, or return False while another request is being profiled."""
+        if not active_profile.acquire(blocking=False):
+            return False
+        self.started = timezone.now()
+        self.wall_started = time.perf_counter()
+        self.sampler.start()
+        self.profiler.enable()
+        return True
+
+    def stop(self):
+        try:
+            self.profiler.disable()
+            self.duration = time.perf_counter() - self.wall_started
+            self.sampler.stop()
+        finally:
+            active_profile.release()
+
+    def save(self, route, status_code):
+        """Store the profile in the profile cache and return its id."""
+        report = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=report)
+        stats.sort_stats('cumulative').print_stats(40)
+
+        profile_id = uuid.uuid4().hex
+        summary = {
+            'id': profile_id,
+            'route': route,
+            'method': self.request.method,
+            'path': self.request.get_full_path(),
+            'status': status_code,
+            'started': self.started.isoformat(),
+            'duration_ms': round(self.duration * 1000, 3),
+            'queries': len(self.queries),
+        }
+        store = profile_store()
+        store.set(profile_key(profile_id), {
+            'summary': summary,
+            'query_log': self.queries,
+            'top_functions': report.getvalue(),
+            'pstats': marshal.dumps(stats.stats),
+            'collapsed': self.sampler.collapsed(),
+        }, settings.PROFILING_RETENTION)
+
+        # Newest first; a concurrent save may drop an id, which only hides it from the list
+        index = [profile_id] + store.get(INDEX_KEY, [])
+        store.set(INDEX_KEY, index[:settings.PROFILING_MAX_STORED], settings.PROFILING_RETENTION)
+        return profile_id
+
+
+def should_profile(request):
+    token = request.META.get(settings.PROFILING_HEADER)
+    if token:
+        return valid_profiling_token(token)
+    rate = settings.PROFILING_SAMPLE_RATE
+    return rate > 0 and random.random() < rate
+
+
+def recent_profiles():
+    store = profile_store()
+    ids = store.get(INDEX_KEY, [])
+    profiles = store.get_many([profile_key(profile_id) for profile_id in ids])
+    return [profiles[profile_key(profile_id)]['summary'] for profile_id in ids if profile_key(profile_id) in profiles]
+
+
+def get_profile(profile_id):
+    return profile_store().get(profile_key(profile_id))
@@ -0,0 +1,129 @@
+from itertools import chain
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+from .cache import bump_version_on_commit
+from .datagen import insert_rows
+from .models import BookNeighbour, Borrowing
+from .utils import batched
+
+WATERMARK_KEY = 'recommendations:watermark'
+
+
+def load_pairs(borrowings):
+    """
+    The distinct (user, book) pairs of `borrowings` as two aligned int64 arrays
+    sorted by user: the nonzero cells of the sparse user x book matrix.
+    """
+    rows = borrowings.order_by().values_list('user_id', 'book_id').distinct().iterator(chunk_size=10000)
+    pairs = np.fromiter(chain.from_iterable(rows), dtype=np.int64).reshape(-1, 2)
+    pairs = pairs[np.argsort(pairs[:, 0], kind='stable')]
+    return pairs[:, 0], pairs[:, 1]
+
+
+def reader_counts(book_ids):
+    # Distinct readers per book, as a sorted id array and the aligned counts
+    counts = {}
+    for batch in batched(book_ids.tolist(), 500):
+        counts.update(
+            Borrowing.objects.filter(book_id__in=batch).order_by().values('book_id')
+            .annotate(readers=Count('user_id', distinct=True)).values_list('book_id', 'readers')
+        )
+    ids = np.array(sorted(counts), dtype=np.int64)
+    return ids, np.array([counts[book_id] for book_id in ids.tolist()], dtype=np.int64)
+
+
+def co_borrowed(users, books, targets):
+    """
+    Count the readers each target book shares with every other book: the target
+    rows of AᵀA for the user x book matrix A given as sorted (user, book) pairs.
+    Every reader of a target contributes one (target, book) cell per book they
+    read, so the work is the sum of those readers' history lengths.
+    Returns aligned (book, neighbour, shared readers) arrays.
+    """
+    reader_ids, first, history = np.unique(users, return_index=True, return_counts=True)
+    hits = np.flatnonzero(np.isin(books, targets))
+    readers = np.searchsorted(reader_ids, users[hits])
+    lengths = history[readers]
+
+    # Expand every target hit into its reader's full history
+    rows = np.repeat(books[hits], lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    cols = books[np.repeat(first[readers], lengths) + offsets]
+    keep = rows != cols
+    rows, cols = rows[keep], cols[keep]
+
+    base = int(books.max()) + 1 if len(books) else 1
+    cells, shared = np.unique(rows * base + cols, return_counts=True)
+    return cells // base, cells % base, shared
+
+
+def top_neighbours(rows, cols, shared, degree_ids, degrees, k, min_shared):
+    """Keep the k best-scoring neighbours of each book, ranked from 1."""
+    keep = shared >= min_shared
+    rows, cols, shared = rows[keep], cols[keep], shared[keep]
+    scores = shared / np.sqrt(
+        degrees[np.searchsorted(degree_ids, rows)] * degrees[np.searchsorted(degree_ids, cols)]
+    )
+    # Cells arrive sorted by (row, col), so a stable sort keeps ties in id order
+    order = np.lexsort((-scores, rows))
+    rows, cols, shared, scores = rows[order], cols[order], shared[order], scores[order]
+
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]]) if len(rows) else np.array([], dtype=np.int64)
+    sizes = np.diff(np.r_[starts, len(rows)])
+    ranks = np.arange(len(rows)) - np.repeat(starts, sizes) + 1
+    keep = ranks <= k
+    return rows[keep], cols[keep], shared[keep], scores[keep], ranks[keep]
+
+
+def store_neighbours(rows, cols, shared, scores, ranks):
+    return insert_rows(
+        BookNeighbour, ['book', 'neighbour', 'shared_readers', 'score', 'rank'],
+        zip(rows.tolist(), cols.tolist(), shared.tolist(), scores.tolist(), ranks.tolist()), 5000,
+    )
+
+
+def refresh_neighbours(full=False):
+    """
+    Bring the BookNeighbour lists up to date with the borrowing history.
+
+    Borrowing ids only grow, so the cache keeps the highest id already folded
+    in. Without a watermark (or with `full`) every list is rebuilt; otherwise
+    only the books read by users with new borrowings are recomputed, since
+    only their co-borrow counts changed. Scores of other books can drift a
+    little as reader counts grow, which the scheduled full rebuild corrects.
+    """
+    high = Borrowing.objects.aggregate(high=Max('id'))['high'] or 0
+    low = None if full else cache.get(WATERMARK_KEY)
+    if low is not None and low >= high:
+        return {'mode': 'incremental', 'books': 0, 'neighbours': 0}
+
+    history = Borrowing.objects.filter(id__lte=high)
+    if low is None:
+        users, books = load_pairs(history)
+        degree_ids, degrees = np.unique(books, return_counts=True)
+        targets = degree_ids
+    else:
+        touched = history.filter(user_id__in=Borrowing.objects.filter(id__gt=low, id__lte=high).values('user_id'))
+        targets = np.unique(load_pairs(touched)[1])
+        # Every reader of a target book, for the target rows of AᵀA
+        readers = history.filter(book_id__in=touched.values('book_id')).values('user_id')
+        users, books = load_pairs(history.filter(user_id__in=readers))
+        degree_ids, degrees = reader_counts(np.unique(books))
+
+    stored = 0
+    k, min_shared = settings.RECOMMENDATION_NEIGHBOURS, settings.RECOMMENDATION_MIN_SHARED_READERS
+    with transaction.atomic():
+        if low is None:
+            BookNeighbour.objects.all().delete()
+        for batch in batched(targets.tolist(), settings.RECOMMENDATION_BATCH_SIZE):
+            if low is not None:
+                BookNeighbour.objects.filter(book_id__in=batch).delete()
+            rows, cols, shared = co_borrowed(users, books, np.array(batch, dtype=np.int64))
+            stored += store_neighbours(*top_neighbours(rows, cols, shared, degree_ids, degrees, k, min_shared))
+        bump_version_on_commit('recommendations')
+        transaction.on_commit(lambda: cache.set(WATERMARK_KEY, high, timeout=None))
+
+    return {'mode': 'full' if low is None else 'incremental', 'books': len(targets), 'neighbours': stored}
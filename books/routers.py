@@ -0,0 +1,111 @@
+import random
+import time
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+
+# The replica chosen for the current request, set by ReplicaReadMixin
+replica_alias = ContextVar('replica_alias', default=None)
+
+# Per process: alias -> (monotonic time of the last check, healthy)
+_health = {}
+
+
+class ReplicaRouter:
+    """
+    Reads go to the replica ReplicaReadMixin picked for the request, everything
+    else to the primary. Writes always go to the primary, including saves of
+    instances that were loaded from a replica.
+    """
+
+    def db_for_read(self, model, **hints):
+        return replica_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+
+def pin_key(name):
+    return f'replica:pin:{name}'
+
+
+def user_pin(user_id):
+    return f'user:{user_id}'
+
+
+def pin_to_primary(*names):
+    """Keep reads tagged with these names on the primary while replicas catch up."""
+    if settings.REPLICA_DATABASES:
+        cache.set_many({pin_key(name): True for name in names}, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(names):
+    return bool(settings.REPLICA_DATABASES and cache.get_many([pin_key(name) for name in names]))
+
+
+def is_healthy(alias):
+    checked, healthy = _health.get(alias, (None, False))
+    if checked is not None and time.monotonic() - checked < settings.REPLICA_HEALTH_CHECK_INTERVAL:
+        return healthy
+    try:
+        # An empty or half-restored copy has no migration table yet
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1 FROM django_migrations LIMIT 1')
+        healthy = True
+    except DatabaseError:
+        healthy = False
+    _health[alias] = (time.monotonic(), healthy)
+    return healthy
+
+
+def mark_unhealthy(alias):
+    _health[alias] = (time.monotonic(), False)
+
+
+def choose_replica():
+    """A random healthy replica, or None to read from the primary."""
+    replicas = [alias for alias in settings.REPLICA_DATABASES if is_healthy(alias)]
+    return random.choice(replicas) if replicas else None
+
+
+class ReplicaReadMixin:
+    """
+    Serve GET, HEAD and OPTIONS from one replica for the whole request, so
+    counts and pages come from the same snapshot. Requests stay on the primary
+    right after the user wrote something, and while any namespace the view
+    caches under was bumped recently: a replica that has not seen the write
+    yet would otherwise fill the cache or an ETag with old rows under the new
+    version. A replica failing mid-request is taken out of rotation and the
+    request runs again on another one, or on the primary.
+    """
+
+    def get_replica_pins(self, request):
+        pins = list(self.get_cache_namespaces()) if hasattr(self, 'get_cache_namespaces') else []
+        if request.user.is_authenticated:
+            pins.append(user_pin(request.user.pk))
+        return pins
+
+    def initial(self, request, *args, **kwargs):
+        # After authentication, so the user's own pin is known
+        super().initial(request, *args, **kwargs)
+        if request.method in ('GET', 'HEAD', 'OPTIONS') and not is_pinned(self.get_replica_pins(request)):
+            replica_alias.set(choose_replica())
+
+    def dispatch(self, request, *args, **kwargs):
+        token = replica_alias.set(None)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except DatabaseError:
+            alias = replica_alias.get()
+            if alias is None:
+                raise
+            mark_unhealthy(alias)
+            replica_alias.set(None)
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            replica_alias.reset(token)
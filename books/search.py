@@ -0,0 +1,164 @@
+import re
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from .models import Book
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+class SearchBackend(ABC):
+    """
+    Interface for catalog search backends. `using` names the database the index
+    lives in; without it searches follow the read router and maintenance runs
+    on the default database.
+    """
+
+    def __init__(self, using=None):
+        self.using = using
+
+    def connection(self, write=False):
+        if self.using:
+            return connections[self.using]
+        return connections[DEFAULT_DB_ALIAS if write else router.db_for_read(Book)]
+
+    @abstractmethod
+    def search(self, query, limit):
+        """Return up to `limit` book ids, best match first."""
+
+    @abstractmethod
+    def filter(self, queryset, query):
+        """Restrict a Book queryset to the books matching `query`."""
+
+    def install(self):
+        pass
+
+    def rebuild(self):
+        pass
+
+    @contextmanager
+    def bulk_load(self):
+        """Suspend incremental index updates during a bulk load, then rebuild."""
+        yield
+
+
+class DatabaseSearchBackend(SearchBackend):
+    """Portable fallback using LIKE lookups, for databases without an FTS index."""
+
+    def filter(self, queryset, query):
+        condition = Q()
+        for term in TOKEN_RE.findall(query):
+            condition &= (
+                Q(title__icontains=term) | Q(description__icontains=term)
+                | Q(category__icontains=term) | Q(author__name__icontains=term)
+            )
+        return queryset.filter(condition)
+
+    def search(self, query, limit):
+        queryset = self.filter(Book.objects.all(), query)
+        return list(queryset.order_by('id').values_list('id', flat=True)[:limit])
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """
+    FTS5 virtual table keyed by book id, kept in sync by triggers on the book
+    and author tables so ORM saves, bulk inserts and raw updates are all indexed.
+    """
+    table = 'books_book_fts'
+    # bm25 column weights: title, description, category, author_name
+    weights = (10.0, 1.0, 2.0, 5.0)
+
+    schema = [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {table}
+            USING fts5(title, description, category, author_name, tokenize='unicode61 remove_diacritics 2')""",
+        f"""CREATE TRIGGER IF NOT EXISTS books_book_fts_insert AFTER INSERT ON books_book BEGIN
+            INSERT INTO {table}(rowid, title, description, category, author_name)
+            VALUES (new.id, new.title, new.description, new.category,
+                    (SELECT name FROM books_author WHERE id = new.author_id));
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS books_book_fts_update
+            AFTER UPDATE OF title, description, category, author_id ON books_book BEGIN
+            UPDATE {table}
+            SET title = new.title, description = new.description, category = new.category,
+                author_name = (SELECT name FROM books_author WHERE id = new.author_id)
+            WHERE rowid = old.id;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS books_book_fts_delete AFTER DELETE ON books_book BEGIN
+            DELETE FROM {table} WHERE rowid = old.id;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS books_author_fts_update AFTER UPDATE OF name ON books_author BEGIN
+            UPDATE {table} SET author_name = new.name
+            WHERE rowid IN (SELECT id FROM books_book WHERE author_id = new.id);
+        END""",
+    ]
+
+    triggers = ['books_book_fts_insert', 'books_book_fts_update', 'books_book_fts_delete', 'books_author_fts_update']
+
+    def match_expression(self, query):
+        # Quote every term so user input can't inject FTS syntax; the last
+        # term is a prefix match for search-as-you-type.
+        terms = [term.replace('"', '') for term in TOKEN_RE.findall(query)]
+        if not terms:
+            return None
+        return ' '.join(f'"{term}"' for term in terms) + '*'
+
+    def search(self, query, limit):
+        expression = self.match_expression(query)
+        if expression is None:
+            return []
+        weights = ', '.join(str(weight) for weight in self.weights)
+        with self.connection().cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s "
+                f"ORDER BY bm25({self.table}, {weights}) LIMIT %s",
+                [expression, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def filter(self, queryset, query):
+        expression = self.match_expression(query)
+        if expression is None:
+            return queryset.none()
+        return queryset.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s", [expression])
+        )
+
+    def install(self):
+        with self.connection(write=True).cursor() as cursor:
+            for statement in self.schema:
+                cursor.execute(statement)
+
+    def rebuild(self):
+        with self.connection(write=True).cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            cursor.execute(
+                f"INSERT INTO {self.table}(rowid, title, description, category, author_name) "
+                "SELECT b.id, b.title, b.description, b.category, a.name "
+                "FROM books_book b JOIN books_author a ON a.id = b.author_id"
+            )
+
+    @contextmanager
+    def bulk_load(self):
+        # One INSERT ... SELECT afterwards is much cheaper than a trigger per row
+        with self.connection(write=True).cursor() as cursor:
+            for trigger in self.triggers:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        try:
+            yield
+        finally:
+            self.install()
+            # Batched loads commit as they go, so a failed one still leaves rows to index
+            self.rebuild()
+
+
+def get_search_backend(using=None):
+    backend = getattr(settings, 'BOOK_SEARCH_BACKEND', None)
+    if backend:
+        return import_string(backend)(using)
+    if connections[using or DEFAULT_DB_ALIAS].vendor == 'sqlite':
+        return SQLiteFTS5Backend(using)
+    return DatabaseSearchBackend(using)
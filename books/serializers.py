@@ -1,20 +1,50 @@
 from rest_framework import serializers
-from .models import Author, Book, Borrowing, Reservation, BookScore
+from .models import Author, Book, BookNeighbour, Borrowing, LeaderboardEntry, Reservation, BookScore
 from django.contrib.auth.models import User
+from django.conf import settings
+from .metrics import timed_serialization
 
 
-class AuthorSerializer(serializers.ModelSerializer):
+class TimedSerializerMixin:
+    # Adds the time spent building representations to the request metrics
+    def to_representation(self, instance):
+        with timed_serialization():
+            return super().to_representation(instance)
+
+
+class AuthorSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    # Annotated by AuthorQuerySet.with_stats(); a new author has no books yet
+    book_count = serializers.SerializerMethodField()
+    active_loan_count = serializers.SerializerMethodField()
+    mean_rating = serializers.SerializerMethodField()
+
     class Meta:
         model = Author
-        fields = ['id', 'name', 'biography', 'nationality', 'date_of_birth']
+        fields = ['id', 'name', 'biography', 'nationality', 'date_of_birth',
+                  'book_count', 'active_loan_count', 'mean_rating']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Embedded only when the view prefetched them (?include=books)
+        if self.context.get('include_books'):
+            self.fields['books'] = BookSerializer(many=True, read_only=True)
+
+    def get_book_count(self, obj):
+        return getattr(obj, 'book_count', 0)
+
+    def get_active_loan_count(self, obj):
+        return getattr(obj, 'active_loan_count', 0)
 
-class BookScoreSerializer(serializers.ModelSerializer):
+    def get_mean_rating(self, obj):
+        return getattr(obj, 'mean_rating', None)
+
+class BookScoreSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = BookScore
         fields = ['id', 'user', 'book', 'score']
         extra_kwargs = {'user': {'read_only': True}}
         
-class BookSerializer(serializers.ModelSerializer):
+class BookSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     average_score = serializers.SerializerMethodField()
 
     class Meta:
@@ -24,7 +54,40 @@ class BookSerializer(serializers.ModelSerializer):
     def get_average_score(self, obj):
         return obj.average_score()
 
-class BorrowingSerializer(serializers.ModelSerializer):
+class BookNeighbourSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    book = BookSerializer(source='neighbour', read_only=True)
+
+    class Meta:
+        model = BookNeighbour
+        fields = ['rank', 'book', 'shared_readers', 'score']
+
+class LeaderboardEntrySerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    book = BookSerializer(read_only=True)
+
+    class Meta:
+        model = LeaderboardEntry
+        fields = ['rank', 'book', 'value']
+
+class ScoredBookSerializer(BookSerializer):
+    # Relevance set by the view: recommendation strength or cosine similarity
+    score = serializers.FloatField(read_only=True)
+
+    class Meta(BookSerializer.Meta):
+        fields = BookSerializer.Meta.fields + ['score']
+
+class FacetValueSerializer(serializers.Serializer):
+    value = serializers.JSONField(read_only=True)
+    count = serializers.IntegerField(read_only=True)
+    # Author facet only: the author's name
+    label = serializers.CharField(read_only=True)
+
+class BookFacetsSerializer(TimedSerializerMixin, serializers.Serializer):
+    category = FacetValueSerializer(many=True, read_only=True)
+    author = FacetValueSerializer(many=True, read_only=True)
+    nationality = FacetValueSerializer(many=True, read_only=True)
+    year = FacetValueSerializer(many=True, read_only=True)
+
+class BorrowingSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     borrow_date = serializers.ReadOnlyField()
     due_date = serializers.ReadOnlyField()
     return_date = serializers.ReadOnlyField(required=False)  
@@ -34,10 +97,29 @@ class BorrowingSerializer(serializers.ModelSerializer):
         fields = ['id', 'book', 'borrow_date', 'due_date', 'return_date']
 
 
-class ReservationSerializer(serializers.ModelSerializer):
+class BulkBorrowSerializer(serializers.Serializer):
+    books = serializers.ListField(
+        child=serializers.IntegerField(), min_length=1, max_length=settings.BULK_CIRCULATION_MAX_ITEMS
+    )
+
+
+class BulkReturnSerializer(serializers.Serializer):
+    borrowings = serializers.ListField(
+        child=serializers.IntegerField(), min_length=1, max_length=settings.BULK_CIRCULATION_MAX_ITEMS
+    )
+
+
+class ReservationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    queue_position = serializers.SerializerMethodField()
+    ready_date = serializers.ReadOnlyField()
+
     class Meta:
         model = Reservation
-        fields = ['id', 'book', 'reserved_date']
+        fields = ['id', 'book', 'reserved_date', 'queue_position', 'ready_date']
+
+    def get_queue_position(self, obj):
+        # Annotated by ReservationQuerySet.with_queue_position()
+        return getattr(obj, 'queue_position', None)
         
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -49,10 +131,14 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         }
 
     def create(self, validated_data):
-       
-        user = User.objects.create_user(
-            username=validated_data['username'],
-            email=validated_data['email'],
-            password=validated_data['password']
+        user = User(
+            username=User.normalize_username(validated_data['username']),
+            email=User.objects.normalize_email(validated_data['email']),
         )
+        # The async registration route hashes off the ORM thread and passes password_hash to save()
+        if 'password_hash' in validated_data:
+            user.password = validated_data['password_hash']
+        else:
+            user.set_password(validated_data['password'])
+        user.save()
         return user
@@ -0,0 +1,92 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import F
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, post_migrate
+from django.dispatch import receiver
+from .models import Author, Book, BookScore, Borrowing, LoanCounter, Reservation
+from .search import get_search_backend
+from .similarity import get_similarity_index
+from .tasks import update_similarity_index
+from .cache import bump_version_on_commit, user_namespace
+from .authentication import blacklist_index, user_cache_key
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+
+@receiver(post_save, sender=BookScore)
+def add_score_to_book(sender, instance, created, **kwargs):
+    if created:
+        Book.objects.filter(pk=instance.book_id).update(
+            score_sum=F('score_sum') + instance.score,
+            score_count=F('score_count') + 1,
+        )
+    else:
+        # The previous value is unknown here, so recompute this book only
+        Book.objects.filter(pk=instance.book_id).rebuild_score_aggregates()
+
+
+@receiver(post_delete, sender=BookScore)
+def remove_score_from_book(sender, instance, **kwargs):
+    Book.objects.filter(pk=instance.book_id).update(
+        score_sum=F('score_sum') - instance.score,
+        score_count=F('score_count') - 1,
+    )
+
+
+def invalidate_catalog(sender, **kwargs):
+    bump_version_on_commit('catalog')
+
+
+for model in (Author, Book, BookScore):
+    post_save.connect(invalidate_catalog, sender=model, dispatch_uid=f'invalidate_catalog_save_{model.__name__}')
+    post_delete.connect(invalidate_catalog, sender=model, dispatch_uid=f'invalidate_catalog_delete_{model.__name__}')
+
+
+# Saves and deletes, including admin edits and cascades from deleted books.
+# Queryset updates and bulk inserts in the circulation views bump explicitly.
+@receiver(post_save, sender=Borrowing)
+@receiver(post_delete, sender=Borrowing)
+def invalidate_user_borrowings(sender, instance, **kwargs):
+    bump_version_on_commit(user_namespace('borrowings', instance.user_id))
+
+
+@receiver(post_delete, sender=Borrowing)
+def release_deleted_loan(sender, instance, **kwargs):
+    # Deleting an open loan (a cascade from its book, a queryset delete) frees its slot
+    if instance.return_date is None:
+        LoanCounter.release(instance.user_id)
+
+
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+def invalidate_reservations(sender, instance, **kwargs):
+    bump_version_on_commit('reservations')
+
+
+@receiver(post_save, sender=Book)
+def reindex_book_vector(sender, instance, **kwargs):
+    # Nothing to update before the first build. A broker outage is logged
+    # rather than failing the request: the next full rebuild picks the book up.
+    if get_similarity_index() is not None:
+        transaction.on_commit(lambda: update_similarity_index.delay([instance.pk]), robust=True)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    cache.delete(user_cache_key(getattr(instance, jwt_settings.USER_ID_FIELD)))
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def index_blacklisted_token(sender, instance, created, **kwargs):
+    if created:
+        blacklist_index.add(instance.token.jti, instance.token.expires_at)
+
+
+@receiver(post_migrate)
+def install_search_index(sender, using, **kwargs):
+    # SQLite drops triggers when a migration rebuilds a table, so make sure the
+    # search index triggers are still in place after every migrate run.
+    if sender.name == 'books':
+        get_search_backend(using).install()
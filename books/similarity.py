@@ -0,0 +1,279 @@
+import os
+import re
+import shutil
+import time
+import zlib
+from pathlib import Path
+import numpy as np
+from django.conf import settings
+from .cache import bump_version
+from .models import Book
+
+TOKEN_RE = re.compile(r'\w+')
+CURRENT = 'CURRENT'
+# Vectors handled per matrix product while building
+CHUNK_SIZE = 20000
+
+
+def book_tokens(title, description, category):
+    # Words and word bigrams of the text, plus the category as one token
+    words = TOKEN_RE.findall(f'{title} {description}'.lower())
+    return words + [f'{a} {b}' for a, b in zip(words, words[1:])] + [f'category:{category.strip().lower()}']
+
+
+def term_counts(tokens, dimensions):
+    # The hashing trick: a stable hash picks each token's column, so no vocabulary is stored
+    return np.bincount([zlib.crc32(token.encode()) % dimensions for token in tokens], minlength=dimensions)
+
+
+def weigh(counts, idf):
+    """Sublinear TF-IDF rows scaled to unit length, so dot products are cosines."""
+    vectors = (np.log1p(counts) * idf).astype(np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+def vectorize(books, idf):
+    """Vectors of (id, title, description, category) rows; returns (ids, vectors)."""
+    rows = list(books)
+    counts = np.array([term_counts(book_tokens(*row[1:]), len(idf)) for row in rows]).reshape(len(rows), len(idf))
+    return np.array([row[0] for row in rows], dtype=np.int64), weigh(counts, idf)
+
+
+def train_centroids(vectors, clusters, rng, iterations=10, sample_size=50000):
+    """Spherical k-means on a sample of the rows; returns unit-length centroids."""
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), min(len(vectors), sample_size), replace=False))])
+    centroids = sample[rng.choice(len(sample), clusters, replace=False)]
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind='stable')
+        members = np.bincount(assignment, minlength=clusters)
+        filled = np.flatnonzero(members)
+        starts = np.r_[0, np.cumsum(members)[:-1]][filled]
+        # Empty clusters keep their previous centroid
+        sums = np.add.reduceat(sample[order], starts, axis=0)
+        centroids[filled] = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+    return centroids
+
+
+def build_index(directory=None, seed=0):
+    """
+    Vectorize every book into a new generation of the index and make it current.
+
+    Layout of a generation (all .npy, memory-mapped by readers):
+      vectors   float32 (books, dimensions), grouped by cluster
+      ids       int64 book id of each vector row
+      offsets   int64 (clusters + 1), the row range of each cluster
+      centroids float32 (clusters, dimensions)
+      idf       float32 (dimensions,)
+    Updates after the build are appended as delta-*.npz files next to them.
+    Books updated in the previous generation while this one was built are
+    carried over as a delta, so no update is lost in the switch.
+    """
+    directory = Path(directory or settings.SIMILARITY_INDEX_DIR)
+    dimensions = settings.SIMILARITY_DIMENSIONS
+    # Deltas written from here on may postdate the rows read below
+    snapshot = time.time_ns()
+    previous = get_similarity_index(directory)
+    generation = str(snapshot)
+    path = directory / generation
+    path.mkdir(parents=True)
+
+    # Raw term counts go to a scratch memmap so the catalog never has to fit in memory
+    books = Book.objects.order_by('id').values_list('id', 'title', 'description', 'category')
+    total = books.count()
+    ids = np.zeros(total, dtype=np.int64)
+    scratch = np.lib.format.open_memmap(path / 'scratch.npy', mode='w+', dtype=np.float32, shape=(total, dimensions))
+    # Books created after the count wait for their delta; deleted ones shrink the index
+    size = 0
+    for pk, title, description, category in books.iterator(chunk_size=2000):
+        if size == total:
+            break
+        ids[size] = pk
+        scratch[size] = term_counts(book_tokens(title, description, category), dimensions)
+        size += 1
+    ids = ids[:size]
+
+    frequency = np.zeros(dimensions, dtype=np.int64)
+    for start in range(0, size, CHUNK_SIZE):
+        frequency += (scratch[start:start + CHUNK_SIZE] > 0).sum(axis=0)
+    idf = (np.log((1 + size) / (1 + frequency)) + 1).astype(np.float32)
+    for start in range(0, size, CHUNK_SIZE):
+        scratch[start:start + CHUNK_SIZE] = weigh(scratch[start:start + CHUNK_SIZE], idf)
+
+    # Group rows by their nearest centroid, so a search only reads a few clusters
+    centroids = np.zeros((1, dimensions), dtype=np.float32)
+    if size:
+        centroids = train_centroids(scratch[:size], int(np.sqrt(size)), np.random.default_rng(seed))
+    assignment = np.zeros(size, dtype=np.int64)
+    for start in range(0, size, CHUNK_SIZE):
+        assignment[start:start + CHUNK_SIZE] = np.argmax(scratch[start:start + CHUNK_SIZE] @ centroids.T, axis=1)
+    order = np.argsort(assignment, kind='stable')
+    offsets = np.r_[0, np.cumsum(np.bincount(assignment, minlength=len(centroids)))].astype(np.int64)
+
+    vectors = np.lib.format.open_memmap(path / 'vectors.npy', mode='w+', dtype=np.float32, shape=(size, dimensions))
+    for start in range(0, size, CHUNK_SIZE):
+        vectors[start:start + CHUNK_SIZE] = scratch[order[start:start + CHUNK_SIZE]]
+    vectors.flush()
+    del scratch, vectors
+    os.remove(path / 'scratch.npy')
+    np.save(path / 'ids.npy', ids[order])
+    np.save(path / 'offsets.npy', offsets)
+    np.save(path / 'centroids.npy', centroids.astype(np.float32))
+    np.save(path / 'idf.npy', idf)
+
+    # Switch readers over, then drop the older generations. Writers check the
+    # switch after adding a delta, so sweeping once more afterwards catches
+    # every delta that landed in the previous generation.
+    carried = set()
+    if previous is not None:
+        carry_deltas(previous.path, path, snapshot, carried, idf)
+    pending = directory / f'{CURRENT}.{generation}'
+    pending.write_text(generation)
+    os.replace(pending, directory / CURRENT)
+    if previous is not None:
+        carry_deltas(previous.path, path, snapshot, carried, idf)
+    for old in directory.iterdir():
+        if old.is_dir() and old.name != generation:
+            shutil.rmtree(old, ignore_errors=True)
+    bump_version('similarity')
+    return {'books': size, 'clusters': len(centroids), 'generation': generation}
+
+
+def carry_deltas(source, target, since, seen, idf):
+    """
+    Revectorize into `target` the books of the deltas written to `source` at
+    or after `since` (ns), skipping the files in `seen`. Vectors are rebuilt
+    from the database because the two generations weigh terms differently.
+    """
+    names = sorted(
+        name for name in os.listdir(source)
+        if name.startswith('delta-') and name.endswith('.npz') and name not in seen
+        and int(name.split('-')[1]) >= since
+    )
+    ids = []
+    for name in names:
+        with np.load(source / name) as delta:
+            ids.extend(delta['ids'].tolist())
+        seen.add(name)
+    if ids:
+        books = Book.objects.filter(id__in=ids).values_list('id', 'title', 'description', 'category')
+        ids, vectors = vectorize(books, idf)
+        if len(ids):
+            write_delta(target, ids, vectors)
+
+
+def write_delta(path, ids, vectors):
+    name = f'delta-{time.time_ns()}-{os.getpid()}'
+    # Write under a temporary name so readers never load a partial file
+    with open(path / f'{name}.tmp', 'wb') as handle:
+        np.savez(handle, ids=ids, vectors=vectors)
+    os.replace(path / f'{name}.tmp', path / f'{name}.npz')
+
+
+class SimilarityIndex:
+    """One generation of the index, plus the deltas written since it was built."""
+
+    def __init__(self, path):
+        self.path = path
+        self.vectors = np.load(path / 'vectors.npy', mmap_mode='r')
+        self.ids = np.load(path / 'ids.npy', mmap_mode='r')
+        self.offsets = np.load(path / 'offsets.npy')
+        self.centroids = np.load(path / 'centroids.npy')
+        self.idf = np.load(path / 'idf.npy')
+        self.delta_files = set()
+        self.delta_mtime = None
+        self.delta_ids = np.zeros(0, dtype=np.int64)
+        self.delta_vectors = np.zeros((0, len(self.idf)), dtype=np.float32)
+
+    def delta_names(self):
+        return [name for name in os.listdir(self.path) if name.startswith('delta-') and name.endswith('.npz')]
+
+    def refresh_deltas(self):
+        # Adding a delta file changes the directory mtime; that stat is all a search pays
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime == self.delta_mtime:
+            return
+        self.delta_mtime = mtime
+        ids, vectors = [self.delta_ids], [self.delta_vectors]
+        for name in sorted(self.delta_names()):
+            if name not in self.delta_files:
+                with np.load(self.path / name) as delta:
+                    ids.append(delta['ids'])
+                    vectors.append(delta['vectors'])
+                self.delta_files.add(name)
+        ids, vectors = np.concatenate(ids), np.concatenate(vectors)
+        # Files are named in write order, so the last copy of a book wins
+        _, last = np.unique(ids[::-1], return_index=True)
+        keep = np.sort(len(ids) - 1 - last)
+        self.delta_ids, self.delta_vectors = ids[keep], vectors[keep]
+
+    def add(self, ids, vectors):
+        write_delta(self.path, ids, vectors)
+        return len(self.delta_names())
+
+    def search(self, vector, k, exclude=None):
+        """Ids and cosine scores of the k nearest books, best first."""
+        self.refresh_deltas()
+        probes = min(settings.SIMILARITY_PROBES, len(self.centroids))
+        clusters = np.argpartition(-(self.centroids @ vector), probes - 1)[:probes]
+        ids = [self.delta_ids] + [self.ids[self.offsets[c]:self.offsets[c + 1]] for c in clusters]
+        scores = [self.delta_vectors @ vector] + [
+            self.vectors[self.offsets[c]:self.offsets[c + 1]] @ vector for c in clusters
+        ]
+        ids, scores = np.concatenate(ids), np.concatenate(scores)
+
+        # Books with a delta have a stale copy in the clusters
+        keep = np.ones(len(ids), dtype=bool)
+        keep[len(self.delta_ids):] = ~np.isin(ids[len(self.delta_ids):], self.delta_ids)
+        if exclude is not None:
+            keep &= ids != exclude
+        ids, scores = ids[keep], scores[keep]
+        if len(ids) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            ids, scores = ids[top], scores[top]
+        order = np.argsort(-scores, kind='stable')
+        return ids[order].tolist(), scores[order].tolist()
+
+
+_loaded = {}
+
+
+def get_similarity_index(directory=None):
+    """The current index generation, loaded once per process; None before the first build."""
+    directory = Path(directory or settings.SIMILARITY_INDEX_DIR)
+    try:
+        generation = (directory / CURRENT).read_text()
+    except FileNotFoundError:
+        return None
+    index = _loaded.get(directory)
+    if index is None or index.path.name != generation:
+        index = _loaded[directory] = SimilarityIndex(directory / generation)
+    return index
+
+
+def update_index(book_ids, directory=None):
+    """
+    Write fresh vectors for the given books as a delta of the current index.
+    Returns the number of delta files, or None when no index has been built.
+    Idf weights stay those of the last build until the next one.
+    """
+    index = get_similarity_index(directory)
+    if index is None:
+        return None
+    books = Book.objects.filter(id__in=book_ids).values_list('id', 'title', 'description', 'category')
+    ids, vectors = vectorize(books, index.idf)
+    if not len(ids):
+        return 0
+    try:
+        deltas = index.add(ids, vectors)
+    except FileNotFoundError:
+        # A rebuild already removed this generation
+        if get_similarity_index(directory) is index:
+            raise
+        return update_index(book_ids, directory)
+    if get_similarity_index(directory) is not index:
+        # A rebuild switched generations meanwhile and may have swept before this delta landed
+        return update_index(book_ids, directory)
+    bump_version('similarity')
+    return deltas
@@ -1,19 +1,138 @@
 from __future__ import absolute_import, unicode_literals
+import logging
+import smtplib
+import time
 from celery import shared_task
+from django.conf import settings
+from django.core.cache import caches
 from django.utils import timezone
-from django.core.mail import send_mail
-from .models import Borrowing  
+from django.core.mail import EmailMessage, get_connection
+from .models import Borrowing
+from .leaderboards import build_leaderboards
+from .recommendations import refresh_neighbours
+from .similarity import build_index, update_index
+from .utils import batched
+
+logger = logging.getLogger(__name__)
+
+REMINDER_SUBJECT = 'Book Due Date Reminder'
+REMINDER_SENDER = 'annegholami0@gmai.com'
+# Set while a similarity rebuild is queued or running, in the cache all workers share
+SIMILARITY_REBUILD_KEY = 'similarity:rebuild-pending'
+
 
 @shared_task
 def send_due_date_reminder():
+    # Coordinator: select today's due loans with the user and book joined in,
+    # then fan the rows out to chunk tasks of REMINDER_CHUNK_SIZE.
     today = timezone.now().date()
-    borrowings = Borrowing.objects.filter(due_date=today, return_date__isnull=True)
-
-    for borrowing in borrowings:
-        send_mail(
-            'Book Due Date Reminder',
-            f'Hi {borrowing.user.username},\n\nThe book "{borrowing.book.title}" is due today. Please return it as soon as possible.',
-            'annegholami0@gmai.com', 
-            [borrowing.user.email],
-            fail_silently=False,
+    rows = (
+        Borrowing.objects.filter(due_date=today, return_date__isnull=True)
+        .order_by('id')
+        .values_list('user__username', 'user__email', 'book__title')
+        .iterator(chunk_size=settings.REMINDER_CHUNK_SIZE)
+    )
+
+    reminders = chunks = 0
+    for chunk in batched(rows, settings.REMINDER_CHUNK_SIZE):
+        send_reminder_chunk.delay(chunk)
+        reminders += len(chunk)
+        chunks += 1
+    logger.info("Dispatched %d due date reminders in %d chunks", reminders, chunks)
+    return {'reminders': reminders, 'chunks': chunks}
+
+
+# Refusals tied to one message; anything else means the server is unusable
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+def reminder_message(username, email, title):
+    return EmailMessage(
+        REMINDER_SUBJECT,
+        f'Hi {username},\n\nThe book "{title}" is due today. Please return it as soon as possible.',
+        REMINDER_SENDER,
+        [email],
+    )
+
+
+@shared_task(bind=True)
+def send_reminder_chunk(self, rows):
+    started = time.monotonic()
+    sent = failed = done = 0
+    # One connection for the whole chunk; a bad recipient only fails its own message
+    connection = get_connection()
+    try:
+        connection.open()
+        for username, email, title in rows:
+            if not email:
+                failed += 1
+            else:
+                try:
+                    sent += connection.send_messages([reminder_message(username, email, title)]) or 0
+                except MESSAGE_ERRORS as exc:
+                    failed += 1
+                    logger.warning("Reminder to %s failed: %s", email, exc)
+            done += 1
+    except (OSError, smtplib.SMTPException) as exc:
+        # The server is down or dropped the connection: retry the reminders not sent yet
+        logger.warning("Reminder chunk interrupted after %d of %d rows: %s", done, len(rows), exc)
+        raise self.retry(
+            args=[rows[done:]], exc=exc,
+            countdown=settings.REMINDER_RETRY_DELAY, max_retries=settings.REMINDER_MAX_RETRIES,
         )
+    finally:
+        connection.close()
+    elapsed = time.monotonic() - started
+
+    logger.info("Reminder chunk: %d sent, %d failed in %.3fs", sent, failed, elapsed)
+    return {'sent': sent, 'failed': failed, 'seconds': elapsed}
+
+
+@shared_task
+def refresh_book_neighbours(full=False):
+    started = time.monotonic()
+    result = refresh_neighbours(full=full)
+    result['seconds'] = time.monotonic() - started
+    logger.info("Book neighbours (%s): %d books, %d neighbours in %.3fs",
+                result['mode'], result['books'], result['neighbours'], result['seconds'])
+    return result
+
+
+@shared_task
+def rebuild_similarity_index():
+    store = caches[settings.SHARED_CACHE]
+    # Scheduled rebuilds hold the flag too, so saves meanwhile don't queue another
+    store.set(SIMILARITY_REBUILD_KEY, True, settings.SIMILARITY_REBUILD_TIMEOUT)
+    started = time.monotonic()
+    try:
+        result = build_index()
+    finally:
+        store.delete(SIMILARITY_REBUILD_KEY)
+    result['seconds'] = time.monotonic() - started
+    logger.info("Similarity index: %d books in %d clusters in %.3fs",
+                result['books'], result['clusters'], result['seconds'])
+    return result
+
+
+@shared_task
+def update_similarity_index(book_ids):
+    deltas = update_index(book_ids)
+    # Merge the deltas back into the clusters once they pile up; every save
+    # past the limit lands here, but only the first queues a rebuild
+    if deltas is not None and deltas > settings.SIMILARITY_MAX_DELTAS:
+        store = caches[settings.SHARED_CACHE]
+        if store.add(SIMILARITY_REBUILD_KEY, True, settings.SIMILARITY_REBUILD_TIMEOUT):
+            try:
+                rebuild_similarity_index.delay()
+            except Exception:
+                store.delete(SIMILARITY_REBUILD_KEY)
+                raise
+    return deltas
+
+
+@shared_task
+def rebuild_leaderboards():
+    started = time.monotonic()
+    counts = build_leaderboards()
+    logger.info("Leaderboards rebuilt in %.3fs: %s", time.monotonic() - started, counts)
+    return counts
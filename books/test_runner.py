@@ -0,0 +1,33 @@
+import tempfile
+from pathlib import Path
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class LibraryTestRunner(DiscoverRunner):
+    """
+    Runs the suite against a temporary SIMILARITY_INDEX_DIR, so saving books
+    in tests never appends deltas to an index built on the developer's machine.
+    Tests that need an index build their own. The shared cache gets a
+    temporary directory too, so versions bumped by a running server and by
+    the tests never mix.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.index_directory = tempfile.TemporaryDirectory()
+        self.shared_directory = tempfile.TemporaryDirectory()
+        caches = dict(settings.CACHES)
+        if caches[settings.SHARED_CACHE]['BACKEND'].endswith('FileBasedCache'):
+            caches[settings.SHARED_CACHE] = {**caches[settings.SHARED_CACHE], 'LOCATION': self.shared_directory.name}
+        self.index_override = override_settings(
+            SIMILARITY_INDEX_DIR=Path(self.index_directory.name), CACHES=caches,
+        )
+        self.index_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.index_override.disable()
+        self.index_directory.cleanup()
+        self.shared_directory.cleanup()
+        super().teardown_test_environment(**kwargs)
@@ -1,15 +1,63 @@
-from django.test import TestCase
+import asyncio
+from django.test import TestCase, TransactionTestCase
 from django.contrib.auth.models import User
 from django.utils import timezone
 from rest_framework.test import APITestCase
 from rest_framework import status
-from .models import Author, Book, BookScore, Borrowing, Reservation
+from .models import Author, Book, BookNeighbour, BookScore, Borrowing, Reservation, LoanCounter, MAX_ACTIVE_LOANS
+from django.db import IntegrityError, transaction
+from django.conf import settings
+from django.core.cache.backends.filebased import FileBasedCache
+from .validators import normalize_isbn
+from .utils import retry_on_busy
+import json
+import marshal
+import smtplib
+import numpy as np
+import os
+import tempfile
 from .serializers import AuthorSerializer, BookSerializer
-from .tasks import send_due_date_reminder
+from .tasks import (
+    SIMILARITY_REBUILD_KEY, rebuild_similarity_index, send_due_date_reminder, send_reminder_chunk,
+    update_similarity_index,
+)
+from kombu.exceptions import OperationalError as KombuOperationalError
+from django.test import override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import get_resolver, resolve
+from .benchmark import SCENARIOS, BenchContext, seed_dataset
 from django.core import mail
-from datetime import timedelta
+from datetime import date, timedelta
 from django.core import mail
 from books.tasks import send_due_date_reminder
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from io import StringIO
+from unittest.mock import MagicMock, patch
+from .pagination import KeysetPagination
+from django.core.cache import cache, caches
+from django.db import OperationalError
+from rest_framework.response import Response
+from . import routers
+from .views import BookListView
+from .cache import get_version
+from .metrics import registry as metrics_registry
+from .authentication import BloomFilter, CachedJWTAuthentication, blacklist_index, user_cache_key
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.db.models import Count
+from .datagen import SyntheticDataGenerator
+from .search import SearchBackend, SQLiteFTS5Backend, get_search_backend
+from .signals import install_search_index
+from django.apps import apps
+from importlib import import_module
+from .profiling import active_profile, get_profile, profile_key
+from .leaderboards import build_leaderboards
+from .recommendations import refresh_neighbours
+from . import similarity
+from .similarity import build_index, get_similarity_index, update_index, vectorize
+from asgiref.sync import async_to_sync, sync_to_async
 
 
 
@@ -129,7 +177,8 @@ class ReservationModelTest(TestCase):
         )
         self.reservation = Reservation.objects.create(
             user=self.user,
-            book=self.book
+            book=self.book,
+            position=1
         )
 
     def test_reservation_str(self):
@@ -218,6 +267,7 @@ class BorrowBookViewTest(APITestCase):
 
 class BookListViewTest(APITestCase):
     def setUp(self):
+        cache.clear()
         self.author = Author.objects.create(
             name="John Doe",
             biography="Biography of John Doe",
@@ -238,7 +288,7 @@ class BookListViewTest(APITestCase):
     def test_list_books(self):
         response = self.client.get('/api/books/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertIn('title', response.data[0])
+        self.assertIn('title', response.data['results'][0])
 
 
 
@@ -258,10 +308,341 @@ class JWTAuthenticationTest(APITestCase):
         self.assertIn('refresh', response.data)
 
 
+class BookScoreAggregateTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = Author.objects.create(
+            name="John Doe",
+            biography="Biography of John Doe",
+            nationality="American",
+            date_of_birth="1980-01-01"
+        )
+        self.book = Book.objects.create(
+            title="Sample Book",
+            description="Description of Sample Book",
+            author=self.author,
+            isbn="1234567890123",
+            category="Fiction",
+            publication_date="2024-01-01"
+        )
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.client.force_authenticate(user=self.user)
 
+    def test_score_view_updates_aggregates(self):
+        response = self.client.post('/api/books/score/', {'book': self.book.id, 'score': 4}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.score_count, 1)
+        self.assertEqual(self.book.average_score(), 4)
 
-'''
-class SendDueDateReminderTest(TestCase):
+    def test_score_update_and_delete_update_aggregates(self):
+        other = User.objects.create_user(username="other", password="password")
+        BookScore.objects.create(user=self.user, book=self.book, score=2)
+        score = BookScore.objects.create(user=other, book=self.book, score=4)
+        score.score = 5
+        score.save()
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.score_sum, self.book.score_count), (7, 2))
+        score.delete()
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.score_sum, self.book.score_count), (2, 1))
+
+    def test_book_list_query_count_is_constant(self):
+        for i in range(3):
+            book = Book.objects.create(
+                title=f"Book {i}", description="", author=self.author,
+                isbn="1234567890123", category="Fiction", publication_date="2024-01-01"
+            )
+            BookScore.objects.create(user=self.user, book=book, score=i + 1)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/books/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_rebuild_score_aggregates_command(self):
+        BookScore.objects.create(user=self.user, book=self.book, score=3)
+        Book.objects.update(score_sum=0, score_count=0)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_score_aggregates', '--verify', stdout=StringIO())
+        call_command('rebuild_score_aggregates', stdout=StringIO())
+        call_command('rebuild_score_aggregates', '--verify', stdout=StringIO())
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.score_sum, self.book.score_count), (3, 1))
+
+
+class KeysetPaginationTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = Author.objects.create(
+            name="John Doe",
+            biography="Biography of John Doe",
+            nationality="American",
+            date_of_birth="1980-01-01"
+        )
+        self.books = [
+            Book.objects.create(
+                title=f"Book {i}", description="", author=self.author,
+                isbn="1234567890123", category="Fiction", publication_date=f"20{10 + i}-01-01"
+            )
+            for i in range(5)
+        ]
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.client.force_authenticate(user=self.user)
+
+    def test_book_list_follows_cursor(self):
+        response = self.client.get('/api/books/', {'page_size': 2})
+        self.assertEqual([b['title'] for b in response.data['results']], ["Book 0", "Book 1"])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([b['title'] for b in response.data['results']], ["Book 2", "Book 3"])
+
+    def test_book_list_ordering_by_publication_date(self):
+        response = self.client.get('/api/books/', {'ordering': '-publication_date', 'page_size': 1})
+        self.assertEqual(response.data['results'][0]['title'], "Book 4")
+
+    def test_duplicate_dates_page_by_id(self):
+        # Five more books on one date: pages must neither skip nor repeat them
+        same_day = [
+            Book.objects.create(title=f"Same {i}", description="", author=self.author, isbn="1234567890123",
+                                category="Fiction", publication_date="2030-01-01")
+            for i in range(5)
+        ]
+        seen, url = [], '/api/books/?ordering=-publication_date&page_size=2'
+        while url:
+            response = self.client.get(url)
+            seen += [b['id'] for b in response.data['results']]
+            if len(seen) == 2:
+                # A row inserted behind the cursor does not shift the later pages
+                late = Book.objects.create(title="Late", description="", author=self.author,
+                                           isbn="1234567890123", category="Fiction", publication_date="2030-01-01")
+            url = response.data['next']
+        expected = [b.id for b in reversed(same_day)] + [b.id for b in reversed(self.books)]
+        self.assertEqual(seen, expected)
+
+        # Walking back from the last page, which holds the two oldest books, reaches the new row too
+        back = []
+        url = response.data['previous']
+        while url:
+            response = self.client.get(url)
+            back = [b['id'] for b in response.data['results']] + back
+            url = response.data['previous']
+        self.assertEqual(back, [late.id] + expected[:-2])
+
+    def test_page_size_is_capped(self):
+        with patch.object(KeysetPagination, 'max_page_size', 2):
+            response = self.client.get('/api/books/', {'page_size': 1000})
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_borrowed_books_newest_first(self):
+        for book in self.books[:3]:
+            Borrowing.objects.create(user=self.user, book=book)
+        response = self.client.get('/api/borrowed-books/', {'page_size': 2})
+        self.assertEqual([b['book'] for b in response.data['results']], [self.books[2].id, self.books[1].id])
+        self.assertIsNotNone(response.data['next'])
+
+
+class BookSearchTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = Author.objects.create(
+            name="Ursula Le Guin",
+            biography="Biography",
+            nationality="American",
+            date_of_birth="1929-10-21"
+        )
+        self.earthsea = Book.objects.create(
+            title="A Wizard of Earthsea", description="A young mage on the islands of Earthsea.",
+            author=self.author, isbn="9780547773742", category="Fantasy", publication_date="1968-01-01"
+        )
+        self.dispossessed = Book.objects.create(
+            title="The Dispossessed", description="An anarchist physicist leaves his moon for Earthsea's rival.",
+            author=self.author, isbn="9780061054884", category="Science Fiction", publication_date="1974-01-01"
+        )
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.client.force_authenticate(user=self.user)
+
+    def search(self, query):
+        response = self.client.get('/api/books/search/', {'q': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [book['id'] for book in response.data]
+
+    def test_title_match_ranks_first(self):
+        self.assertEqual(self.search("earthsea"), [self.earthsea.id, self.dispossessed.id])
+
+    def test_prefix_and_category_match(self):
+        self.assertEqual(self.search("scien"), [self.dispossessed.id])
+
+    def test_index_follows_book_and_author_writes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.earthsea.title = "The Tombs of Atuan"
+            self.earthsea.save()
+        self.assertEqual(self.search("atuan"), [self.earthsea.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.name = "U. K. Le Guin"
+            self.author.save()
+        self.assertEqual(sorted(self.search("Guin")), sorted([self.earthsea.id, self.dispossessed.id]))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dispossessed.delete()
+        self.assertEqual(self.search("Guin"), [self.earthsea.id])
+
+    def test_query_syntax_is_escaped(self):
+        self.assertEqual(self.search('"earthsea OR (NEAR'), [])
+
+    def test_missing_query(self):
+        response = self.client.get('/api/books/search/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_backend_interface_is_abstract(self):
+        with self.assertRaises(TypeError):
+            SearchBackend()
+
+    def test_index_is_installed_on_the_migrated_database(self):
+        with patch('books.signals.get_search_backend') as backend:
+            install_search_index(sender=apps.get_app_config('books'), using='replica_1')
+        backend.assert_called_once_with('replica_1')
+        self.assertEqual(get_search_backend('default').connection(write=True).alias, 'default')
+
+
+class CatalogCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = Author.objects.create(
+            name="John Doe",
+            biography="Biography of John Doe",
+            nationality="American",
+            date_of_birth="1980-01-01"
+        )
+        self.book = Book.objects.create(
+            title="Sample Book",
+            description="Description of Sample Book",
+            author=self.author,
+            isbn="1234567890123",
+            category="Fiction",
+            publication_date="2024-01-01"
+        )
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.admin = User.objects.create_superuser(username="admin", password="password")
+        self.client.force_authenticate(user=self.user)
+
+    def test_repeated_list_is_served_from_cache(self):
+        self.client.get('/api/books/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/books/')
+        self.assertEqual(response.data['results'][0]['title'], "Sample Book")
+
+    def test_query_parameters_are_part_of_the_key(self):
+        self.client.get('/api/books/', {'page_size': 1})
+        with self.assertNumQueries(1):
+            self.client.get('/api/books/', {'page_size': 2})
+
+    def test_score_invalidates_book_list(self):
+        self.client.get('/api/books/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/books/score/', {'book': self.book.id, 'score': 5}, format='json')
+        response = self.client.get('/api/books/')
+        self.assertEqual(response.data['results'][0]['average_score'], 5)
+
+    def test_book_update_invalidates_detail(self):
+        self.client.force_authenticate(user=self.admin)
+        url = f'/api/books/{self.book.id}/'
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(url, {'title': "Renamed"}, format='json')
+        self.assertEqual(self.client.get(url).data['title'], "Renamed")
+
+    def test_version_survives_cache_flush(self):
+        before = get_version('catalog')
+        caches[settings.SHARED_CACHE].clear()
+        self.assertGreater(get_version('catalog'), before)
+
+    def test_bump_from_another_worker_invalidates_cached_response(self):
+        self.client.get('/api/books/')
+        Book.objects.filter(id=self.book.id).update(title="Renamed")
+        # A second process on the host opens the same files through its own handle
+        other_worker = FileBasedCache(settings.CACHES[settings.SHARED_CACHE]['LOCATION'], {})
+        other_worker.set('version:catalog', get_version('catalog') + 1, timeout=None)
+        self.assertEqual(self.client.get('/api/books/').data['results'][0]['title'], "Renamed")
+
+
+class AtomicBorrowTest(APITestCase):
+    def setUp(self):
+        self.author = Author.objects.create(
+            name="John Doe",
+            biography="Biography of John Doe",
+            nationality="American",
+            date_of_birth="1980-01-01"
+        )
+        self.books = [
+            Book.objects.create(
+                title=f"Book {i}", description="", author=self.author,
+                isbn="1234567890123", category="Fiction", publication_date="2024-01-01"
+            )
+            for i in range(6)
+        ]
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.other = User.objects.create_user(username="other", password="password")
+        self.client.force_authenticate(user=self.user)
+
+    def borrow(self, book):
+        return self.client.post('/api/borrow/', {'book': book.id}, format='json')
+
+    def test_book_already_borrowed(self):
+        self.client.force_authenticate(user=self.other)
+        self.assertEqual(self.borrow(self.books[0]).status_code, status.HTTP_201_CREATED)
+        self.client.force_authenticate(user=self.user)
+        response = self.borrow(self.books[0])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("already borrowed", response.data[0])
+        self.assertFalse(LoanCounter.objects.filter(user=self.user, active_loans__gt=0).exists())
+
+    def test_active_loan_limit(self):
+        for book in self.books[:MAX_ACTIVE_LOANS]:
+            self.assertEqual(self.borrow(book).status_code, status.HTTP_201_CREATED)
+        response = self.borrow(self.books[MAX_ACTIVE_LOANS])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("more than 5 books", response.data[0])
+
+    def test_return_releases_loan_once(self):
+        self.borrow(self.books[0])
+        borrowing = Borrowing.objects.get(user=self.user)
+        response = self.client.delete(f'/api/return/{borrowing.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(LoanCounter.objects.get(user=self.user).active_loans, 0)
+        response = self.client.delete(f'/api/return/{borrowing.id}/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(LoanCounter.objects.get(user=self.user).active_loans, 0)
+        self.assertEqual(self.borrow(self.books[0]).status_code, status.HTTP_201_CREATED)
+
+    def test_database_rejects_second_active_loan(self):
+        Borrowing.objects.create(user=self.user, book=self.books[0])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Borrowing.objects.create(user=self.other, book=self.books[0])
+
+    def test_deleting_a_book_frees_the_loan_slot(self):
+        for book in self.books[:MAX_ACTIVE_LOANS]:
+            self.borrow(book)
+        self.books[0].delete()
+        self.assertEqual(LoanCounter.objects.get(user=self.user).active_loans, MAX_ACTIVE_LOANS - 1)
+        self.assertEqual(self.borrow(self.books[MAX_ACTIVE_LOANS]).status_code, status.HTTP_201_CREATED)
+
+    def test_rebuild_loan_counters_command(self):
+        self.borrow(self.books[0])
+        LoanCounter.objects.filter(user=self.user).update(active_loans=MAX_ACTIVE_LOANS)
+        LoanCounter.objects.create(user=self.other, active_loans=2)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_loan_counters', '--verify', stdout=StringIO())
+        call_command('rebuild_loan_counters', stdout=StringIO())
+        self.assertEqual(dict(LoanCounter.objects.values_list('user_id', 'active_loans')),
+                         {self.user.id: 1, self.other.id: 0})
+        call_command('rebuild_loan_counters', '--verify', stdout=StringIO())
+
+    def test_backfill_caps_users_over_the_limit(self):
+        # Loans opened before the counter existed could exceed the limit
+        Borrowing.objects.bulk_create([Borrowing(user=self.user, book=book) for book in self.books])
+        migration = import_module('books.migrations.0012_atomic_borrow_constraints')
+        migration.backfill_loan_counters(apps, None)
+        self.assertEqual(LoanCounter.objects.get(user=self.user).active_loans, MAX_ACTIVE_LOANS)
+
+
+class BulkCirculationTest(APITestCase):
     def setUp(self):
         self.author = Author.objects.create(
             name="John Doe",
@@ -269,7 +650,202 @@ class SendDueDateReminderTest(TestCase):
             nationality="American",
             date_of_birth="1980-01-01"
         )
+        self.books = [
+            Book.objects.create(
+                title=f"Book {i}", description="", author=self.author,
+                isbn="1234567890123", category="Fiction", publication_date="2024-01-01"
+            )
+            for i in range(8)
+        ]
         self.user = User.objects.create_user(username="testuser", password="password")
+        self.other = User.objects.create_user(username="other", password="password")
+        self.client.force_authenticate(user=self.user)
+
+    def test_bulk_borrow_reports_per_item_results(self):
+        Borrowing.objects.create(user=self.other, book=self.books[0])
+        Reservation.objects.create(user=self.other, book=self.books[1], position=1)
+        LoanCounter.objects.create(user=self.user)
+        ids = [book.id for book in self.books] + [999999]
+        with self.assertNumQueries(8):
+            response = self.client.post('/api/borrow/bulk/', {'books': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        statuses = [item['status'] for item in response.data['results']]
+        self.assertEqual(statuses, ['error', 'error'] + ['borrowed'] * 5 + ['error', 'error'])
+        self.assertIn("more than 5 books", response.data['results'][7]['detail'])
+        self.assertEqual(response.data['results'][8]['detail'], "Book not found.")
+        self.assertEqual(LoanCounter.objects.get(user=self.user).active_loans, 5)
+
+    def test_bulk_borrow_rejects_oversized_batch(self):
+        ids = list(range(1, settings.BULK_CIRCULATION_MAX_ITEMS + 2))
+        response = self.client.post('/api/borrow/bulk/', {'books': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_return(self):
+        self.client.post('/api/borrow/bulk/', {'books': [b.id for b in self.books[:3]]}, format='json')
+        borrowings = list(Borrowing.objects.filter(user=self.user).values_list('id', flat=True))
+        self.client.delete(f'/api/return/{borrowings[0]}/')
+        # Includes the waitlist hand-off UPDATE
+        with self.assertNumQueries(7):
+            response = self.client.post('/api/return/bulk/', {'borrowings': borrowings + [999999]}, format='json')
+        statuses = [item['status'] for item in response.data['results']]
+        self.assertEqual(statuses, ['error', 'returned', 'returned', 'error'])
+        self.assertEqual(LoanCounter.objects.get(user=self.user).active_loans, 0)
+        self.assertFalse(Borrowing.objects.filter(return_date__isnull=True).exists())
+
+
+class ImportCatalogCommandTest(TestCase):
+    def setUp(self):
+        self.author = Author.objects.create(
+            name="John Doe",
+            biography="Biography of John Doe",
+            nationality="American",
+            date_of_birth="1980-01-01"
+        )
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write(content)
+        return path
+
+    def test_import_csv(self):
+        path = self.write('catalog.csv', (
+            "title,description,author,isbn,category,publication_date,author_date_of_birth\n"
+            "Known Author,d,John Doe,978-0-306-40615-7,Fiction,2001-01-01,\n"
+            "New Author,d,Jane Roe,0-306-40615-2,History,2002-02-02,1970-05-05\n"
+            "Bad ISBN,d,John Doe,1234567890123,Fiction,2003-03-03,\n"
+            "Unknown Author,d,Nobody,9780306406157,Fiction,2004-04-04,\n"
+        ))
+        call_command('import_catalog', path, batch_size=2, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(
+            list(Book.objects.order_by('id').values_list('title', 'author__name', 'isbn')),
+            [("Known Author", "John Doe", "9780306406157"), ("New Author", "Jane Roe", "0306406152")],
+        )
+
+    def test_resume_from_checkpoint(self):
+        lines = [
+            json.dumps({'title': f"Book {i}", 'author': "John Doe", 'isbn': "9780306406157",
+                        'category': "Fiction", 'publication_date': "2001-01-01"})
+            for i in range(5)
+        ]
+        path = self.write('catalog.jsonl', "\n".join(lines))
+        checkpoint = self.write('checkpoint.json', json.dumps({'offset': 3}))
+        call_command('import_catalog', path, checkpoint=checkpoint, stdout=StringIO())
+        self.assertEqual(list(Book.objects.values_list('title', flat=True)), ["Book 3", "Book 4"])
+        with open(checkpoint) as handle:
+            self.assertEqual(json.load(handle)['offset'], 5)
+
+    def test_bad_records_are_reported_and_skipped(self):
+        good = {'title': "Good", 'author': "John Doe", 'isbn': "9780306406157",
+                'category': "Fiction", 'publication_date': "2001-01-01"}
+        path = self.write('catalog.jsonl', "\n".join([
+            json.dumps(good), '{"title": "Broken', '[1, 2]', json.dumps({**good, 'title': "Uncategorised", 'category': ""}),
+            json.dumps({**good, 'title': "Last"}),
+        ]))
+        stderr = StringIO()
+        call_command('import_catalog', path, batch_size=2, stdout=StringIO(), stderr=stderr)
+        self.assertEqual(list(Book.objects.order_by('id').values_list('title', flat=True)), ["Good", "Last"])
+        self.assertIn("Skipping record 2", stderr.getvalue())
+        self.assertIn("Skipping record 3: a JSON object is required", stderr.getvalue())
+        self.assertIn("Skipping record 4: category is required", stderr.getvalue())
+
+    def test_search_index_rebuilt_once_after_import(self):
+        path = self.write('catalog.jsonl', json.dumps({
+            'title': "Wizardry", 'author': "John Doe", 'isbn': "9780306406157",
+            'category': "Fiction", 'publication_date': "2001-01-01",
+        }))
+        rebuilds = []
+        rebuild = SQLiteFTS5Backend.rebuild
+        with patch.object(SQLiteFTS5Backend, 'rebuild', lambda backend: rebuilds.append(rebuild(backend))):
+            call_command('import_catalog', path, stdout=StringIO())
+        self.assertEqual(len(rebuilds), 1)
+        self.assertEqual(get_search_backend().search("wizardry", 10), list(Book.objects.values_list('id', flat=True)))
+
+    def test_failed_import_leaves_committed_batches_searchable(self):
+        path = self.write('catalog.jsonl', "\n".join(
+            json.dumps({'title': title, 'author': "John Doe", 'isbn': "9780306406157",
+                        'category': "Fiction", 'publication_date': "2001-01-01"})
+            for title in ("Wizardry", "Sorcery")
+        ))
+        bulk_create = Book.objects.bulk_create
+        calls = []
+
+        def fail_second_batch(objs, **kwargs):
+            calls.append(objs)
+            if len(calls) == 2:
+                raise OperationalError("disk I/O error")
+            return bulk_create(objs, **kwargs)
+
+        with patch.object(Book.objects, 'bulk_create', fail_second_batch), self.assertRaises(OperationalError):
+            call_command('import_catalog', path, batch_size=1, stdout=StringIO())
+        self.assertEqual(get_search_backend().search("wizardry", 10), list(Book.objects.values_list('id', flat=True)))
+
+    def test_normalize_isbn(self):
+        self.assertEqual(normalize_isbn("0-8044-2957-X"), "080442957X")
+        self.assertIsNone(normalize_isbn("0-8044-2957-1"))
+
+
+class BorrowingExportTest(APITestCase):
+    def setUp(self):
+        self.author = Author.objects.create(
+            name="John Doe",
+            biography="Biography of John Doe",
+            nationality="American",
+            date_of_birth="1980-01-01"
+        )
+        self.book = Book.objects.create(
+            title="Sample Book",
+            description="Description of Sample Book",
+            author=self.author,
+            isbn="1234567890123",
+            category="Fiction",
+            publication_date="2024-01-01"
+        )
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.admin = User.objects.create_superuser(username="admin", password="password")
+        self.old = Borrowing.objects.create(user=self.user, book=self.book, return_date=timezone.now())
+        Borrowing.objects.filter(pk=self.old.pk).update(borrow_date=timezone.now() - timedelta(days=30))
+        self.recent = Borrowing.objects.create(user=self.user, book=self.book)
+        self.client.force_authenticate(user=self.admin)
+
+    def test_csv_export(self):
+        response = self.client.get('/api/borrowings/export/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,username,book_title,borrow_date,due_date,return_date')
+        self.assertEqual(len(lines), 3)
+        self.assertIn('testuser,Sample Book', lines[1])
+
+    def test_ndjson_export_with_date_range(self):
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        response = self.client.get('/api/borrowings/export/', {'output': 'ndjson', 'from': since})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.recent.id])
+        self.assertEqual(rows[0]['book_title'], "Sample Book")
+
+    def test_export_requires_admin(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/borrowings/export/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_export_command(self):
+        out = StringIO()
+        call_command('export_borrowings', '--format', 'ndjson', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
+
+
+class SendDueDateReminderTest(TestCase):
+    def setUp(self):
+        self.author = Author.objects.create(
+            name="John Doe",
+            biography="Biography of John Doe",
+            nationality="American",
+            date_of_birth="1980-01-01"
+        )
+        self.user = User.objects.create_user(username="testuser", password="password", email="testuser@example.com")
         self.book = Book.objects.create(
             title="Sample Book",
             description="Description of Sample Book",
@@ -294,4 +870,1212 @@ class SendDueDateReminderTest(TestCase):
         # Check if an email has been sent
         self.assertEqual(len(mail.outbox), 1)
         if mail.outbox:
-            self.assertEqual(mail.outbox[0].subject, 'Book Due Date Reminder')
\ No newline at end of file
+            self.assertEqual(mail.outbox[0].subject, 'Book Due Date Reminder')
+
+    @override_settings(REMINDER_CHUNK_SIZE=2)
+    def test_reminders_are_sent_in_chunks(self):
+        other = User.objects.create_user(username="other", password="password", email="other@example.com")
+        for i in range(2):
+            book = Book.objects.create(
+                title=f"Book {i}", description="", author=self.author,
+                isbn="1234567890123", category="Fiction", publication_date="2024-01-01"
+            )
+            Borrowing.objects.create(user=other, book=book, due_date=timezone.now().date())
+
+        with patch('books.tasks.send_reminder_chunk.delay', wraps=send_reminder_chunk.delay) as delay:
+            with self.assertNumQueries(1):
+                result = send_due_date_reminder.apply().get()
+        self.assertEqual(result, {'reminders': 3, 'chunks': 2})
+        self.assertEqual(delay.call_count, 2)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertIn('"Book 1" is due today', mail.outbox[2].body)
+
+    def test_chunk_reports_failures(self):
+        result = send_reminder_chunk.apply(args=[[["testuser", "testuser@example.com", "A"], ["nomail", "", "B"]]]).get()
+        self.assertEqual((result['sent'], result['failed']), (1, 1))
+        self.assertEqual(len(mail.outbox), 1)
+
+    ROWS = [["a", "a@example.com", "A"], ["b", "b@example.com", "B"], ["c", "c@example.com", "C"]]
+
+    def test_refused_recipient_only_fails_its_message(self):
+        connection = MagicMock()
+        connection.send_messages.side_effect = [1, smtplib.SMTPRecipientsRefused({'b@example.com': (550, b'no')}), 1]
+        with self.assertLogs('books.tasks', 'WARNING'), patch('books.tasks.get_connection', return_value=connection):
+            result = send_reminder_chunk.apply(args=[self.ROWS]).get()
+        self.assertEqual((result['sent'], result['failed']), (2, 1))
+
+    @override_settings(REMINDER_MAX_RETRIES=2)
+    def test_unreachable_server_is_retried_then_raises(self):
+        connection = MagicMock()
+        connection.open.side_effect = ConnectionRefusedError("connection refused")
+        with self.assertLogs('books.tasks', 'WARNING'), patch('books.tasks.get_connection', return_value=connection):
+            result = send_reminder_chunk.apply(args=[self.ROWS])
+        self.assertTrue(result.failed())
+        self.assertEqual(connection.open.call_count, 3)
+
+    def test_retry_sends_only_the_unsent_reminders(self):
+        dropped, fresh = MagicMock(), MagicMock()
+        dropped.send_messages.side_effect = [1, smtplib.SMTPServerDisconnected("gone")]
+        fresh.send_messages.return_value = 1
+        with self.assertLogs('books.tasks', 'WARNING'), patch('books.tasks.get_connection', side_effect=[dropped, fresh]):
+            send_reminder_chunk.apply(args=[self.ROWS])
+        self.assertEqual([call.args[0][0].to for call in fresh.send_messages.call_args_list],
+                         [["b@example.com"], ["c@example.com"]])
+
+
+class RequestMetricsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        caches[settings.SHARED_CACHE].clear()
+        metrics_registry.reset()
+        self.author = Author.objects.create(
+            name="John Doe",
+            biography="Biography of John Doe",
+            nationality="American",
+            date_of_birth="1980-01-01"
+        )
+        Book.objects.create(
+            title="Sample Book",
+            description="Description of Sample Book",
+            author=self.author,
+            isbn="1234567890123",
+            category="Fiction",
+            publication_date="2024-01-01"
+        )
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.admin = User.objects.create_superuser(username="admin", password="password")
+
+    def test_metrics_endpoint_reports_routes(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get('/api/books/')
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('library_http_request_duration_seconds_count{route="book-list",method="GET"} 1', body)
+        self.assertIn('library_db_queries_per_request_sum{route="book-list",method="GET"} 1', body)
+        self.assertIn('library_serializer_seconds_total{route="book-list",method="GET"}', body)
+
+    def test_metrics_merge_worker_slots(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get('/api/books/')
+        metrics_registry.flush(force=True)
+        # Another worker on the host publishing the same route into its own slot
+        other_worker = FileBasedCache(settings.CACHES[settings.SHARED_CACHE]['LOCATION'], {})
+        other_worker.set(f'{metrics_registry.slot_key(metrics_registry.slot + 1)}:data', metrics_registry.snapshot())
+        stats = metrics_registry.collect()
+        self.assertEqual(stats[('book-list', 'GET')]['count'], 2)
+
+    def test_metrics_require_admin(self):
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_403_FORBIDDEN)
+
+
+class HotPathIndexTest(TestCase):
+    def setUp(self):
+        self.author = Author.objects.create(
+            name="John Doe",
+            biography="Biography of John Doe",
+            nationality="American",
+            date_of_birth="1980-01-01"
+        )
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.book = Book.objects.create(
+            title="Sample Book",
+            description="Description of Sample Book",
+            author=self.author,
+            isbn="1234567890123",
+            category="Fiction",
+            publication_date="2024-01-01"
+        )
+        Borrowing.objects.create(user=self.user, book=self.book)
+
+    def test_hot_path_queries_use_indexes(self):
+        plans = {
+            'borrowing_active_user_idx': Borrowing.objects.filter(user=self.user, return_date__isnull=True),
+            'borrowing_due_active_idx': Borrowing.objects.filter(due_date=timezone.now().date(), return_date__isnull=True),
+            'unique_active_borrowing_per_book': Borrowing.objects.filter(book=self.book, return_date__isnull=True),
+            'book_isbn_idx': Book.objects.filter(isbn="1234567890123"),
+        }
+        for index, queryset in plans.items():
+            self.assertIn(index, queryset.explain())
+
+    def test_index_report_restores_indexes(self):
+        out = StringIO()
+        call_command('index_report', '--repeat', '1', stdout=out)
+        self.assertIn('without indexes', out.getvalue())
+        self.assertIn('book_isbn_idx', Book.objects.filter(isbn="1234567890123").explain())
+
+
+class CachedJWTAuthenticationTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        blacklist_index.reset()
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.access = str(RefreshToken.for_user(self.user).access_token)
+
+    def get_borrowed_books(self):
+        return self.client.get('/api/borrowed-books/', HTTP_AUTHORIZATION=f'Bearer {self.access}')
+
+    def test_user_lookup_is_cached(self):
+        self.assertEqual(self.get_borrowed_books().status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_borrowed_books().status_code, status.HTTP_200_OK)
+
+    def test_deactivation_invalidates_cached_user(self):
+        self.get_borrowed_books()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get_borrowed_books().status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(JWT_BLACKLIST_PREFILTER=True)
+    def test_refresh_checks_blacklist_without_query(self):
+        refresh = str(RefreshToken.for_user(self.user))
+        blacklist_index.load()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/token/refresh/', {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(any('token_blacklist_blacklistedtoken' in q['sql'] and q['sql'].startswith('SELECT 1')
+                             for q in queries.captured_queries))
+
+        # The rotated-out token is rejected from the shared cache entry
+        response = self.client.post('/api/token/refresh/', {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(JWT_BLACKLIST_PREFILTER=True)
+    def test_previously_blacklisted_token_is_found_through_bloom_filter(self):
+        refresh = RefreshToken.for_user(self.user)
+        refresh.blacklist()
+        cache.clear()
+        response = self.client.post('/api/token/refresh/', {'refresh': str(refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(JWT_BLACKLIST_PREFILTER=True, JWT_BLACKLIST_SYNC_INTERVAL=0)
+    def test_token_blacklisted_after_load_survives_cache_flush(self):
+        refresh = RefreshToken.for_user(self.user)
+        blacklist_index.load()
+        # Blacklisted by another worker, and its cache entry evicted since
+        with patch.object(blacklist_index, 'add'):
+            refresh.blacklist()
+        response = self.client.post('/api/token/refresh/', {'refresh': str(refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cached_user_leaves_out_password(self):
+        self.get_borrowed_books()
+        cached = cache.get(user_cache_key(self.user.pk))
+        self.assertNotIn('password', cached)
+        self.assertNotIn(self.user.password, cached.values())
+
+        user = CachedJWTAuthentication().get_user(AccessToken(self.access))
+        self.assertEqual(user.get_deferred_fields(), {'password', 'email', 'first_name', 'last_name',
+                                                      'last_login', 'date_joined'})
+        user.save()
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('password'))
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(1000)
+        for i in range(1000):
+            bloom.add(f'jti-{i}')
+        self.assertTrue(all(f'jti-{i}' in bloom for i in range(1000)))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class AsyncReadPathTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = Author.objects.create(
+            name="John Doe",
+            biography="Biography of John Doe",
+            nationality="American",
+            date_of_birth="1980-01-01"
+        )
+        self.books = [
+            Book.objects.create(
+                title=f"Book {i}", description="", author=self.author,
+                isbn="1234567890123", category="Fiction", publication_date="2024-01-01"
+            )
+            for i in range(3)
+        ]
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.admin = User.objects.create_superuser(username="admin", password="password")
+        Borrowing.objects.create(user=self.user, book=self.books[0])
+        self.headers = {'Authorization': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+        self.admin_headers = {'Authorization': f'Bearer {RefreshToken.for_user(self.admin).access_token}'}
+
+    async def test_book_list_pages_with_cursor(self):
+        response = await self.async_client.get('/api/async/books/', {'page_size': 2}, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([b['title'] for b in data['results']], ["Book 0", "Book 1"])
+        response = await self.async_client.get(data['next'], headers=self.headers)
+        self.assertEqual([b['title'] for b in response.json()['results']], ["Book 2"])
+        self.assertIsNone(response.json()['next'])
+
+    async def test_borrowed_books_and_auth(self):
+        response = await self.async_client.get('/api/async/borrowed-books/', headers=self.headers)
+        self.assertEqual([b['book'] for b in response.json()['results']], [self.books[0].id])
+        response = await self.async_client.get('/api/async/borrowed-books/')
+        self.assertEqual(response.status_code, 401)
+
+    async def test_book_detail_requires_admin(self):
+        url = f'/api/async/books/{self.books[0].id}/'
+        self.assertEqual((await self.async_client.get(url, headers=self.headers)).status_code, 403)
+        response = await self.async_client.get(url, headers=self.admin_headers)
+        self.assertEqual(response.json()['title'], "Book 0")
+
+    async def test_async_registration(self):
+        response = await self.async_client.post(
+            '/api/async/register/',
+            {'username': 'newuser', 'password': 'password123', 'email': 'new@example.com'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('tokens', response.json())
+        user = await User.objects.aget(username='newuser')
+        self.assertTrue(user.check_password('password123'))
+
+    def test_async_routes_match_sync_responses(self):
+        Borrowing.objects.create(user=self.user, book=self.books[1])
+        Reservation.objects.create(user=self.user, book=self.books[2], position=1)
+        paths = [
+            ('/api/books/?category=Fiction&ordering=-publication_date&page_size=2', self.headers),
+            ('/api/borrowed-books/?page_size=1', self.headers),
+            ('/api/reserved-books/', self.headers),
+            (f'/api/books/{self.books[0].id}/', self.admin_headers),
+            (f'/api/books/{self.books[0].id}/', self.headers),
+            ('/api/books/999/', self.admin_headers),
+            ('/api/borrowed-books/', {}),
+        ]
+        for path, headers in paths:
+            with self.subTest(path=path):
+                cache.clear()
+                expected = self.client.get(path, headers=headers)
+                cache.clear()
+                response = async_to_sync(self.async_client.get)(path.replace('/api/', '/api/async/'), headers=headers)
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.content.replace(b'/api/async/', b'/api/'), expected.content)
+
+    def test_async_loadtest_command(self):
+        out = StringIO()
+        call_command('async_loadtest', username='testuser', requests=4, concurrency=2, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['/api/async/borrowed-books/']['requests'], 4)
+        self.assertIn('/api/async/books/', report['async_to_sync_throughput'])
+
+    def test_async_loadtest_outside_the_test_environment(self):
+        # As run from manage.py, with the shipped ALLOWED_HOSTS
+        teardown_test_environment()
+        try:
+            with override_settings(ALLOWED_HOSTS=[]):
+                out = StringIO()
+                call_command('async_loadtest', username='testuser', requests=2, concurrency=2, stdout=out)
+        finally:
+            setup_test_environment()
+        self.assertEqual(json.loads(out.getvalue())['/api/async/books/']['requests'], 2)
+
+    async def test_async_routes_answer_conditional_gets(self):
+        first = await self.async_client.get('/api/async/borrowed-books/', headers=self.headers)
+        response = await self.async_client.get('/api/async/borrowed-books/', headers={
+            **self.headers, 'If-None-Match': first['ETag'],
+        })
+        self.assertEqual(response.status_code, 304)
+
+
+class BenchCommandTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        isolated_profile_cache(self)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(SIMILARITY_INDEX_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_bench_reports_each_route(self):
+        out = StringIO()
+        call_command(
+            'bench', reuse_db=True, books=30, users=3, loans_per_user=2, requests=3, concurrency=1,
+            routes='book-list,borrow,return,bulk-return', stdout=out, stderr=StringIO(),
+        )
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report['routes']), {'book-list', 'borrow', 'return', 'bulk-return'})
+        for result in report['routes'].values():
+            self.assertEqual(result['requests'], 3)
+            self.assertEqual(result['errors'], 0)
+            self.assertIsNotNone(result['p99_ms'])
+        self.assertGreater(report['routes']['borrow']['queries_per_request'], 0)
+        self.assertEqual(report['database']['vendor'], 'sqlite')
+        self.assertEqual(Borrowing.objects.filter(return_date__isnull=True).count(), 3 + 3)
+
+    def test_unknown_route(self):
+        with self.assertRaises(CommandError):
+            call_command('bench', reuse_db=True, routes='nope', stdout=StringIO())
+
+    def test_scenarios_cover_every_api_route(self):
+        seed_dataset(books=30, users=3, loans_per_user=2)
+        ctx = BenchContext()
+        covered = {resolve(SCENARIOS[name](ctx, 1)[0][1].split('?')[0]).url_name for name in SCENARIOS}
+        routes = {pattern.name for pattern in get_resolver('books.urls').url_patterns}
+        self.assertEqual((routes | {'token_obtain_pair', 'token_refresh', 'metrics'}) - covered, set())
+
+    def test_read_only_scenarios_succeed(self):
+        routes = 'book-facets,similar,profiling-token,profile-list,profile-detail,profile-download,metrics'
+        out = StringIO()
+        call_command('bench', reuse_db=True, books=30, users=3, loans_per_user=2, requests=2, concurrency=1,
+                     routes=routes, stdout=out, stderr=StringIO())
+        report = json.loads(out.getvalue())
+        self.assertEqual({name: result['errors'] for name, result in report['routes'].items()},
+                         dict.fromkeys(routes.split(','), 0))
+
+
+class SyntheticDataGeneratorTest(TestCase):
+    def generate(self, **kwargs):
+        options = dict(seed=7, authors=5, books=40, users=12, loans=200, active_loans=30, reservations=10,
+                       scores=150, as_of=date(2024, 6, 1))
+        options.update(kwargs)
+        return SyntheticDataGenerator(**options).generate()
+
+    def snapshot(self):
+        return list(Borrowing.objects.order_by('id').values_list(
+            'user__username', 'book__title', 'borrow_date', 'due_date', 'return_date'))
+
+    def test_same_seed_same_rows(self):
+        with transaction.atomic():
+            self.generate()
+            first = self.snapshot()
+            transaction.set_rollback(True)
+        self.generate()
+        self.assertEqual(self.snapshot(), first)
+        self.assertEqual(len(first), 200 + 30)
+
+    def test_invariants(self):
+        written = self.generate()
+        self.assertEqual(written['active_loans'], 30)
+        active = Borrowing.objects.filter(return_date__isnull=True)
+        per_user = active.values('user').annotate(n=Count('id'))
+        self.assertLessEqual(max(row['n'] for row in per_user), MAX_ACTIVE_LOANS)
+        self.assertEqual(
+            {row['user']: row['n'] for row in per_user},
+            dict(LoanCounter.objects.values_list('user_id', 'active_loans')),
+        )
+        self.assertEqual(active.values('book').distinct().count(), 30)
+        for reservation in Reservation.objects.all():
+            self.assertTrue(active.filter(book=reservation.book).exclude(user=reservation.user).exists())
+        expected = {book.id: (book.score_sum, book.score_count) for book in Book.objects.all()}
+        Book.objects.rebuild_score_aggregates()
+        self.assertEqual({book.id: (book.score_sum, book.score_count) for book in Book.objects.all()}, expected)
+
+    def test_command_keeps_search_index(self):
+        out = StringIO()
+        call_command('generate_data', seed=1, authors=3, books=20, users=5, loans=50, active_loans=5,
+                     reservations=2, scores=20, stdout=out)
+        self.assertIn('rows/s', out.getvalue())
+        book = Book.objects.order_by('id').first()
+        self.assertIn(book.id, get_search_backend().search(str(book.id), 50))
+
+    def test_command_invalidates_cached_views(self):
+        namespaces = ('catalog', 'circulation', 'reservations')
+        before = [get_version(namespace) for namespace in namespaces]
+        call_command('generate_data', seed=1, authors=3, books=20, users=5, loans=50, active_loans=5,
+                     reservations=2, scores=20, stdout=StringIO())
+        for namespace, version in zip(namespaces, before):
+            self.assertGreater(get_version(namespace), version, namespace)
+
+
+def isolated_profile_cache(test):
+    # Profiles go to files shared by the workers; keep the tests' out of PROFILING_DIR
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+    settings_override = override_settings(CACHES={
+        **settings.CACHES,
+        'profiles': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory.name},
+    })
+    settings_override.enable()
+    test.addCleanup(settings_override.disable)
+    return directory.name
+
+
+class ProfilingMiddlewareTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.profile_dir = isolated_profile_cache(self)
+        self.admin = User.objects.create_superuser(username="admin", password="password")
+        self.user = User.objects.create_user(username="testuser", password="password")
+        author = Author.objects.create(name="John Doe", biography="", nationality="American",
+                                       date_of_birth="1980-01-01")
+        Book.objects.create(title="Book 1", description="", author=author, isbn="1234567890123",
+                            category="Fiction", publication_date="2024-01-01")
+
+    def token(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post('/api/profiles/token/')
+        self.assertEqual(response.data['header'], 'X-PROFILE')
+        return response.data['token']
+
+    def test_signed_header_profiles_request(self):
+        token = self.token()
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/books/', headers={'X-Profile': token})
+        self.assertEqual(response.status_code, 200)
+        profile_id = response['X-Profile-Id']
+
+        self.client.force_authenticate(user=self.admin)
+        listing = self.client.get('/api/profiles/').data['results']
+        self.assertEqual(listing[0]['id'], profile_id)
+        self.assertEqual(listing[0]['route'], 'book-list')
+        detail = self.client.get(f'/api/profiles/{profile_id}/').data
+        self.assertTrue(any('books_book' in query['sql'] for query in detail['query_log']))
+        self.assertIn('function calls', detail['top_functions'])
+
+        stats = marshal.loads(self.client.get(f'/api/profiles/{profile_id}/pstats/').content)
+        self.assertTrue(any(name == 'get' for _, _, name in stats))
+        self.assertEqual(self.client.get(f'/api/profiles/{profile_id}/collapsed/').status_code, 200)
+
+    def test_unsigned_requests_are_not_profiled(self):
+        self.client.force_authenticate(user=self.user)
+        self.assertNotIn('X-Profile-Id', self.client.get('/api/books/'))
+        self.assertNotIn('X-Profile-Id', self.client.get('/api/books/', headers={'X-Profile': 'forged:token'}))
+        self.assertEqual(self.client.post('/api/profiles/token/').status_code, 403)
+        self.assertEqual(self.client.get('/api/profiles/').status_code, 403)
+
+    def test_token_stops_working_when_admin_is_demoted(self):
+        token = self.token()
+        User.objects.filter(pk=self.admin.pk).update(is_staff=False)
+        response = self.client.get('/api/books/', headers={'X-Profile': token})
+        self.assertNotIn('X-Profile-Id', response)
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_sampling_rate(self):
+        self.client.force_authenticate(user=self.user)
+        self.assertIn('X-Profile-Id', self.client.get('/api/books/'))
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    async def test_async_request_profiled(self):
+        response = await self.async_client.get('/api/async/books/')
+        self.assertEqual(response.status_code, 401)
+        profile = await sync_to_async(get_profile)(response['X-Profile-Id'])
+        self.assertEqual(profile['summary']['route'], 'async-book-list')
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_profiles_are_visible_to_other_workers(self):
+        self.client.force_authenticate(user=self.user)
+        profile_id = self.client.get('/api/books/')['X-Profile-Id']
+        # A worker in another process only shares the files
+        other_worker = FileBasedCache(self.profile_dir, {})
+        self.assertEqual(other_worker.get(profile_key(profile_id))['summary']['route'], 'book-list')
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_requests_during_another_profile_are_served_unprofiled(self):
+        self.client.force_authenticate(user=self.user)
+        with active_profile:
+            response = self.client.get('/api/books/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertIn('X-Profile-Id', self.client.get('/api/books/'))
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    async def test_concurrent_async_requests_are_profiled_one_at_a_time(self):
+        responses = await asyncio.gather(*(self.async_client.get('/api/async/books/') for _ in range(4)))
+        self.assertEqual({response.status_code for response in responses}, {401})
+        self.assertGreaterEqual(sum('X-Profile-Id' in response for response in responses), 1)
+        self.assertFalse(active_profile.locked())
+
+
+class ReservationWaitlistTest(APITestCase):
+    def setUp(self):
+        author = Author.objects.create(name="John Doe", biography="", nationality="American",
+                                       date_of_birth="1980-01-01")
+        self.book = Book.objects.create(title="Popular", description="", author=author, isbn="1234567890123",
+                                        category="Fiction", publication_date="2024-01-01")
+        self.borrower, self.first, self.second = [
+            User.objects.create_user(username=name, password="password") for name in ("borrower", "first", "second")
+        ]
+        self.loan = Borrowing.objects.create(user=self.borrower, book=self.book)
+        LoanCounter.objects.create(user=self.borrower, active_loans=1)
+
+    def reserve(self, user):
+        self.client.force_authenticate(user=user)
+        return self.client.post('/api/reserve/', {'book': self.book.id}, format='json')
+
+    def borrow(self, user):
+        self.client.force_authenticate(user=user)
+        return self.client.post('/api/borrow/', {'book': self.book.id}, format='json')
+
+    def test_readers_queue_in_order(self):
+        self.assertEqual(self.reserve(self.first).data['queue_position'], 1)
+        response = self.reserve(self.second)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['queue_position'], 2)
+        self.assertIsNone(response.data['ready_date'])
+        self.assertEqual(self.reserve(self.second).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.reserve(self.borrower).status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(user=self.second)
+        listing = self.client.get('/api/reserved-books/').data['results']
+        self.assertEqual(listing[0]['queue_position'], 2)
+
+    def test_return_hands_book_to_head_of_queue(self):
+        self.reserve(self.first)
+        self.reserve(self.second)
+        self.client.force_authenticate(user=self.borrower)
+        self.client.delete(f'/api/return/{self.loan.id}/')
+        head, waiting = Reservation.objects.order_by('position')
+        self.assertIsNotNone(head.ready_date)
+        self.assertIsNone(waiting.ready_date)
+
+        self.assertEqual(self.borrow(self.second).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.borrow(self.first).status_code, status.HTTP_201_CREATED)
+        # The collected reservation is gone and the next reader moves up
+        self.client.force_authenticate(user=self.second)
+        self.assertEqual(self.client.get('/api/reserved-books/').data['results'][0]['queue_position'], 1)
+
+    def test_bulk_paths_follow_the_queue(self):
+        self.reserve(self.first)
+        self.client.force_authenticate(user=self.borrower)
+        self.client.post('/api/return/bulk/', {'borrowings': [self.loan.id]}, format='json')
+        self.assertIsNotNone(Reservation.objects.get(user=self.first).ready_date)
+
+        self.client.force_authenticate(user=self.second)
+        response = self.client.post('/api/borrow/bulk/', {'books': [self.book.id]}, format='json')
+        self.assertEqual(response.data['results'][0]['detail'], "This book is reserved by another user.")
+        self.client.force_authenticate(user=self.first)
+        response = self.client.post('/api/borrow/bulk/', {'books': [self.book.id]}, format='json')
+        self.assertEqual(response.data['results'][0]['status'], 'borrowed')
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_next_in_line_lookup_is_constant(self):
+        readers = [User.objects.create_user(username=f"reader{i}", password="password") for i in range(20)]
+        Reservation.objects.bulk_create(
+            [Reservation(user=reader, book=self.book, position=i + 1) for i, reader in enumerate(readers)]
+        )
+        with self.assertNumQueries(1):
+            Reservation.objects.hand_off([self.book.id], timezone.now())
+        self.assertEqual(Reservation.objects.filter(ready_date__isnull=False).get().user, readers[0])
+
+
+class BookNeighbourTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        author = Author.objects.create(name="John Doe", biography="", nationality="American",
+                                       date_of_birth="1980-01-01")
+        self.books = [
+            Book.objects.create(title=f"Book {i}", description="", author=author, isbn=f"{i:013d}",
+                                category="Fiction", publication_date="2024-01-01")
+            for i in range(5)
+        ]
+        self.users = [User.objects.create_user(username=f"reader{i}", password="password") for i in range(4)]
+        self.lend({0: [0, 1, 2], 1: [0, 1, 2], 2: [0, 1], 3: [0, 3]})
+
+    def lend(self, history):
+        Borrowing.objects.bulk_create([
+            Borrowing(user=self.users[user], book=self.books[book], return_date=timezone.now())
+            for user, books in history.items() for book in books
+        ])
+
+    def refresh(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return refresh_neighbours(**kwargs)
+
+    def snapshot(self):
+        return {
+            (row.book_id, row.rank): (row.neighbour_id, row.shared_readers, round(row.score, 6))
+            for row in BookNeighbour.objects.all()
+        }
+
+    def test_full_rebuild_matches_dense_cooccurrence(self):
+        self.assertEqual(self.refresh(full=True)['mode'], 'full')
+        ids = [book.id for book in self.books]
+        matrix = np.zeros((len(self.users), len(ids)))
+        for user_id, book_id in Borrowing.objects.values_list('user_id', 'book_id'):
+            matrix[[u.id for u in self.users].index(user_id), ids.index(book_id)] = 1
+        shared = matrix.T @ matrix
+        readers = matrix.sum(axis=0)
+
+        expected = {}
+        for i, book_id in enumerate(ids):
+            related = sorted(
+                (-shared[i, j] / np.sqrt(readers[i] * readers[j]), ids[j])
+                for j in range(len(ids)) if j != i and shared[i, j] >= 2
+            )
+            for rank, (score, neighbour_id) in enumerate(related, start=1):
+                expected[(book_id, rank)] = (neighbour_id, int(shared[i, ids.index(neighbour_id)]), round(-score, 6))
+        self.assertEqual(self.snapshot(), expected)
+        # Book 3 shares a single reader with book 0, below the threshold
+        self.assertFalse(BookNeighbour.objects.filter(book=self.books[3]).exists())
+
+    def test_incremental_refresh_folds_in_new_borrowings(self):
+        self.refresh()
+        self.assertEqual(self.refresh()['books'], 0)
+        self.lend({3: [1, 2], 2: [3]})
+        result = self.refresh()
+        self.assertEqual(result['mode'], 'incremental')
+        incremental = self.snapshot()
+        self.refresh(full=True)
+        self.assertEqual(incremental, self.snapshot())
+        self.assertTrue(BookNeighbour.objects.filter(book=self.books[3], neighbour=self.books[0]).exists())
+
+    def test_also_borrowed_endpoint(self):
+        self.refresh()
+        self.client.force_authenticate(user=self.users[0])
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/books/{self.books[0].id}/also-borrowed/')
+        self.assertEqual([row['book']['id'] for row in response.data], [self.books[1].id, self.books[2].id])
+        self.assertEqual(response.data[0]['shared_readers'], 3)
+        self.assertEqual(self.client.get('/api/books/999/also-borrowed/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_recommendations_skip_books_already_read(self):
+        self.refresh()
+        self.client.force_authenticate(user=self.users[3])
+        response = self.client.get('/api/recommendations/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([book['id'] for book in response.data], [self.books[1].id, self.books[2].id])
+        self.assertGreater(response.data[0]['score'], response.data[1]['score'])
+
+
+class SimilarBooksTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(SIMILARITY_INDEX_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.author = Author.objects.create(name="John Doe", biography="", nationality="American",
+                                            date_of_birth="1980-01-01")
+        descriptions = [
+            ("Dragon Quest", "A young wizard learns dragon magic on a quest", "Fantasy"),
+            ("Wizard Kingdom", "Magic and a dragon threaten the wizard kingdom", "Fantasy"),
+            ("Galaxy War", "Alien fleets fight a war across the galaxy", "Science Fiction"),
+            ("Star Colony", "Colonists meet an alien race far across the galaxy", "Science Fiction"),
+            ("Kitchen Basics", "Recipes for bread, soup and simple dinners", "Cooking"),
+        ]
+        self.books = [
+            Book.objects.create(title=title, description=description, author=self.author, isbn=f"{i:013d}",
+                                category=category, publication_date="2024-01-01")
+            for i, (title, description, category) in enumerate(descriptions)
+        ]
+        self.user = User.objects.create_user(username="reader", password="password")
+        self.client.force_authenticate(user=self.user)
+
+    def similar(self, book):
+        response = self.client.get(f'/api/books/{book.id}/similar/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_needs_a_built_index(self):
+        response = self.client.get(f'/api/books/{self.books[0].id}/similar/')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(self.client.get('/api/books/999/similar/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_similar_books_ranked_by_description(self):
+        self.assertEqual(build_index()['books'], 5)
+        results = self.similar(self.books[0])
+        self.assertEqual(results[0]['id'], self.books[1].id)
+        self.assertNotIn(self.books[0].id, [book['id'] for book in results])
+        self.assertEqual([book['score'] for book in results], sorted((book['score'] for book in results), reverse=True))
+        self.assertEqual(self.similar(self.books[2])[0]['id'], self.books[3].id)
+
+    @override_settings(SIMILARITY_PROBES=1000)
+    def test_probing_every_cluster_matches_exact_search(self):
+        with transaction.atomic():
+            SyntheticDataGenerator(seed=3, authors=5, books=300, users=2, loans=0, active_loans=0,
+                                   reservations=0, scores=0).generate()
+        self.assertGreater(build_index()['clusters'], 1)
+        index = get_similarity_index()
+        ids, vectors = vectorize(
+            Book.objects.order_by('id').values_list('id', 'title', 'description', 'category'), index.idf
+        )
+        expected = ids[np.argsort(-(vectors @ vectors[0]), kind='stable')[1:11]]
+        found, scores = index.search(vectors[0], 10, exclude=ids[0])
+        self.assertEqual(set(found), set(expected.tolist()))
+        self.assertAlmostEqual(scores[0], float(np.max(vectors[1:] @ vectors[0])), places=5)
+
+    def test_saved_books_are_reindexed(self):
+        build_index()
+        admin = User.objects.create_superuser(username="admin", password="password")
+        self.client.force_authenticate(user=admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/books/create/', {
+                'title': "Dragon Magic", 'description': "A wizard and a dragon on a magic quest",
+                'author': self.author.id, 'isbn': "9780306406157", 'category': "Fantasy",
+                'publication_date': "2024-01-01",
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn(response.data['id'], [book['id'] for book in self.similar(self.books[0])[:2]])
+
+        # An edit replaces the indexed copy of the book
+        with self.captureOnCommitCallbacks(execute=True):
+            self.books[4].description = "A wizard cooks dragon soup with magic"
+            self.books[4].category = "Fantasy"
+            self.books[4].save()
+        results = [book['id'] for book in self.similar(self.books[0])]
+        self.assertEqual(results.count(self.books[4].id), 1)
+        self.assertLess(results.index(self.books[4].id), results.index(self.books[2].id))
+
+    def test_saves_before_the_first_build_enqueue_nothing(self):
+        with patch.object(update_similarity_index, 'delay') as delay, self.captureOnCommitCallbacks(execute=True):
+            self.books[0].save()
+        delay.assert_not_called()
+
+    def test_broker_outage_does_not_fail_the_save(self):
+        build_index()
+        admin = User.objects.create_superuser(username="admin", password="password")
+        self.client.force_authenticate(user=admin)
+        with patch.object(update_similarity_index, 'delay', side_effect=KombuOperationalError("refused")), \
+                self.assertLogs('django', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/books/{self.books[0].id}/', {'title': "Dragon Quest II"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+    @override_settings(SIMILARITY_MAX_DELTAS=1)
+    def test_one_rebuild_queued_past_the_delta_limit(self):
+        build_index()
+        store = caches[settings.SHARED_CACHE]
+        store.delete(SIMILARITY_REBUILD_KEY)
+        with patch.object(rebuild_similarity_index, 'delay') as delay:
+            for _ in range(4):
+                update_similarity_index([self.books[0].id])
+        delay.assert_called_once()
+        rebuild_similarity_index()
+        self.assertIsNone(store.get(SIMILARITY_REBUILD_KEY))
+        self.assertEqual(update_similarity_index([self.books[0].id]), 1)
+
+    def test_rebuild_keeps_updates_made_while_it_runs(self):
+        build_index()
+        train_centroids = similarity.train_centroids
+
+        def save_during_build(*args, **kwargs):
+            # The rows are already read; this edit lands as a delta of the old generation
+            Book.objects.filter(id=self.books[4].id).update(
+                description="A wizard cooks dragon soup with magic", category="Fantasy")
+            update_index([self.books[4].id])
+            return train_centroids(*args, **kwargs)
+
+        with patch.object(similarity, 'train_centroids', save_during_build):
+            build_index()
+        index = get_similarity_index()
+        index.refresh_deltas()
+        self.assertEqual(index.delta_ids.tolist(), [self.books[4].id])
+        _, expected = vectorize(Book.objects.filter(id=self.books[4].id).values_list(
+            'id', 'title', 'description', 'category'), index.idf)
+        np.testing.assert_allclose(index.delta_vectors, expected)
+
+
+class LeaderboardTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        author = Author.objects.create(name="John Doe", biography="", nationality="American",
+                                       date_of_birth="1980-01-01")
+        self.books = [
+            Book.objects.create(title=f"Book {i}", description="", author=author, isbn=f"{i:013d}",
+                                category="Fiction" if i < 3 else "History", publication_date="2024-01-01")
+            for i in range(5)
+        ]
+        self.users = [User.objects.create_user(username=f"reader{i}", password="password") for i in range(10)]
+        # One perfect score against many 4.5 averages
+        BookScore.objects.create(user=self.users[0], book=self.books[0], score=5)
+        for i, user in enumerate(self.users):
+            BookScore.objects.create(user=user, book=self.books[1], score=4 + i % 2)
+        for user in self.users[:5]:
+            BookScore.objects.create(user=user, book=self.books[3], score=1)
+
+        loans = Borrowing.objects.bulk_create(
+            [Borrowing(user=self.users[i], book=self.books[2], return_date=timezone.now()) for i in range(3)]
+            + [Borrowing(user=self.users[i], book=self.books[4], return_date=timezone.now()) for i in range(2)]
+        )
+        # Book 2's loans fall outside the last week but inside the month
+        Borrowing.objects.filter(id__in=[loan.id for loan in loans[:3]]).update(
+            borrow_date=timezone.now() - timedelta(days=10)
+        )
+        self.client.force_authenticate(user=self.users[0])
+
+    def board(self, name, **params):
+        response = self.client.get(f'/api/leaderboards/{name}/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(entry['rank'], entry['book']['id']) for entry in response.data['results']]
+
+    def test_top_rated_uses_bayesian_average(self):
+        build_leaderboards()
+        self.assertEqual(self.board('top-rated'), [(1, self.books[1].id), (2, self.books[0].id), (3, self.books[3].id)])
+        self.assertEqual(self.board('top-rated', category='History'), [(1, self.books[3].id)])
+
+    def test_borrowing_windows(self):
+        build_leaderboards()
+        self.assertEqual(self.board('borrowed-7d'), [(1, self.books[4].id)])
+        self.assertEqual(self.board('borrowed-30d'), [(1, self.books[2].id), (2, self.books[4].id)])
+        self.assertEqual(self.board('borrowed-30d', category='Fiction'), [(1, self.books[2].id)])
+        self.assertEqual(self.client.get('/api/leaderboards/nope/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_uncategorised_books_only_rank_overall(self):
+        Book.objects.filter(pk__in=[self.books[1].pk, self.books[4].pk]).update(category='')
+        build_leaderboards()
+        self.assertEqual(self.board('top-rated'), [(1, self.books[1].id), (2, self.books[0].id), (3, self.books[3].id)])
+        self.assertEqual(self.board('top-rated', category='Fiction'), [(1, self.books[0].id)])
+        self.assertEqual(self.board('borrowed-30d'), [(1, self.books[2].id), (2, self.books[4].id)])
+
+    def test_pages_are_rank_ranges_served_from_cache(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            build_leaderboards()
+        first = self.client.get('/api/leaderboards/top-rated/', {'page_size': 2})
+        self.assertEqual([entry['rank'] for entry in first.data['results']], [1, 2])
+        with self.assertNumQueries(1):
+            second = self.client.get(first.data['next'])
+        self.assertEqual([entry['rank'] for entry in second.data['results']], [3])
+        with self.assertNumQueries(0):
+            self.client.get(first.data['next'])
+
+        # A rebuild makes the cached pages unreachable
+        BookScore.objects.create(user=self.users[5], book=self.books[3], score=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            build_leaderboards()
+        with self.assertNumQueries(1):
+            self.client.get(first.data['next'])
+
+
+class AuthorStatsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser(username="admin", password="password")
+        self.reader = User.objects.create_user(username="reader", password="password")
+        self.authors = [
+            Author.objects.create(name=f"Author {i}", biography="", nationality="American", date_of_birth="1980-01-01")
+            for i in range(3)
+        ]
+        self.books = [
+            Book.objects.create(title=f"Book {i}", description="", author=self.authors[i % 2], isbn=f"{i:013d}",
+                                category="Fiction", publication_date="2024-01-01")
+            for i in range(5)
+        ]
+        BookScore.objects.create(user=self.reader, book=self.books[0], score=5)
+        BookScore.objects.create(user=self.admin, book=self.books[2], score=2)
+        BookScore.objects.create(user=self.reader, book=self.books[1], score=4)
+        Borrowing.objects.create(user=self.reader, book=self.books[0])
+        Borrowing.objects.create(user=self.reader, book=self.books[2], return_date=timezone.now())
+        LoanCounter.objects.create(user=self.reader, active_loans=1)
+        self.client.force_authenticate(user=self.admin)
+
+    def stats(self, data):
+        return [(a['book_count'], a['active_loan_count'], a['mean_rating']) for a in data['results']]
+
+    def test_list_is_annotated_in_a_fixed_number_of_queries(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/authors/')
+        self.assertEqual(self.stats(response.data), [(3, 1, 3.5), (2, 0, 4.0), (0, 0, None)])
+
+        Author.objects.bulk_create([
+            Author(name=f"Extra {i}", biography="", nationality="Irish", date_of_birth="1980-01-01") for i in range(5)
+        ])
+        cache.clear()
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/authors/', {'include': 'books'})
+        self.assertEqual(len(response.data['results']), 8)
+        self.assertEqual([book['id'] for book in response.data['results'][0]['books']],
+                         [self.books[0].id, self.books[2].id, self.books[4].id])
+
+    def test_detail_and_create(self):
+        response = self.client.get(f'/api/authors/{self.authors[1].id}/')
+        self.assertEqual((response.data['book_count'], response.data['mean_rating']), (2, 4.0))
+        self.assertNotIn('books', response.data)
+        response = self.client.post('/api/authors/', {
+            'name': "New", 'biography': "Bio", 'nationality': "French", 'date_of_birth': "1970-01-01",
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['book_count'], response.data['mean_rating']), (0, None))
+
+    def test_circulation_invalidates_cached_counts(self):
+        self.assertEqual(self.client.get('/api/authors/').data['results'][1]['active_loan_count'], 0)
+        self.client.force_authenticate(user=self.reader)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/borrow/bulk/', {'books': [self.books[1].id, self.books[3].id]}, format='json')
+        self.client.force_authenticate(user=self.admin)
+        self.assertEqual(self.client.get('/api/authors/').data['results'][1]['active_loan_count'], 2)
+
+        loan = Borrowing.objects.get(book=self.books[1])
+        self.client.force_authenticate(user=self.reader)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/return/{loan.id}/')
+        self.client.force_authenticate(user=self.admin)
+        self.assertEqual(self.client.get('/api/authors/').data['results'][1]['active_loan_count'], 1)
+
+
+class CatalogFacetTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="reader", password="password")
+        self.client.force_authenticate(user=self.user)
+        american = Author.objects.create(name="Ann", biography="", nationality="American", date_of_birth="1980-01-01")
+        irish = Author.objects.create(name="Bob", biography="", nationality="Irish", date_of_birth="1970-01-01")
+        rows = [
+            (american, "Fiction", "2001-05-01"), (american, "Fiction", "2010-05-01"),
+            (american, "History", "2010-06-01"), (irish, "Fiction", "2020-01-01"), (irish, "Poetry", "1999-12-31"),
+        ]
+        self.books = [
+            Book.objects.create(title=f"Book {i}", description="", author=author, isbn=f"{i:013d}",
+                                category=category, publication_date=published)
+            for i, (author, category, published) in enumerate(rows)
+        ]
+        self.american, self.irish = american, irish
+
+    def ids(self, **params):
+        response = self.client.get('/api/books/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [book['id'] for book in response.data['results']]
+
+    def test_list_filters(self):
+        books = self.books
+        self.assertEqual(self.ids(category='Fiction'), [books[0].id, books[1].id, books[3].id])
+        self.assertEqual(self.ids(nationality='Irish', category=['Fiction', 'Poetry']), [books[3].id, books[4].id])
+        self.assertEqual(self.ids(author=self.american.id, year_from=2005), [books[1].id, books[2].id])
+        self.assertEqual(self.ids(year_from=2000, year_to=2010), [books[0].id, books[1].id, books[2].id])
+        self.assertEqual(self.client.get('/api/books/', {'year_from': 'soon'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_facets_skip_their_own_filter(self):
+        # One grouped query per facet, plus the author names
+        with self.assertNumQueries(5):
+            response = self.client.get('/api/books/facets/', {'category': 'Fiction'})
+        facets = response.data
+        # Other categories stay countable while Fiction is selected
+        self.assertEqual(facets['category'], [
+            {'value': 'Fiction', 'count': 3}, {'value': 'History', 'count': 1}, {'value': 'Poetry', 'count': 1},
+        ])
+        self.assertEqual(facets['nationality'], [{'value': 'American', 'count': 2}, {'value': 'Irish', 'count': 1}])
+        self.assertEqual(facets['author'][0], {'value': self.american.id, 'label': 'Ann', 'count': 2})
+        self.assertEqual(facets['year'], [{'value': 2001, 'count': 1}, {'value': 2010, 'count': 1},
+                                          {'value': 2020, 'count': 1}])
+
+    def test_facets_cached_until_catalog_write(self):
+        self.client.get('/api/books/facets/', {'nationality': 'Irish'})
+        with self.assertNumQueries(0):
+            self.client.get('/api/books/facets/', {'nationality': 'Irish'})
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.create(title="New", description="", author=self.irish, isbn="9" * 13,
+                                category="Poetry", publication_date="2021-01-01")
+        response = self.client.get('/api/books/facets/', {'nationality': 'Irish'})
+        self.assertEqual(response.data['category'][0], {'value': 'Poetry', 'count': 2})
+
+
+class ConditionalGetTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="reader", password="password")
+        self.other = User.objects.create_user(username="other", password="password")
+        self.client.force_authenticate(user=self.user)
+        self.author = Author.objects.create(name="Ann", biography="", nationality="Irish", date_of_birth="1980-01-01")
+        self.books = [
+            Book.objects.create(title=f"Book {i}", description="", author=self.author, isbn=f"{i:013d}",
+                                category="Fiction", publication_date="2001-01-01")
+            for i in range(2)
+        ]
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_book_list_not_modified_until_catalog_write(self):
+        etag = self.client.get('/api/books/')['ETag']
+        # Answered from the version counters alone
+        with self.assertNumQueries(0):
+            response = self.revalidate('/api/books/', etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(self.revalidate('/api/books/', f'W/{etag}').status_code, status.HTTP_304_NOT_MODIFIED)
+        # Other query strings are other representations
+        self.assertEqual(self.revalidate('/api/books/?category=Fiction', etag).status_code, status.HTTP_200_OK)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.books[0].title = "Renamed"
+            self.books[0].save()
+        response = self.revalidate('/api/books/', etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['results'][0]['title'], "Renamed")
+
+    def test_etag_follows_bumps_from_another_worker(self):
+        etag = self.client.get('/api/books/')['ETag']
+        other_worker = FileBasedCache(settings.CACHES[settings.SHARED_CACHE]['LOCATION'], {})
+        other_worker.set('version:catalog', get_version('catalog') + 1, timeout=None)
+        self.assertEqual(self.revalidate('/api/books/', etag).status_code, status.HTTP_200_OK)
+
+    def test_book_detail_etag(self):
+        self.client.force_authenticate(user=User.objects.create_superuser(username="admin", password="password"))
+        url = f'/api/books/{self.books[0].id}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.revalidate(url, etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertNotEqual(self.client.get(f'/api/books/{self.books[1].id}/')['ETag'], etag)
+
+    def test_borrowed_list_follows_own_loans_only(self):
+        url = '/api/borrowed-books/'
+        etag = self.client.get(url)['ETag']
+        # Another reader's loan leaves this list alone
+        with self.captureOnCommitCallbacks(execute=True):
+            Borrowing.objects.create(user=self.other, book=self.books[1])
+        self.assertEqual(self.revalidate(url, etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            borrowing = self.client.post('/api/borrow/', {'book': self.books[0].id}).data
+        response = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+
+        # Returns are a queryset update, bumped by the view
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/return/bulk/', {'borrowings': [borrowing['id']]}, format='json')
+        response = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(response.data['results'][0]['return_date'])
+
+    def test_reserved_list_changes_on_hand_off(self):
+        url = '/api/reserved-books/'
+        with self.captureOnCommitCallbacks(execute=True):
+            borrowing = Borrowing.objects.create(user=self.other, book=self.books[0])
+            self.client.post('/api/reserve/', {'book': self.books[0].id})
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.revalidate(url, etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        # The same URL is tagged per user
+        self.client.force_authenticate(user=self.other)
+        self.assertEqual(self.revalidate(url, etag).status_code, status.HTTP_200_OK)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/return/{borrowing.id}/')
+        self.client.force_authenticate(user=self.user)
+        response = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(response.data['results'][0]['ready_date'])
+
+
+@override_settings(REPLICA_DATABASES=['default'])
+class ReplicaRoutingTest(APITestCase):
+    # The test database stands in for the replica; choose_replica is watched
+    # to see whether a request was routed to it.
+    def setUp(self):
+        self.user = User.objects.create_user(username="reader", password="password")
+        self.other = User.objects.create_user(username="other", password="password")
+        author = Author.objects.create(name="Ann", biography="", nationality="Irish", date_of_birth="1980-01-01")
+        self.book = Book.objects.create(title="Book", description="", author=author, isbn="1" * 13,
+                                        category="Fiction", publication_date="2001-01-01")
+        self.client.force_authenticate(user=self.user)
+        cache.clear()
+        routers._health.clear()
+
+    def routed(self, url):
+        with patch('books.routers.choose_replica', wraps=routers.choose_replica) as choose:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return choose.called
+
+    def test_router(self):
+        router = routers.ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Book))
+        token = routers.replica_alias.set('replica_1')
+        try:
+            self.assertEqual(router.db_for_read(Book), 'replica_1')
+            self.assertEqual(router.db_for_write(Book), 'default')
+        finally:
+            routers.replica_alias.reset(token)
+
+    def test_reads_stay_on_primary_after_own_write(self):
+        self.assertTrue(self.routed('/api/borrowed-books/'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/borrow/', {'book': self.book.id})
+        self.assertFalse(self.routed('/api/borrowed-books/'))
+        self.assertFalse(self.routed('/api/books/'))
+        # Other readers keep using the replica, except for recently bumped namespaces
+        self.client.force_authenticate(user=self.other)
+        self.assertTrue(self.routed('/api/books/'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.save()
+        self.assertFalse(self.routed('/api/books/'))
+
+    def test_unhealthy_replica_falls_back_to_primary(self):
+        self.assertEqual(routers.choose_replica(), 'default')
+        broken = MagicMock()
+        broken.__getitem__.return_value.cursor.side_effect = OperationalError("unable to open database file")
+        routers._health.clear()
+        with patch('books.routers.connections', broken):
+            self.assertIsNone(routers.choose_replica())
+
+    def test_replica_failing_mid_request_is_retried_on_primary(self):
+        with patch.object(BookListView, 'list', side_effect=[OperationalError("disk I/O error"), Response([])]):
+            response = self.client.get('/api/books/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(routers._health['default'][1], False)
+
+
+class RetryOnBusyTest(TransactionTestCase):
+    def locked_until(self, attempt):
+        calls = []
+
+        @retry_on_busy
+        def write():
+            calls.append(1)
+            if len(calls) < attempt:
+                raise OperationalError("database is locked")
+            return len(calls)
+        return write, calls
+
+    @patch('books.utils.time.sleep')
+    def test_retries_until_the_lock_is_free(self, sleep):
+        write, calls = self.locked_until(3)
+        self.assertEqual(write(), 3)
+        self.assertEqual(sleep.call_count, 2)
+
+    @override_settings(SQLITE_BUSY_RETRIES=2)
+    @patch('books.utils.time.sleep')
+    def test_gives_up_after_the_configured_retries(self, sleep):
+        write, calls = self.locked_until(10)
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), 3)
+
+    @patch('books.utils.time.sleep')
+    def test_no_retry_inside_an_outer_transaction_or_for_other_errors(self, sleep):
+        write, calls = self.locked_until(2)
+        with self.assertRaises(OperationalError), transaction.atomic():
+            write()
+        self.assertEqual(len(calls), 1)
+
+        @retry_on_busy
+        def broken():
+            calls.append(1)
+            raise OperationalError("no such table: books_book")
+        with self.assertRaises(OperationalError):
+            broken()
+        self.assertEqual(len(calls), 2)
+        sleep.assert_not_called()
+
+
+class APISchemaTest(APITestCase):
+    def generate(self):
+        # drf_yasg logs, rather than raises, when a view fails during generation
+        with patch('drf_yasg.inspectors.base.logger') as logger:
+            response = self.client.get('/swagger.json')
+        self.assertEqual(response.status_code, 200)
+        failed = {call.args[1] for call in logger.warning.call_args_list}
+        return response.json()['paths'], failed
+
+    def test_every_view_generates(self):
+        self.assertEqual(self.generate()[1], set())
+
+    def test_also_borrowed(self):
+        paths, failed = self.generate()
+        self.assertNotIn('AlsoBorrowedView', failed)
+        schema = paths['/api/books/{id}/also-borrowed/']['get']['responses']['200']['schema']
+        self.assertEqual(schema['items'], {'$ref': '#/definitions/BookNeighbour'})
+
+    def test_book_facets(self):
+        paths, failed = self.generate()
+        self.assertNotIn('BookFacetView', failed)
+        operation = paths['/api/books/facets/']['get']
+        self.assertEqual(operation['responses']['200']['schema'], {'$ref': '#/definitions/BookFacets'})
+
+    def test_similar_books(self):
+        paths, failed = self.generate()
+        self.assertNotIn('SimilarBooksView', failed)
+        schema = paths['/api/books/{id}/similar/']['get']['responses']['200']['schema']
+        self.assertEqual(schema['items'], {'$ref': '#/definitions/ScoredBook'})
@@ -1,24 +1,46 @@
 #books/urls.py
 from django.urls import path
+from . import async_views
 from .views import (
     AuthorListCreateView, AuthorRetrieveUpdateDestroyView,
-    BookListView, BookCreateView, BookRetrieveUpdateDestroyView,
+    BookListView, BookFacetView, BookSearchView, BookCreateView, BookRetrieveUpdateDestroyView,
     BorrowBookView, ReturnBookView, ReserveBookView,
     UserRegistrationView, BorrowedBooksListView, BookScoreCreateView,
-    ReservedBooksListView  
+    ReservedBooksListView, BulkBorrowView, BulkReturnView, BorrowingExportView,
+    ProfilingTokenView, ProfileListView, ProfileDetailView, ProfileDownloadView,
+    AlsoBorrowedView, SimilarBooksView, RecommendationListView, LeaderboardView
 )
 
 urlpatterns = [
     path('authors/', AuthorListCreateView.as_view(), name='author-list-create'),
     path('authors/<int:pk>/', AuthorRetrieveUpdateDestroyView.as_view(), name='author-detail'),
     path('books/', BookListView.as_view(), name='book-list'),
+    path('books/facets/', BookFacetView.as_view(), name='book-facets'),
+    path('books/search/', BookSearchView.as_view(), name='book-search'),
     path('books/score/', BookScoreCreateView.as_view(), name='book-score'),
     path('books/create/', BookCreateView.as_view(), name='book-create'),
     path('books/<int:pk>/', BookRetrieveUpdateDestroyView.as_view(), name='book-detail'),
+    path('books/<int:pk>/also-borrowed/', AlsoBorrowedView.as_view(), name='book-also-borrowed'),
+    path('books/<int:pk>/similar/', SimilarBooksView.as_view(), name='book-similar'),
+    path('leaderboards/<str:board>/', LeaderboardView.as_view(), name='leaderboard'),
+    path('recommendations/', RecommendationListView.as_view(), name='recommendations'),
     path('borrow/', BorrowBookView.as_view(), name='borrow-book'),
+    path('borrow/bulk/', BulkBorrowView.as_view(), name='bulk-borrow-book'),
+    path('return/bulk/', BulkReturnView.as_view(), name='bulk-return-book'),
     path('return/<int:pk>/', ReturnBookView.as_view(), name='return-book'),
     path('reserve/', ReserveBookView.as_view(), name='reserve-book'),
     path('register/', UserRegistrationView.as_view(), name='user-register'),
     path('reserved-books/', ReservedBooksListView.as_view(), name='reserved-books-list'),
     path('borrowed-books/', BorrowedBooksListView.as_view(), name='borrowed-books-list'),
+    path('borrowings/export/', BorrowingExportView.as_view(), name='borrowing-export'),
+    path('profiles/', ProfileListView.as_view(), name='profile-list'),
+    path('profiles/token/', ProfilingTokenView.as_view(), name='profiling-token'),
+    path('profiles/<str:profile_id>/', ProfileDetailView.as_view(), name='profile-detail'),
+    path('profiles/<str:profile_id>/<str:kind>/', ProfileDownloadView.as_view(), name='profile-download'),
+    # Async read paths for ASGI deployments
+    path('async/books/', async_views.book_list, name='async-book-list'),
+    path('async/books/<int:pk>/', async_views.book_detail, name='async-book-detail'),
+    path('async/borrowed-books/', async_views.borrowed_books_list, name='async-borrowed-books-list'),
+    path('async/reserved-books/', async_views.reserved_books_list, name='async-reserved-books-list'),
+    path('async/register/', async_views.user_registration, name='async-user-register'),
 ]
@@ -0,0 +1,34 @@
+import random
+import time
+from functools import wraps
+from itertools import islice
+from django.conf import settings
+from django.db import OperationalError, transaction
+
+
+def batched(iterable, size):
+    # Yield lists of up to `size` items without materializing the iterable
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def retry_on_busy(func):
+    """
+    Re-run `func` when SQLite reports the database as locked. `func` must open
+    its own transaction: inside an outer one the lock error is raised as is,
+    since only the whole transaction can be retried. With IMMEDIATE
+    transactions the error comes from BEGIN, before anything was written.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(settings.SQLITE_BUSY_RETRIES + 1):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as exc:
+                if ('database is locked' not in str(exc) or attempt == settings.SQLITE_BUSY_RETRIES
+                        or transaction.get_connection().in_atomic_block):
+                    raise
+            # Jittered exponential backoff, so the retries do not collide again
+            time.sleep(settings.SQLITE_BUSY_RETRY_DELAY * 2 ** attempt * random.uniform(0.5, 1.5))
+    return wrapper
@@ -0,0 +1,16 @@
+import re
+
+ISBN_SEPARATORS = re.compile(r'[\s-]')
+
+
+def normalize_isbn(value):
+    """Return the ISBN-10/13 without separators, or None if the checksum is wrong."""
+    isbn = ISBN_SEPARATORS.sub('', str(value or '')).upper()
+    if len(isbn) == 10 and isbn[:9].isdigit() and (isbn[9].isdigit() or isbn[9] == 'X'):
+        digits = [int(c) for c in isbn[:9]] + [10 if isbn[9] == 'X' else int(isbn[9])]
+        if sum((10 - i) * d for i, d in enumerate(digits)) % 11 == 0:
+            return isbn
+    elif len(isbn) == 13 and isbn.isdigit():
+        if sum(int(c) * (3 if i % 2 else 1) for i, c in enumerate(isbn)) % 10 == 0:
+            return isbn
+    return None
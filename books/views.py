@@ -1,16 +1,34 @@
 from rest_framework import generics
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
-from .models import Author, Book, Borrowing, Reservation, BookScore
+from .models import Author, Book, BookNeighbour, Borrowing, LeaderboardEntry, Reservation, BookScore, LoanCounter, MAX_ACTIVE_LOANS
 from .serializers import AuthorSerializer, BookSerializer, BorrowingSerializer, ReservationSerializer, UserRegistrationSerializer, BookScoreSerializer
+from .serializers import BulkBorrowSerializer, BulkReturnSerializer, BookNeighbourSerializer, ScoredBookSerializer
+from .serializers import BookFacetsSerializer, LeaderboardEntrySerializer
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.utils import timezone
-from django.http import JsonResponse
-from rest_framework.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Max, Prefetch, Sum
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from datetime import date
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.filters import OrderingFilter
+from .pagination import BorrowingPagination, LeaderboardPagination, ReservationPagination
+from .leaderboards import BOARDS
+from .filters import CatalogFilterBackend, catalog_filters, facet_counts
+from .search import get_search_backend
+from .similarity import get_similarity_index, vectorize
+from .routers import ReplicaReadMixin
+from .cache import ConditionalGetMixin, VersionedCacheMixin, bump_version_on_commit, user_namespace
+from .exports import EXPORT_FORMATS, borrowing_rows, buffered
+from .metrics import registry, render_prometheus
+from .profiling import get_profile, make_profiling_token, recent_profiles
+from .utils import retry_on_busy
+from django.conf import settings
 
 
 # Generate JWT token for a user
@@ -29,34 +47,65 @@ class UserRegistrationView(generics.CreateAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
+        return self.created(user)
+
+    def created(self, user):
         tokens = get_tokens_for_user(user)
         return Response({
             "message": "User created successfully.",
             "tokens": tokens
         }, status=status.HTTP_201_CREATED)
 
-class BorrowedBooksListView(generics.ListAPIView):
+class BorrowedBooksListView(ReplicaReadMixin, ConditionalGetMixin, generics.ListAPIView):
     serializer_class = BorrowingSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = BorrowingPagination
+
+    def get_cache_namespaces(self):
+        return (user_namespace('borrowings', self.request.user.pk),)
 
     def get_queryset(self):
         return Borrowing.objects.filter(user=self.request.user)
 
-class ReservedBooksListView(generics.ListAPIView):
+class ReservedBooksListView(ReplicaReadMixin, ConditionalGetMixin, generics.ListAPIView):
     serializer_class = ReservationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ReservationPagination
+
+    def get_cache_namespaces(self):
+        # Queue positions move when other readers of the same book come and go,
+        # so reservation lists share one namespace
+        return ('reservations',)
+
+    def get_queryset(self):
+        return Reservation.objects.filter(user=self.request.user).with_queue_position()
+
+
+class AuthorStatsMixin:
+    # Book, loan and rating figures are annotated on the author rows and
+    # ?include=books adds one prefetch query, so a page costs a fixed number of queries.
+    # Active loans change with circulation, hence the second cache namespace.
+    cache_namespaces = ('catalog', 'circulation')
+
+    def include_books(self):
+        return 'books' in self.request.query_params.get('include', '').split(',')
 
     def get_queryset(self):
-        return Reservation.objects.filter(user=self.request.user)
+        queryset = Author.objects.with_stats()
+        if self.include_books():
+            queryset = queryset.prefetch_related(Prefetch('books', queryset=Book.objects.order_by('id')))
+        return queryset
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['include_books'] = self.include_books()
+        return context
 
-class AuthorListCreateView(generics.ListCreateAPIView):
-    queryset = Author.objects.all()
+class AuthorListCreateView(ReplicaReadMixin, AuthorStatsMixin, VersionedCacheMixin, generics.ListCreateAPIView):
     serializer_class = AuthorSerializer
     permission_classes = [IsAdminUser]  # Only admin can create authors
 
-class AuthorRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Author.objects.all()
+class AuthorRetrieveUpdateDestroyView(ReplicaReadMixin, AuthorStatsMixin, VersionedCacheMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = AuthorSerializer
     permission_classes = [IsAdminUser]  # Only admin can update/delete authors
 
@@ -64,6 +113,7 @@ class AuthorRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
 class BookScoreCreateView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @retry_on_busy
     def post(self, request, *args, **kwargs):
         user = request.user  
         book_id = request.data.get('book')
@@ -72,6 +122,11 @@ class BookScoreCreateView(APIView):
         if not book_id or not score:
             return Response({'detail': 'Book ID and score are required.'}, status=status.HTTP_400_BAD_REQUEST)
 
+        try:
+            score = int(score)
+        except (TypeError, ValueError):
+            return Response({'detail': 'Score must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+
         try:
             book = Book.objects.get(id=book_id)
         except Book.DoesNotExist:
@@ -81,65 +136,196 @@ class BookScoreCreateView(APIView):
         if BookScore.objects.filter(user=user, book=book).exists():
             return Response({'detail': 'You have already scored this book.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        book_score = BookScore(user=user, book=book, score=score)
-        book_score.save()
+        # The score row and the book's rating aggregates are written together
+        with transaction.atomic():
+            book_score = BookScore(user=user, book=book, score=score)
+            book_score.save()
 
         serializer = BookScoreSerializer(book_score)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-class BookListView(generics.ListAPIView):
+class BookListView(ReplicaReadMixin, ConditionalGetMixin, VersionedCacheMixin, generics.ListAPIView):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
+    # Only indexed columns may be used as the keyset ordering
+    filter_backends = [CatalogFilterBackend, OrderingFilter]
+    ordering_fields = ['id', 'publication_date']
+    ordering = ['id']
+
+class BookFacetView(ReplicaReadMixin, VersionedCacheMixin, generics.RetrieveAPIView):
+    # Facet counts for the same filters as BookListView, cached per filter combination
+    serializer_class = BookFacetsSerializer
+
+    def get_object(self):
+        return facet_counts(catalog_filters(self.request.query_params))
+
+class BookSearchView(ReplicaReadMixin, VersionedCacheMixin, generics.ListAPIView):
+    serializer_class = BookSerializer
+    pagination_class = None
+
+    def list(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': 'This query parameter is required.'})
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            raise ValidationError({'limit': 'A valid integer is required.'})
+        limit = max(1, min(limit, settings.PAGINATION_MAX_PAGE_SIZE))
+
+        # The backend returns ranked ids; the rows are then loaded in one query
+        ids = get_search_backend().search(query, limit)
+        books = Book.objects.in_bulk(ids)
+        results = [books[book_id] for book_id in ids if book_id in books]
+        serializer = self.get_serializer(results, many=True)
+        return Response(serializer.data)
 
 class BookCreateView(generics.CreateAPIView):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = [IsAdminUser]  
 
-class BookRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class BookRetrieveUpdateDestroyView(ReplicaReadMixin, ConditionalGetMixin, VersionedCacheMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = [IsAdminUser]  
 
+class AlsoBorrowedView(ReplicaReadMixin, VersionedCacheMixin, generics.ListAPIView):
+    # Precomputed by books.tasks.refresh_book_neighbours; one query on the (book, rank) index
+    serializer_class = BookNeighbourSerializer
+    pagination_class = None
+    cache_namespaces = ('catalog', 'recommendations')
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            # Schema generation has no URL kwargs
+            return BookNeighbour.objects.none()
+        return BookNeighbour.objects.filter(book_id=self.kwargs['pk']).select_related('neighbour').order_by('rank')
+
+    def list(self, request, *args, **kwargs):
+        neighbours = list(self.get_queryset())
+        if not neighbours and not Book.objects.filter(pk=self.kwargs['pk']).exists():
+            return Response({'detail': 'No Book matches the given query.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(self.get_serializer(neighbours, many=True).data)
+
+class SimilarBooksView(ReplicaReadMixin, VersionedCacheMixin, generics.ListAPIView):
+    # Nearest books in the description vector index, see books.similarity
+    queryset = Book.objects.all()
+    serializer_class = ScoredBookSerializer
+    pagination_class = None
+    cache_namespaces = ('catalog', 'similarity')
+
+    def list(self, request, *args, **kwargs):
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            raise ValidationError({'limit': 'A valid integer is required.'})
+        limit = max(1, min(limit, settings.PAGINATION_MAX_PAGE_SIZE))
+
+        book = self.get_object()
+        index = get_similarity_index()
+        if index is None:
+            return Response({'detail': 'The similarity index has not been built yet.'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        _, vector = vectorize([(book.id, book.title, book.description, book.category)], index.idf)
+        ids, scores = index.search(vector[0], limit, exclude=book.id)
+        books = Book.objects.in_bulk(ids)
+        results = []
+        for book_id, score in zip(ids, scores):
+            if book_id in books:
+                books[book_id].score = score
+                results.append(books[book_id])
+        return Response(self.get_serializer(results, many=True).data)
+
+class LeaderboardView(ReplicaReadMixin, VersionedCacheMixin, generics.ListAPIView):
+    # Rebuilt by books.tasks.rebuild_leaderboards; ?category= selects a category board
+    serializer_class = LeaderboardEntrySerializer
+    pagination_class = LeaderboardPagination
+    cache_namespaces = ('catalog', 'leaderboards')
+
+    def get_queryset(self):
+        if self.kwargs['board'] not in BOARDS:
+            raise NotFound(f"Unknown leaderboard. Choose one of: {', '.join(BOARDS)}.")
+        return LeaderboardEntry.objects.filter(
+            board=self.kwargs['board'], category=self.request.query_params.get('category', ''),
+        ).select_related('book')
+
+class RecommendationListView(ReplicaReadMixin, generics.ListAPIView):
+    # Neighbours of the user's latest borrowings that they have not read yet
+    serializer_class = ScoredBookSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = None
+
+    def get_queryset(self):
+        history = Borrowing.objects.filter(user=self.request.user)
+        recent = history.order_by('-borrow_date').values('book_id')[:settings.RECOMMENDATION_HISTORY]
+        return (
+            Book.objects.filter(neighbour_of__book__in=recent)
+            .exclude(id__in=history.values('book_id'))
+            .annotate(score=Sum('neighbour_of__score'))
+            .order_by('-score', 'id')[:settings.RECOMMENDATION_NEIGHBOURS]
+        )
+
 class BorrowBookView(generics.CreateAPIView):
     queryset = Borrowing.objects.all()
     serializer_class = BorrowingSerializer
     permission_classes = [IsAuthenticated]  
 
+    @retry_on_busy
     def perform_create(self, serializer):
         user = self.request.user
         book = serializer.validated_data['book']
 
-        # Check how many books the user currently has borrowed and not returned
-        current_borrowed_books = Borrowing.objects.filter(user=user, return_date__isnull=True).count()
-        if current_borrowed_books >= 5:
-            raise ValidationError("You cannot borrow more than 5 books at a time.")
-
-        # Check if the book is already borrowed by another user
-        if Borrowing.objects.filter(book=book, return_date__isnull=True).exists():
+        # The loan limit and "one active loan per book" are enforced by the
+        # database, so concurrent borrows cannot both succeed.
+        try:
+            with transaction.atomic():
+                if not LoanCounter.acquire(user):
+                    raise ValidationError(f"You cannot borrow more than {MAX_ACTIVE_LOANS} books at a time.")
+
+                # Only the reader at the head of the waitlist may borrow a reserved book
+                head = Reservation.objects.filter(book=book).order_by('position').first()
+                if head is not None and head.user_id != user.id:
+                    raise ValidationError("This book is reserved by another user.")
+
+                serializer.save(user=user)
+                if head is not None:
+                    head.delete()
+                bump_version_on_commit('circulation')
+        except IntegrityError:
             raise ValidationError("This book is already borrowed by another user.")
 
-        # Check if the book is reserved by another user
-        if Reservation.objects.filter(book=book).exclude(user=user).exists():
-            raise ValidationError("This book is reserved by another user.")
-
-        # If the book is not borrowed or reserved, allow borrowing
-        serializer.save(user=user)
-
 class ReserveBookView(generics.CreateAPIView):
     queryset = Reservation.objects.all()
     serializer_class = ReservationSerializer
     permission_classes = [IsAuthenticated]  
 
+    @retry_on_busy
     def perform_create(self, serializer):
+        user = self.request.user
         book = serializer.validated_data['book']
 
-        # Prevent reservation if the book is already reserved by another user
-        if Reservation.objects.filter(book=book).exists():
-            raise ValidationError("This book is already reserved by another user.")
-
-        
-        serializer.save(user=self.request.user)
+        if Reservation.objects.filter(book=book, user=user).exists():
+            raise ValidationError("You have already reserved this book.")
+        if Borrowing.objects.filter(book=book, user=user, return_date__isnull=True).exists():
+            raise ValidationError("You have already borrowed this book.")
+
+        # Join the end of the queue. Two readers taking the same position at
+        # once trip the (book, position) constraint, and the loser retries.
+        for attempt in range(3):
+            try:
+                with transaction.atomic():
+                    last = Reservation.objects.filter(book=book).aggregate(last=Max('position'))['last'] or 0
+                    on_loan = Borrowing.objects.filter(book=book, return_date__isnull=True).exists()
+                    reservation = serializer.save(
+                        user=user, position=last + 1,
+                        ready_date=timezone.now() if not last and not on_loan else None,
+                    )
+                break
+            except IntegrityError:
+                if attempt == 2:
+                    raise ValidationError("The waitlist for this book changed. Please try again.")
+        reservation.queue_position = Reservation.objects.filter(book=book, position__lt=reservation.position).count() + 1
 
 
 class ReturnBookView(generics.DestroyAPIView):
@@ -147,12 +333,23 @@ class ReturnBookView(generics.DestroyAPIView):
     serializer_class = BorrowingSerializer
     permission_classes = [IsAuthenticated]
 
+    @retry_on_busy
     def perform_destroy(self, instance):
-        if instance.return_date:
-            # If the book is already returned, raise an exception
-            raise ValidationError("This book has already been returned.")
-        instance.return_date = timezone.now()
-        instance.save()
+        with transaction.atomic():
+            # Conditional update so a double return can't release the loan twice
+            instance.return_date = timezone.now()
+            returned = Borrowing.objects.filter(pk=instance.pk, return_date__isnull=True).update(
+                return_date=instance.return_date
+            )
+            if not returned:
+                # If the book is already returned, raise an exception
+                raise ValidationError("This book has already been returned.")
+            LoanCounter.release(instance.user_id)
+            # The next reader in the queue gets the book held for them
+            if Reservation.objects.hand_off([instance.book_id], instance.return_date):
+                bump_version_on_commit('reservations')
+            bump_version_on_commit('circulation')
+            bump_version_on_commit(user_namespace('borrowings', instance.user_id))
 
     def delete(self, request, *args, **kwargs):
         try:
@@ -165,4 +362,185 @@ class ReturnBookView(generics.DestroyAPIView):
             return Response({'status': 'error', 'message': 'Borrowing record not found'}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             # Log unexpected errors for debugging purposes
-            return Response({'status': 'error', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+            return Response({'status': 'error', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+class BulkBorrowView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @retry_on_busy
+    def post(self, request, *args, **kwargs):
+        serializer = BulkBorrowSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = request.user
+        book_ids = list(dict.fromkeys(serializer.validated_data['books']))
+
+        # Validate the whole batch with a fixed number of queries
+        books = Book.objects.in_bulk(book_ids)
+        borrowed = set(
+            Borrowing.objects.filter(book__in=book_ids, return_date__isnull=True).values_list('book_id', flat=True)
+        )
+        heads = dict(Reservation.objects.heads(book_ids).values_list('book_id', 'user_id'))
+        reserved = {book_id for book_id, holder in heads.items() if holder != user.id}
+        counter, _ = LoanCounter.objects.get_or_create(user=user)
+        free_slots = MAX_ACTIVE_LOANS - counter.active_loans
+
+        results = {}
+        accepted = []
+        for book_id in book_ids:
+            if book_id not in books:
+                error = "Book not found."
+            elif book_id in borrowed:
+                error = "This book is already borrowed by another user."
+            elif book_id in reserved:
+                error = "This book is reserved by another user."
+            elif len(accepted) >= free_slots:
+                error = f"You cannot borrow more than {MAX_ACTIVE_LOANS} books at a time."
+            else:
+                accepted.append(book_id)
+                continue
+            results[book_id] = {'book': book_id, 'status': 'error', 'detail': error}
+
+        if accepted:
+            try:
+                with transaction.atomic():
+                    if not LoanCounter.acquire(user, count=len(accepted)):
+                        raise ValidationError(f"You cannot borrow more than {MAX_ACTIVE_LOANS} books at a time.")
+                    created = Borrowing.objects.bulk_create(
+                        [Borrowing(user=user, book=books[book_id]) for book_id in accepted]
+                    )
+                    # Borrowing a book the user was next in line for uses up the reservation
+                    collected = [book_id for book_id in accepted if heads.get(book_id) == user.id]
+                    if collected:
+                        Reservation.objects.filter(user=user, book__in=collected).delete()
+                    bump_version_on_commit('circulation')
+                    bump_version_on_commit(user_namespace('borrowings', user.id))
+            except IntegrityError:
+                # Another request borrowed one of the books after validation
+                raise ValidationError("One or more books were borrowed by another user. Please try again.")
+            for borrowing in created:
+                results[borrowing.book_id] = {
+                    'book': borrowing.book_id, 'status': 'borrowed', 'borrowing': BorrowingSerializer(borrowing).data,
+                }
+
+        return Response({'results': [results[book_id] for book_id in book_ids]}, status=status.HTTP_200_OK)
+
+
+class BulkReturnView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @retry_on_busy
+    def post(self, request, *args, **kwargs):
+        serializer = BulkReturnSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        borrowing_ids = list(dict.fromkeys(serializer.validated_data['borrowings']))
+        return_date = timezone.now()
+
+        with transaction.atomic():
+            borrowings = Borrowing.objects.in_bulk(borrowing_ids)
+            open_ids = [pk for pk in borrowing_ids if pk in borrowings and borrowings[pk].return_date is None]
+            # One conditional UPDATE; rows already returned concurrently are skipped
+            Borrowing.objects.filter(pk__in=open_ids, return_date__isnull=True).update(return_date=return_date)
+            returned = {
+                pk: (user_id, book_id) for pk, user_id, book_id in
+                Borrowing.objects.filter(pk__in=open_ids, return_date=return_date).values_list('id', 'user_id', 'book_id')
+            }
+            released = {}
+            for user_id, _ in returned.values():
+                released[user_id] = released.get(user_id, 0) + 1
+            LoanCounter.release_many(released)
+            if returned:
+                if Reservation.objects.hand_off([book_id for _, book_id in returned.values()], return_date):
+                    bump_version_on_commit('reservations')
+                bump_version_on_commit('circulation')
+            for user_id in released:
+                bump_version_on_commit(user_namespace('borrowings', user_id))
+
+        results = []
+        for pk in borrowing_ids:
+            if pk not in borrowings:
+                results.append({'borrowing': pk, 'status': 'error', 'detail': 'Borrowing record not found'})
+            elif pk not in returned:
+                results.append({'borrowing': pk, 'status': 'error', 'detail': 'This book has already been returned.'})
+            else:
+                results.append({'borrowing': pk, 'status': 'returned', 'return_date': return_date})
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+class BorrowingExportView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        output = request.query_params.get('output', 'csv')
+        if output not in EXPORT_FORMATS:
+            raise ValidationError({'output': f"Choose one of: {', '.join(EXPORT_FORMATS)}."})
+        try:
+            start = date.fromisoformat(request.query_params['from']) if request.query_params.get('from') else None
+            end = date.fromisoformat(request.query_params['to']) if request.query_params.get('to') else None
+        except ValueError:
+            raise ValidationError("'from' and 'to' must be dates in YYYY-MM-DD format.")
+
+        # Rows are fetched and written chunk by chunk, so memory stays flat
+        write_lines, content_type = EXPORT_FORMATS[output]
+        response = StreamingHttpResponse(buffered(write_lines(borrowing_rows(start, end))), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="borrowings.{output}"'
+        return response
+
+
+class MetricsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(
+            render_prometheus(registry.collect()), content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
+
+
+class ProfilingTokenView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        # Sending this header with any request profiles it, for PROFILING_TOKEN_MAX_AGE seconds
+        return Response({
+            'header': settings.PROFILING_HEADER.removeprefix('HTTP_').replace('_', '-'),
+            'token': make_profiling_token(request.user),
+            'expires_in': settings.PROFILING_TOKEN_MAX_AGE,
+        })
+
+
+class ProfileListView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response({'results': recent_profiles()})
+
+
+class ProfileDetailView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, profile_id, *args, **kwargs):
+        profile = get_profile(profile_id)
+        if profile is None:
+            return Response({'detail': 'Profile not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            **profile['summary'],
+            'query_log': profile['query_log'],
+            'top_functions': profile['top_functions'],
+        })
+
+
+class ProfileDownloadView(APIView):
+    permission_classes = [IsAdminUser]
+    # pstats loads into pstats/snakeviz; collapsed stacks into flamegraph.pl/speedscope
+    formats = {
+        'pstats': ('application/octet-stream', 'prof'),
+        'collapsed': ('text/plain; charset=utf-8', 'txt'),
+    }
+
+    def get(self, request, profile_id, kind, *args, **kwargs):
+        profile = get_profile(profile_id)
+        if profile is None or kind not in self.formats:
+            return Response({'detail': 'Profile not found.'}, status=status.HTTP_404_NOT_FOUND)
+        content_type, extension = self.formats[kind]
+        response = HttpResponse(profile[kind], content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{profile_id}.{extension}"'
+        return response
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 from celery.schedules import crontab
@@ -48,13 +49,24 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'books.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'books.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
 }
 
+# Upper bound for the ?page_size= query parameter on list endpoints
+PAGINATION_MAX_PAGE_SIZE = 200
+
+# Values returned per facet by /api/books/facets/, most frequent first
+CATALOG_FACET_LIMIT = 50
+
+# Maximum number of items accepted by the bulk borrow/return endpoints
+BULK_CIRCULATION_MAX_ITEMS = 50
+
 
 from datetime import timedelta
 
@@ -63,6 +75,7 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
+    'TOKEN_REFRESH_SERIALIZER': 'books.authentication.PrefilteredTokenRefreshSerializer',
 }
 
 
@@ -77,9 +90,60 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'books.tasks.send_due_date_reminder',
         'schedule': crontab(hour=0, minute=0),  # Runs daily at midnight
     },
+    'refresh_book_neighbours': {
+        'task': 'books.tasks.refresh_book_neighbours',
+        'schedule': crontab(minute='*/15'),  # Folds in new borrowings only
+    },
+    'rebuild_book_neighbours_nightly': {
+        'task': 'books.tasks.refresh_book_neighbours',
+        'schedule': crontab(hour=3, minute=0),
+        'kwargs': {'full': True},
+    },
+    'rebuild_leaderboards': {
+        'task': 'books.tasks.rebuild_leaderboards',
+        'schedule': crontab(minute='*/10'),
+    },
+    'rebuild_similarity_index_nightly': {
+        'task': 'books.tasks.rebuild_similarity_index',
+        'schedule': crontab(hour=3, minute=30),
+    },
 }
 
+# Number of reminders sent per chunk task (and per SMTP connection). When the
+# mail server cannot be reached, a chunk is retried with its unsent reminders
+# up to REMINDER_MAX_RETRIES times, REMINDER_RETRY_DELAY seconds apart.
+REMINDER_CHUNK_SIZE = 500
+REMINDER_MAX_RETRIES = 5
+REMINDER_RETRY_DELAY = 300
+
+# "Also borrowed" recommendations: neighbours kept per book, readers two books
+# must share before they are related, books computed per batch, and how many of
+# a user's latest borrowings seed their personal recommendations.
+RECOMMENDATION_NEIGHBOURS = 20
+RECOMMENDATION_MIN_SHARED_READERS = 2
+RECOMMENDATION_BATCH_SIZE = 2000
+RECOMMENDATION_HISTORY = 50
+
+# Similar-books index: hashed TF-IDF vectors of title, description and category,
+# memory-mapped from SIMILARITY_INDEX_DIR. A search scans the SIMILARITY_PROBES
+# clusters nearest to the book; past SIMILARITY_MAX_DELTAS incremental updates
+# the index is rebuilt. One rebuild is queued at a time; if its task is lost,
+# the next one can be queued after SIMILARITY_REBUILD_TIMEOUT seconds.
+SIMILARITY_INDEX_DIR = Path(os.environ.get('SIMILARITY_INDEX_DIR', BASE_DIR / 'similarity_index'))
+SIMILARITY_DIMENSIONS = 256
+SIMILARITY_PROBES = 32
+SIMILARITY_MAX_DELTAS = 500
+SIMILARITY_REBUILD_TIMEOUT = 3600
+
+# Books kept per leaderboard (and per category), and the number of pseudo-ratings
+# at the catalog mean that top-rated adds to every book.
+LEADERBOARD_SIZE = 100
+LEADERBOARD_RATING_PRIOR = 5
+
 MIDDLEWARE = [
+    'books.middleware.RequestMetricsMiddleware',
+    'books.middleware.ProfilingMiddleware',
+    'books.middleware.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -89,8 +153,30 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# How often each worker publishes its request metrics to SHARED_CACHE,
+# and how many worker slots the /metrics endpoint merges.
+METRICS_FLUSH_INTERVAL = 15
+METRICS_MAX_WORKERS = 64
+
+# Request profiling: a share of requests, plus any request sending a token
+# from /api/profiles/token/ in the X-Profile header. Results are kept in the
+# PROFILING_CACHE cache, so any worker can serve them: the shared Redis cache
+# when configured, otherwise files in PROFILING_DIR.
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_HEADER = 'HTTP_X_PROFILE'
+PROFILING_TOKEN_MAX_AGE = 3600
+PROFILING_SAMPLER_INTERVAL = 0.005
+PROFILING_MAX_QUERIES = 500
+PROFILING_MAX_STORED = 100
+PROFILING_RETENTION = 24 * 3600
+PROFILING_CACHE = 'profiles'
+PROFILING_DIR = Path(os.environ.get('PROFILING_DIR', BASE_DIR / 'profiles'))
+
 ROOT_URLCONF = 'library_management.urls'
 
+# Keeps the tests away from the configured similarity index
+TEST_RUNNER = 'books.test_runner.LibraryTestRunner'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -120,6 +206,114 @@ DATABASES = {
     }
 }
 
+# Read replicas: REPLICA_DATABASE_PATHS lists SQLite copies of the primary kept
+# up to date outside Django, separated by commas. Safe requests on catalog and
+# history views read from a healthy one (books.routers); for REPLICA_PIN_SECONDS
+# after a user's write, or a bump of a namespace a view caches under, reads stay
+# on the primary, so the pin must outlast the replication lag.
+REPLICA_DATABASE_PATHS = [path for path in os.environ.get('REPLICA_DATABASE_PATHS', '').split(',') if path]
+for number, path in enumerate(REPLICA_DATABASE_PATHS, 1):
+    DATABASES[f'replica_{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        # Tests read through the replica aliases from the test database
+        'TEST': {'MIRROR': 'default'},
+    }
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['books.routers.ReplicaRouter']
+REPLICA_PIN_SECONDS = 5
+REPLICA_HEALTH_CHECK_INTERVAL = 10
+
+# SQLite production profile, opt in with SQLITE_PROFILE=production. WAL lets
+# readers run alongside the writer; IMMEDIATE transactions take the write lock
+# at BEGIN, so concurrent writers wait up to `timeout` seconds for it instead of
+# failing when a read transaction cannot be upgraded; persistent connections
+# run the pragmas once per worker instead of once per request.
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', '')
+if SQLITE_PROFILE == 'production':
+    for database in DATABASES.values():
+        database.update({
+            'CONN_MAX_AGE': 600,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA cache_size=-20000;'
+                    'PRAGMA mmap_size=268435456;'
+                    'PRAGMA temp_store=MEMORY'
+                ),
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+            },
+        })
+
+# Write paths decorated with books.utils.retry_on_busy re-run their transaction
+# this many times, backing off from SQLITE_BUSY_RETRY_DELAY seconds, when the
+# database stays locked past the busy timeout.
+SQLITE_BUSY_RETRIES = 3
+SQLITE_BUSY_RETRY_DELAY = 0.05
+
+
+# Cache
+# Local memory by default; set REDIS_CACHE_URL to share the cache between workers.
+#
+# SHARED_CACHE holds what every worker must agree on: the namespace versions
+# behind cached responses and ETags, and the /metrics worker slots. Without
+# Redis it is kept in files in SHARED_CACHE_DIR, which every worker on one
+# host sees; deployments spanning several hosts need REDIS_CACHE_URL.
+
+REDIS_CACHE_URL = os.environ.get('REDIS_CACHE_URL')
+SHARED_CACHE = 'shared'
+SHARED_CACHE_DIR = Path(os.environ.get('SHARED_CACHE_DIR', BASE_DIR / 'shared_cache'))
+
+if REDIS_CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+        },
+        'profiles': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+        },
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'library-management',
+        },
+        # Local memory is per process; files are seen by every worker on the host
+        'profiles': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': PROFILING_DIR,
+        },
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': SHARED_CACHE_DIR,
+            # Culling would drop live versions; there are only a few hundred keys
+            'OPTIONS': {'MAX_ENTRIES': 100_000},
+        },
+    }
+
+# Lifetime of cached catalog responses; writes invalidate them sooner
+CATALOG_CACHE_TIMEOUT = 300
+
+# Seconds an authenticated user stays cached; saving the user invalidates it
+AUTH_USER_CACHE_TIMEOUT = 60
+
+# Check refresh tokens against a Bloom filter plus the shared cache instead of
+# querying the blacklist table. Needs a cache shared by all workers.
+JWT_BLACKLIST_PREFILTER = bool(REDIS_CACHE_URL)
+JWT_BLACKLIST_BLOOM_CAPACITY = 1_000_000
+# Seconds between picking up tokens other workers blacklisted into the filter
+JWT_BLACKLIST_SYNC_INTERVAL = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
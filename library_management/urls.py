@@ -5,6 +5,7 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from django.urls import path, re_path
+from books.views import MetricsView
 
 
 # Swagger schema view
@@ -26,6 +27,7 @@ urlpatterns = [
     path('api/', include('books.urls')),  
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),  
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),  \
+    path('metrics', MetricsView.as_view(), name='metrics'),
 
     
     re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),